@@ -1,28 +1,114 @@
+from __future__ import annotations
+
 import time
 import os
-from typing import Tuple, Union
-from appium.webdriver.webdriver import WebDriver
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
+from typing import TYPE_CHECKING, Any, Callable, Dict, List, Optional, Sequence, Tuple, Union
 from selenium.common.exceptions import TimeoutException, NoSuchElementException, StaleElementReferenceException
 from selenium.webdriver.common.by import By
-from selenium.webdriver.remote.webelement import WebElement
-from selenium.webdriver.common.action_chains import ActionChains
-from selenium.webdriver.common.actions import interaction
-from selenium.webdriver.common.actions.pointer_input import PointerInput
-from selenium.webdriver.common.actions.action_builder import ActionBuilder
+
+if TYPE_CHECKING:
+    from selenium.webdriver.remote.webelement import WebElement
+    from utils.scroll_index import ScrollIndex
+    from appium.webdriver.webdriver import WebDriver
+    from utils.screen_change import ScreenChangeDetector
+
+Locator = Tuple[str, str]
+
+
+def _wait(driver: 'WebDriver', timeout: float, **kwargs):
+    """WebDriverWait, imported on first use since it pulls in the whole remote WebDriver"""
+    from selenium.webdriver.support.ui import WebDriverWait
+
+    return WebDriverWait(driver, timeout, **kwargs)
+
+
+def _conditions():
+    """selenium expected_conditions, imported on first use like WebDriverWait"""
+    from selenium.webdriver.support import expected_conditions
+
+    return expected_conditions
 
 
 class CommonActions:
-    def __init__(self, driver: WebDriver, default_timeout: int = 10):
+    def __init__(self, driver: 'WebDriver', default_timeout: int = 10, cache_elements: bool = True,
+                 screen_change_detector: 'ScreenChangeDetector' = None, scroll_index: ScrollIndex = None,
+                 platform: str = None):
         """
         Args:
             driver: WebDriver instance
             default_timeout: default timeout (seconds)
+            cache_elements: Reuse located elements between calls on the same locator
+            screen_change_detector: If specified, scroll helpers detect scroll end and settle
+                visually from screenshots instead of comparing page_source
+            scroll_index: Index of swipes that reached elements before, scroll helpers replay them.
+                Defaults to the shared index when SCROLL_INDEX_PATH is set
+            platform: android or ios of the driver session, APPIUM_OS / capabilities if not specified.
+                Multi-role tests pass the role platform since APPIUM_OS describes only the main session
         """
         self.driver = driver
-        self.wait = WebDriverWait(driver, default_timeout)
+        self.platform = platform.lower() if platform else None
         self.default_timeout = default_timeout
+        self.cache_elements = cache_elements
+        self._element_cache: Dict[Locator, WebElement] = {}
+        self.element_cache_stats = {'hits': 0, 'misses': 0, 'stale': 0, 'invalidations': 0}
+        self.screen_change_detector = screen_change_detector
+        if scroll_index is None:
+            from utils.scroll_index import get_scroll_index
+
+            scroll_index = get_scroll_index()
+        self.scroll_index = scroll_index
+
+    @property
+    def wait(self):
+        """WebDriverWait with default_timeout"""
+        return _wait(self.driver, self.default_timeout)
+
+    def get_cached_element(self, locator_type: str, locator_value: str, timeout: int = None) -> WebElement:
+        """
+        Return element from the locator cache, find and cache it on a miss
+
+        Args:
+            locator_type: Locator type
+            locator_value: Locator value
+            timeout: Optional timeout for the find on a miss
+        """
+        locator = (locator_type, locator_value)
+        element = self._element_cache.get(locator)
+        if element is not None:
+            self.element_cache_stats['hits'] += 1
+            return element
+
+        self.element_cache_stats['misses'] += 1
+        element = self.find_element(locator_type, locator_value, timeout)
+        if self.cache_elements:
+            self._element_cache[locator] = element
+        return element
+
+    def invalidate_element_cache(self, locator_type: str = None, locator_value: str = None):
+        """
+        Drop cached elements, all of them if no locator is specified
+        Called on navigation, screen-changing clicks and scrolls
+        """
+        if locator_type is None:
+            if self._element_cache:
+                self.element_cache_stats['invalidations'] += 1
+                self._element_cache.clear()
+            return
+        self._element_cache.pop((locator_type, locator_value), None)
+
+    def _run_on_element(self, locator_type: str, locator_value: str, operation: Callable[[WebElement], Any]):
+        """
+        Run operation on the cached element
+        If the element went stale it is looked up again once and the operation is retried
+        """
+        element = self.get_cached_element(locator_type, locator_value)
+        try:
+            return operation(element)
+        except StaleElementReferenceException:
+            self.element_cache_stats['stale'] += 1
+            self.invalidate_element_cache(locator_type, locator_value)
+            element = self.get_cached_element(locator_type, locator_value)
+            return operation(element)
 
     def find_element(self, locator_type: str, locator_value: str, timeout: int = None):
         """
@@ -40,8 +126,8 @@ class CommonActions:
         max_attempts = 3
         for attempt in range(max_attempts):
             try:
-                return WebDriverWait(self.driver, timeout).until(
-                    EC.presence_of_element_located(
+                return _wait(self.driver, timeout).until(
+                    _conditions().presence_of_element_located(
                         (locator_type, locator_value))
                 )
             except (TimeoutException, StaleElementReferenceException) as e:
@@ -64,8 +150,8 @@ class CommonActions:
         max_attempts = 3
         for attempt in range(max_attempts):
             try:
-                WebDriverWait(self.driver, timeout).until(
-                    EC.visibility_of_element_located(
+                _wait(self.driver, timeout).until(
+                    _conditions().visibility_of_element_located(
                         (locator_type, locator_value))
                 )
                 return True
@@ -89,10 +175,12 @@ class CommonActions:
         max_attempts = 3
         for attempt in range(max_attempts):
             try:
-                element = WebDriverWait(self.driver, timeout).until(
-                    EC.element_to_be_clickable((locator_type, locator_value))
+                element = _wait(self.driver, timeout).until(
+                    _conditions().element_to_be_clickable((locator_type, locator_value))
                 )
                 element.click()
+                # Click may change screen, cached elements can no longer be trusted
+                self.invalidate_element_cache()
                 return
             except (TimeoutException, StaleElementReferenceException) as e:
                 if attempt == max_attempts - 1:
@@ -107,25 +195,51 @@ class CommonActions:
             return True
         return False
 
-    def send_keys_to_element(self, locator_type: str, locator_value: str, text: str):
-        element = self.find_element(locator_type, locator_value)
-        element.send_keys(text)
-        return element
+    def send_keys_to_element(self, locator_type: str, locator_value: str, text: str, replace: bool = False,
+                             verify: bool = True, hide_keyboard: bool = False):
+        """
+        Type text into a field, appended to its current text like element.send_keys
+
+        Args:
+            locator_type: Locator type
+            locator_value: Locator value
+            text: Text to enter
+            replace: Replace the field text using the fastest input strategy that works for the field
+                (direct value replace, clipboard paste, mobile: type, per-key typing as the fallback)
+            verify: With replace, check the field value after each strategy and fall through on a mismatch.
+                Secure fields are never verified, turn it off for auto-formatted fields (phone numbers, dates)
+            hide_keyboard: Hide the soft keyboard afterwards
+        """
+        from utils.text_input import get_text_input
+
+        text_input = get_text_input(self.driver, self.get_platform())
+
+        def type_text(element: WebElement) -> WebElement:
+            if replace:
+                text_input.enter_text(element, text, field_key=f"{locator_type}={locator_value}",
+                                      hide_keyboard=hide_keyboard, verify=verify)
+            else:
+                element.send_keys(text)
+                if hide_keyboard:
+                    text_input.hide_keyboard()
+            return element
+
+        return self._run_on_element(locator_type, locator_value, type_text)
 
     def clear_text(self, locator_type: str, locator_value: str):
-        element = self.find_element(locator_type, locator_value)
-        element.clear()
+        self._run_on_element(locator_type, locator_value, lambda element: element.clear())
 
     def get_element_text(self, locator_type: str, locator_value: str) -> str:
-        element = self.find_element(locator_type, locator_value)
-        return element.text
+        return self._run_on_element(locator_type, locator_value, lambda element: element.text)
 
-    def wait_for_element_visible(self, locator_type: str, locator_value: str, timeout: int = 30):
+    def wait_for_element_visible(self, locator_type: str, locator_value: str, timeout: int = 30,
+                                 poll_frequency: float = 0.5):
         """
         Args:
             locator_type: Locator type
             locator_value: Locator value
             timeout: Maximum waiting time (seconds)
+            poll_frequency: Waiting time between checks (seconds), lower it for latency measurements
 
         Returns:
             WebElement: If element is visible, return WebElement, otherwise return False
@@ -135,9 +249,9 @@ class CommonActions:
         """
         try:
             self.driver.implicitly_wait(0)
-            wait = WebDriverWait(self.driver, timeout)
+            wait = _wait(self.driver, timeout, poll_frequency=poll_frequency)
             return wait.until(
-                EC.visibility_of_element_located((locator_type, locator_value))
+                _conditions().visibility_of_element_located((locator_type, locator_value))
             )
         except NoSuchElementException:
             return False
@@ -153,7 +267,7 @@ class CommonActions:
         """
         try:
             self.wait.until(
-                EC.element_to_be_clickable((locator_type, locator_value))
+                _conditions().element_to_be_clickable((locator_type, locator_value))
             )
             return True
         except TimeoutException:
@@ -167,6 +281,8 @@ class CommonActions:
         return actual_text == expected_text
 
     def get_platform(self) -> str:
+        if self.platform in ['android', 'ios']:
+            return self.platform
         try:
             platform = os.environ.get('APPIUM_OS', '').lower()
             if platform in ['android', 'ios']:
@@ -201,10 +317,11 @@ class CommonActions:
         else:
             return "//android.widget.ScrollView | //android.widget.NestedScrollView"
 
-    def scroll_to_element(self, locator_type: str, locator_value: str, scroll_container: str = None, max_swipes: int = 5, timeout: float = 0.5) -> bool:
+    def scroll_to_element(self, locator_type: str, locator_value: str, scroll_container: str = None, max_swipes: int = 5, timeout: float = 0.5, screen: str = None) -> bool:
         """
         Scroll vertically in ScrollView until finding specified element
         Automatically detects platform and uses appropriate scroll container
+        With a scroll index, swipes that found the element before are replayed first
 
         Args:
             locator_type: Locator type (e.g. AppiumBy.ID)
@@ -212,6 +329,7 @@ class CommonActions:
             scroll_container: ScrollView container xpath, if None will auto-detect by platform
             max_swipes: Maximum swipe count, default is 5
             timeout: Waiting time after each swipe (seconds), default is 0.5 seconds
+            screen: Screen name for the scroll index, defaults to current activity (Android)
 
         Returns:
             bool: If element is found and visible, return True, otherwise return False
@@ -228,6 +346,13 @@ class CommonActions:
         # Get screen size
         screen_width, screen_height = self.get_screen_size()
 
+        # Replay swipes learned from previous searches
+        index_key = self._get_scroll_index_key(
+            'down', locator_type, locator_value, scroll_container, screen, (screen_width, screen_height))
+        performed_swipes = []
+        if self._replay_learned_scroll(index_key, locator_type, locator_value, timeout, performed_swipes):
+            return True
+
         # Initialize swipe parameters
         start_x = screen_width // 2
         start_y = int(screen_height * 0.8)  # Start from 80% position
@@ -265,33 +390,35 @@ class CommonActions:
 
         # Execute swipe
         swipe_count = 0
-        last_page_source = self.driver.page_source  # Record page content to check if swipe is effective
+        last_screen_state = self._capture_screen_state()  # Record screen to check if swipe is effective
 
         while swipe_count < max_swipes:
             try:
 
                 # Execute swipe
                 self.swipe(start_x, start_y, start_x, end_y, duration=1500)
-                time.sleep(timeout)
+                performed_swipes.append([start_x, start_y, start_x, end_y])
+                self._wait_after_swipe(timeout)
 
                 # Check if element is visible
                 try:
                     element = self.driver.find_element(
                         locator_type, locator_value)
                     if element.is_displayed():
+                        self._learn_scroll(index_key, performed_swipes)
                         return True
                 except (NoSuchElementException, StaleElementReferenceException):
                     pass
 
-                # Check if swipe is effective (by comparing page content)
-                current_page_source = self.driver.page_source
-                if current_page_source == last_page_source:
+                # Check if swipe is effective (by comparing page content or screen)
+                current_screen_state = self._capture_screen_state()
+                if not self._has_screen_state_changed(last_screen_state, current_screen_state):
                     print("Page content not changed, swipe may be ineffective")
                     # Try using larger swipe distance
                     start_y = int(screen_height * 0.9)
                     end_y = int(screen_height * 0.1)
 
-                last_page_source = current_page_source
+                last_screen_state = current_screen_state
                 swipe_count += 1
 
             except Exception as e:
@@ -302,6 +429,87 @@ class CommonActions:
         print(f"Swipe {max_swipes} times but still not found target element")
         return False
 
+    def _get_scroll_index_key(self, direction: str, locator_type: str, locator_value: str, scroll_container: str,
+                              screen: str, screen_size: Tuple[int, int]) -> Optional[str]:
+        """Build scroll index key, None if no scroll index is used"""
+        if self.scroll_index is None:
+            return None
+        if screen is None:
+            screen = self._get_screen_fingerprint()
+            if screen is None:
+                print("Screen not identifiable, pass screen= to use the scroll index")
+                return None
+        from utils.scroll_index import make_scroll_key
+
+        return make_scroll_key(
+            f"{screen}:{scroll_container or ''}", f"{screen_size[0]}x{screen_size[1]}",
+            direction, locator_type, locator_value)
+
+    def _get_screen_fingerprint(self) -> Optional[str]:
+        """
+        Identify current screen: activity on Android, navigation bar title on iOS
+        None if the screen cannot be told apart from others, the index is then not used
+        """
+        platform = self.get_platform()
+        try:
+            if platform == 'android':
+                return self.driver.current_activity or None
+            navigation_bars = self.driver.find_elements(By.CLASS_NAME, 'XCUIElementTypeNavigationBar')
+            names = [bar.get_attribute('name') for bar in navigation_bars]
+            names = [name for name in names if name]
+            return f"ios:{'/'.join(names)}" if names else None
+        except Exception:
+            return None
+
+    def _replay_learned_scroll(self, index_key: Optional[str], locator_type: str, locator_value: str,
+                               timeout: float, performed_swipes: list, duration: int = 1500) -> bool:
+        """
+        Replay swipes that reached the element last time, checking for the element only once at the end
+        On a miss the swipes are undone one by one (checking for an overshot element after each),
+        so the incremental search starts from the original position as it would without the index
+
+        Returns:
+            bool: If element is visible after replay, return True, otherwise return False
+        """
+        if index_key is None:
+            return False
+        swipes = self.scroll_index.lookup(index_key)
+        if not swipes:
+            return False
+
+        print(f"Replay {len(swipes)} learned swipes to ({locator_type}={locator_value})")
+        for swipe in swipes:
+            # Slow drags end with little momentum, so swipes can be chained without settle waits
+            self.swipe(*swipe, duration=duration)
+        self._wait_after_swipe(timeout)
+        if self._is_element_displayed_now(locator_type, locator_value):
+            self.scroll_index.record_hit(index_key)
+            performed_swipes.extend(swipes)
+            return True
+
+        print("Learned swipes missed the element, scrolling back before incremental search")
+        self.scroll_index.record_miss(index_key)
+        for replayed in range(len(swipes) - 1, -1, -1):
+            start_x, start_y, end_x, end_y = swipes[replayed]
+            self.swipe(end_x, end_y, start_x, start_y, duration=duration)
+            self._wait_after_swipe(timeout)
+            if replayed and self._is_element_displayed_now(locator_type, locator_value):
+                # The replay overshot the element, the shorter path is learned instead
+                performed_swipes.extend(swipes[:replayed])
+                self._learn_scroll(index_key, performed_swipes)
+                return True
+        return False
+
+    def _is_element_displayed_now(self, locator_type: str, locator_value: str) -> bool:
+        try:
+            return self.driver.find_element(locator_type, locator_value).is_displayed()
+        except (NoSuchElementException, StaleElementReferenceException):
+            return False
+
+    def _learn_scroll(self, index_key: Optional[str], performed_swipes: list):
+        if index_key is not None:
+            self.scroll_index.learn(index_key, performed_swipes)
+
     def simple_scroll_to_element(self, locator_type: str, locator_value: str, max_swipes: int = 3) -> bool:
         """
         Simple swipe to find element method, using fixed screen ratio for swipe
@@ -337,8 +545,8 @@ class CommonActions:
                 print(f"Execute swipe {i + 1} times")
 
                 # Execute swipe
-                self.driver.swipe(start_x, start_y, start_x, end_y, 1000)
-                time.sleep(1)  # Wait for page to stabilize
+                self.swipe(start_x, start_y, start_x, end_y, 1000)
+                self._wait_after_swipe(1)  # Wait for page to stabilize
 
                 # Check if element is visible
                 try:
@@ -362,6 +570,58 @@ class CommonActions:
         Execute swipe gesture
         """
         self.driver.swipe(start_x, start_y, end_x, end_y, duration)
+        self.invalidate_element_cache()
+
+    def settings_profile(self, profile: Union[str, dict]):
+        """
+        Apply an Appium settings profile for a block, previous settings are restored afterwards
+
+        Args:
+        profile: Profile name (see utils.appium_settings.PROFILES) or settings dict
+        Ex.
+        with self.common_actions.settings_profile('fast'):
+            self.common_actions.click_element(AppiumBy.ACCESSIBILITY_ID, "place_order")
+        """
+        from utils.appium_settings import get_settings_manager
+
+        return get_settings_manager(self.driver, self.get_platform()).use(profile)
+
+    def wait_for_screen_stable(self, stable_ms: int = 300, timeout: float = 5) -> bool:
+        """
+        Wait until the screen stops changing visually (animations settled, scroll stopped)
+        Uses screen_change_detector, creating a default one on first use
+
+        Args:
+            stable_ms: Time the screen must stay unchanged (milliseconds)
+            timeout: Maximum waiting time (seconds)
+
+        Returns:
+            bool: If screen became stable within timeout, return True, otherwise return False
+        """
+        if self.screen_change_detector is None:
+            from utils.screen_change import ScreenChangeDetector
+            self.screen_change_detector = ScreenChangeDetector(self.driver)
+        return self.screen_change_detector.wait_until_stable(stable_ms=stable_ms, timeout=timeout)
+
+    def _wait_after_swipe(self, timeout: float):
+        """Sleep after swipe, or wait for the screen to settle visually when a detector is set"""
+        if self.screen_change_detector is None:
+            time.sleep(timeout)
+            return
+        # Settled screen is usually reached sooner than the fixed sleep, allow some slack for long flings
+        self.screen_change_detector.wait_until_stable(stable_ms=int(timeout * 400), timeout=max(timeout * 4, 1))
+
+    def _capture_screen_state(self):
+        """Capture state used to check if a swipe moved the screen: frame with a detector, else page_source"""
+        if self.screen_change_detector is None:
+            return self.driver.page_source
+        # Frame captured while waiting for the screen to settle is reused
+        return self.screen_change_detector.latest()
+
+    def _has_screen_state_changed(self, before, after) -> bool:
+        if self.screen_change_detector is None:
+            return before != after
+        return self.screen_change_detector.has_changed(before, after)
 
     def tap(self, x_ratio: float, y_ratio: float):
         """
@@ -373,6 +633,11 @@ class CommonActions:
         Ex.
         self.common_actions.tap(0.5, 0.9)
         """
+        from selenium.webdriver.common.action_chains import ActionChains
+        from selenium.webdriver.common.actions import interaction
+        from selenium.webdriver.common.actions.pointer_input import PointerInput
+        from selenium.webdriver.common.actions.action_builder import ActionBuilder
+
         size = self.get_screen_size()
         x = int(size[0] * x_ratio)
         y = int(size[1] * y_ratio)
@@ -385,6 +650,7 @@ class CommonActions:
         actions.w3c_actions.pointer_action.pause(0.1)
         actions.w3c_actions.pointer_action.pointer_up()
         actions.perform()
+        self.invalidate_element_cache()
 
     def hide_keyboard(self):
         self.driver.hide_keyboard()
@@ -393,6 +659,7 @@ class CommonActions:
         for _ in range(times):
             time.sleep(0.5)
             self.driver.back()
+            self.invalidate_element_cache()
             time.sleep(1)
 
     def get_screen_size(self) -> Tuple[int, int]:
@@ -417,9 +684,9 @@ class CommonActions:
         try:
             # Temporarily disable implicit wait to avoid conflict with explicit wait
             self.driver.implicitly_wait(0)
-            wait = WebDriverWait(self.driver, timeout)
+            wait = _wait(self.driver, timeout)
             wait.until(
-                EC.visibility_of_element_located((locator_type, locator_value))
+                _conditions().visibility_of_element_located((locator_type, locator_value))
             )
             return True
         except TimeoutException:
@@ -443,16 +710,17 @@ class CommonActions:
         """
         try:
             self.driver.implicitly_wait(0)
-            return WebDriverWait(self.driver, timeout).until(EC.invisibility_of_element_located((locator_type, locator_value)))
+            return _wait(self.driver, timeout).until(_conditions().invisibility_of_element_located((locator_type, locator_value)))
         except NoSuchElementException:
             return True
         except TimeoutException:
             raise TimeoutException(
                 f"Element ({locator_type}={locator_value}) still visible after {timeout} seconds")
 
-    def scroll_to_element_left(self, locator_type: str, locator_value: str, scroll_container: str = "//android.widget.HorizontalScrollView", max_swipes: int = 3, timeout: float = 0.5) -> bool:
+    def scroll_to_element_left(self, locator_type: str, locator_value: str, scroll_container: str = "//android.widget.HorizontalScrollView", max_swipes: int = 3, timeout: float = 0.5, screen: str = None) -> bool:
         """
         Scroll to element in specified HorizontalScrollView until finding specified element
+        With a scroll index, swipes that found the element before are replayed first
 
         Args:
             locator_type: Locator type (e.g. AppiumBy.ID)
@@ -460,6 +728,7 @@ class CommonActions:
             scroll_container: HorizontalScrollView container xpath, default is "//android.widget.HorizontalScrollView"
             max_swipes: Maximum swipe count, default is 3
             timeout: Waiting time after each swipe (seconds), default is 0.5 seconds
+            screen: Screen name for the scroll index, defaults to current activity (Android)
 
         Returns:
             bool: If element is found and visible, return True, otherwise return False
@@ -473,6 +742,15 @@ class CommonActions:
         except (NoSuchElementException, StaleElementReferenceException):
             pass
 
+        # Replay swipes learned from previous searches
+        index_key = None
+        if self.scroll_index is not None:
+            index_key = self._get_scroll_index_key(
+                'left', locator_type, locator_value, scroll_container, screen, self.get_screen_size())
+        performed_swipes = []
+        if self._replay_learned_scroll(index_key, locator_type, locator_value, timeout, performed_swipes, duration=800):
+            return True
+
         # Get HorizontalScrollView position and size
         try:
             scroll_view = self.driver.find_element(By.XPATH, scroll_container)
@@ -491,11 +769,13 @@ class CommonActions:
 
             for _ in range(max_swipes):
                 self.swipe(start_x, swipe_y, end_x, swipe_y)
-                time.sleep(timeout)
+                performed_swipes.append([start_x, swipe_y, end_x, swipe_y])
+                self._wait_after_swipe(timeout)
                 try:
                     element = self.driver.find_element(
                         locator_type, locator_value)
                     if element.is_displayed():
+                        self._learn_scroll(index_key, performed_swipes)
                         return True
                 except (NoSuchElementException, StaleElementReferenceException):
                     continue
@@ -518,8 +798,7 @@ class CommonActions:
         Returns:
             str: Attribute value
         """
-        element = self.find_element(locator_type, locator_value)
-        return element.get_attribute(attribute)
+        return self._run_on_element(locator_type, locator_value, lambda element: element.get_attribute(attribute))
 
     def get_element_location(self, locator_type: str, locator_value: str) -> Tuple[int, int]:
         """
@@ -532,8 +811,7 @@ class CommonActions:
         Returns:
             Tuple[int, int]: Element's x, y coordinates
         """
-        element = self.find_element(locator_type, locator_value)
-        location = element.location
+        location = self._run_on_element(locator_type, locator_value, lambda element: element.location)
         return location['x'], location['y']
 
     def get_element_size(self, locator_type: str, locator_value: str) -> Tuple[int, int]:
@@ -547,101 +825,128 @@ class CommonActions:
         Returns:
             Tuple[int, int]: Element's width and height
         """
-        element = self.find_element(locator_type, locator_value)
-        size = element.size
+        size = self._run_on_element(locator_type, locator_value, lambda element: element.size)
         return size['width'], size['height']
 
-    def is_toggle_on(self, locator_type: str, locator_value: str) -> bool:
-        """
-        Determine toggle state based on checked attribute
-        checked="true" means ON, checked="false" means OFF
+    def perform_until(self, action: Callable[[], Any], postcondition: Callable[[], bool], budget: float = 5,
+                      max_actions: int = 3, poll_interval: float = 0.1, max_poll_interval: float = 1.0,
+                      settle: float = 0.5) -> bool:
         """
-        try:
-            element = self.find_element(locator_type, locator_value)
-            checked = element.get_attribute("checked")
-            print(f"Toggle checked attribute: {checked}")
-            return checked == "true"
-        except (NoSuchElementException, TimeoutException):
-            return False
+        Perform an action and poll its postcondition until it holds
+        Polling starts fast and backs off, so a quick UI reaction is detected within ~100ms.
+        The action is performed again only if the postcondition still fails after its share of the budget
+        and after a settle wait, so a slow reaction to a non-idempotent action (a toggle click) is not undone.
 
-    def toggle_switch(self, locator_type: str, locator_value: str, should_be_on: bool = True) -> bool:
-        """
-        Switch Toggle (Switch) state
+        Example:
+        element = common_actions.find_element(By.ID, "my_toggle")
+        common_actions.perform_until(element.click, lambda: element.get_attribute("checked") == "true")
 
         Args:
-            locator_type: Locator type
-            locator_value: Locator value
-            should_be_on: Expected state, True means ON, False means OFF
+            action: Callable performing the action (e.g. element.click)
+            postcondition: Callable returning True once the action took effect
+            budget: Total time budget (seconds)
+            max_actions: Maximum times the action is performed
+            poll_interval: First polling interval (seconds), doubled after each poll
+            max_poll_interval: Maximum polling interval (seconds)
+            settle: Wait before the postcondition is checked a last time ahead of a repeated action (seconds)
 
         Returns:
-            bool: If successfully switched to expected state, return True, otherwise return False
+            bool: If postcondition holds within budget, return True, otherwise return False
+        """
+        end_time = time.monotonic() + budget
+        action_window = budget / max_actions
+
+        for attempt in range(max_actions):
+            action()
+            window_end = min(end_time, time.monotonic() + action_window)
+            interval = poll_interval
+            while True:
+                if postcondition():
+                    return True
+                remaining = window_end - time.monotonic()
+                if remaining <= 0:
+                    break
+                time.sleep(min(interval, remaining))
+                interval = min(interval * 2, max_poll_interval)
+
+            remaining = end_time - time.monotonic()
+            if remaining <= 0 or attempt == max_actions - 1:
+                break
+            time.sleep(min(settle, remaining))
+            if postcondition():
+                return True
+            if time.monotonic() >= end_time:
+                break
+            print(f"Postcondition not met after attempt {attempt + 1}, trying again...")
+        return False
+
+    def is_toggle_on(self, locator_type: str, locator_value: str) -> bool:
+        """
+        Determine toggle state based on checked attribute
+        checked="true" means ON, checked="false" means OFF
         """
         try:
-            current_state = self.is_toggle_on(locator_type, locator_value)
-            if current_state != should_be_on:
-                self.click_element(locator_type, locator_value)
-                time.sleep(0.5)
-                return self.is_toggle_on(locator_type, locator_value) == should_be_on
-            return True
+            return self._run_on_element(locator_type, locator_value, self._is_toggle_element_on)
         except (NoSuchElementException, TimeoutException):
             return False
 
-    def _attempt_toggle_switch(self, locator_type: str, locator_value: str, should_be_on: bool) -> bool:
+    @staticmethod
+    def _is_toggle_element_on(element: WebElement) -> bool:
+        checked = element.get_attribute("checked")
+        print(f"Toggle checked attribute: {checked}")
+        return checked == "true"
+
+    def _switch_toggle(self, locator_type: str, locator_value: str, should_be_on: bool, budget: float = 5) -> bool:
         """
-        Try to switch toggle switch
+        Switch toggle to expected state on top of perform_until
+        The cached element is reused for click and state checks, it is only looked up
+        again if it goes stale. A toggle switch takes find + get_attribute + click + get_attribute.
 
         Args:
             locator_type: Locator type
             locator_value: Locator value
             should_be_on: Expected state
+            budget: Total time budget (seconds)
 
         Returns:
             bool: If successfully switched to expected state, return True, otherwise return False
         """
-        element = self.wait.until(
-            EC.element_to_be_clickable((locator_type, locator_value))
-        )
-        element.click()
-        time.sleep(1)
+        def run_on_element(operation):
+            return self._run_on_element(locator_type, locator_value, operation)
+
+        def is_expected_state() -> bool:
+            return run_on_element(self._is_toggle_element_on) == should_be_on
 
-        new_state = self.is_toggle_on(locator_type, locator_value)
-        print(f"Toggle New State: {'On' if new_state else 'Off'}")
+        current_state = run_on_element(self._is_toggle_element_on)
+        print(f"Toggle Current State: {'On' if current_state else 'Off'}")
+        if current_state == should_be_on:
+            print(f"Toggle is already {'On' if should_be_on else 'Off'}, no need to switch")
+            return True
 
-        return new_state == should_be_on
+        print(f"Switching toggle to {'On' if should_be_on else 'Off'} state")
+        switched = self.perform_until(lambda: run_on_element(lambda e: e.click()), is_expected_state, budget=budget)
+        if switched:
+            print(f"Toggle switched to {'On' if should_be_on else 'Off'} state successfully")
+        else:
+            print(f"Warning: Failed to switch toggle to {'On' if should_be_on else 'Off'} state within {budget} seconds")
+        return switched
 
-    def _switch_toggle_with_retry(self, locator_type: str, locator_value: str, should_be_on: bool) -> bool:
+    def toggle_switch(self, locator_type: str, locator_value: str, should_be_on: bool = True) -> bool:
         """
-        Toggle switch with retry mechanism
+        Switch Toggle (Switch) state
 
         Args:
             locator_type: Locator type
             locator_value: Locator value
-            should_be_on: Expected state
+            should_be_on: Expected state, True means ON, False means OFF
 
         Returns:
             bool: If successfully switched to expected state, return True, otherwise return False
         """
-        max_attempts = 3
-        for attempt in range(max_attempts):
-            try:
-                if self._attempt_toggle_switch(locator_type, locator_value, should_be_on):
-                    print(
-                        f"Toggle switched to {'On' if should_be_on else 'Off'} state successfully")
-                    return True
-
-                if attempt < max_attempts - 1:
-                    print(f"Attempt {attempt + 1} failed, trying again...")
-                    time.sleep(1)
-
-            except Exception as e:
-                print(f"Error during attempt {attempt + 1}: {str(e)}")
-                if attempt < max_attempts - 1:
-                    time.sleep(1)
-                    continue
-
-        print(
-            f"Warning: Failed to switch toggle to {'On' if should_be_on else 'Off'} state after {max_attempts} attempts")
-        return False
+        try:
+            return self._switch_toggle(locator_type, locator_value, should_be_on)
+        except (NoSuchElementException, TimeoutException):
+            return False
 
     @staticmethod
     def _handle_toggle_switch_error(locator_type: str, locator_value: str, error: Exception) -> bool:
@@ -667,7 +972,8 @@ class CommonActions:
                 f"Error: Unknown error occurred while switching toggle state: {str(error)}")
         return False
 
-    def toggle_switch_state(self, locator_type: str, locator_value: str, should_be_on: bool = True) -> bool:
+    def toggle_switch_state(self, locator_type: str, locator_value: str, should_be_on: bool = True,
+                            budget: float = 5) -> bool:
         """
         Switch Toggle (Switch) state
         - Force switch Toggle to specified state (should_be_on)
@@ -679,37 +985,27 @@ class CommonActions:
         common_actions.toggle_switch_state(By.ID, "my_toggle", should_be_on=True)
         # Output:
         # Toggle Current State: Off
-        # Toggle New State: On
+        # Switching toggle to On state
         # Toggle switched to On state successfully
 
         # Switch to OFF state
         common_actions.toggle_switch_state(By.ID, "my_toggle", should_be_on=False)
         # Output:
         # Toggle Current State: On
-        # Toggle New State: Off
+        # Switching toggle to Off state
         # Toggle switched to Off state successfully
 
         Args:
             locator_type: Locator type
             locator_value: Locator value
             should_be_on: Expected state, True means ON, False means OFF
+            budget: Total time budget for switching (seconds)
 
         Returns:
             bool: If successfully switched to expected state, return True, otherwise return False
         """
         try:
-            current_state = self.is_toggle_on(locator_type, locator_value)
-            print(f"Toggle Current State: {'On' if current_state else 'Off'}")
-
-            if current_state == should_be_on:
-                print(
-                    f"Toggle is already {'On' if should_be_on else 'Off'}, no need to switch")
-                return True
-
-            print(
-                f"Switching toggle to {'On' if should_be_on else 'Off'} state")
-            return self._switch_toggle_with_retry(locator_type, locator_value, should_be_on)
-
+            return self._switch_toggle(locator_type, locator_value, should_be_on, budget=budget)
         except (NoSuchElementException, TimeoutException, Exception) as e:
             return CommonActions._handle_toggle_switch_error(locator_type, locator_value, e)
 
@@ -724,7 +1020,7 @@ class CommonActions:
         '''Wait for multiple elements to be visible'''
         try:
             self.driver.implicitly_wait(0)
-            wait = WebDriverWait(self.driver, timeout)
+            wait = _wait(self.driver, timeout)
 
             def elements_visible(driver):
                 elements = driver.find_elements(locator_type, locator_value)
@@ -737,9 +1033,184 @@ class CommonActions:
             raise TimeoutException(
                 f"Expected at least {min_count} elements ({locator_type}={locator_value}) not visible after {timeout} seconds")
 
-    def scroll_to_element_up(self, locator_type: str, locator_value: str, scroll_container: str = "//android.widget.ScrollView", max_swipes: int = 5, timeout: float = 0.5) -> bool:
+    def wait_for_any(self, locators: Sequence[Locator], timeout: int = 30, visible: bool = True,
+                     poll_interval: float = 0.5) -> Tuple[Locator, WebElement]:
+        """
+        Wait until any of the locators matches, e.g. login screen vs. home vs. permission popup
+        All locators are checked in one polling loop against a single page source snapshot,
+        so the wait finishes as soon as the fastest condition is met
+
+        Example:
+        locator, element = common_actions.wait_for_any([
+            (AppiumBy.ACCESSIBILITY_ID, "login"),
+            (AppiumBy.ACCESSIBILITY_ID, "home"),
+        ], timeout=20)
+
+        Args:
+            locators: List of (locator_type, locator_value)
+            timeout: Maximum waiting time (seconds)
+            visible: Whether matched element must be visible, otherwise present is enough
+            poll_interval: Waiting time between polls (seconds)
+
+        Returns:
+            Tuple[Locator, WebElement]: Matched locator and its element
+
+        Raises:
+            TimeoutException: If none of the locators matches within specified time
+        """
+        locators = list(locators)
+        matched = self._poll_locators(locators, timeout, visible, poll_interval, require_all=False)
+        if matched is None:
+            raise TimeoutException(
+                f"None of the elements {locators} {'visible' if visible else 'present'} after {timeout} seconds")
+        return matched[0]
+
+    def wait_for_all(self, locators: Sequence[Locator], timeout: int = 30, visible: bool = True,
+                     poll_interval: float = 0.5) -> List[Tuple[Locator, WebElement]]:
+        """
+        Wait until all of the locators match in the same page source snapshot
+
+        Args:
+            locators: List of (locator_type, locator_value)
+            timeout: Maximum waiting time (seconds)
+            visible: Whether matched elements must be visible, otherwise present is enough
+            poll_interval: Waiting time between polls (seconds)
+
+        Returns:
+            List[Tuple[Locator, WebElement]]: Locators and elements, in the given order
+
+        Raises:
+            TimeoutException: If not all locators match within specified time
+        """
+        locators = list(locators)
+        matched = self._poll_locators(locators, timeout, visible, poll_interval, require_all=True)
+        if matched is None:
+            raise TimeoutException(
+                f"Not all elements {locators} {'visible' if visible else 'present'} after {timeout} seconds")
+        return matched
+
+    def _poll_locators(self, locators: List[Locator], timeout: float, visible: bool,
+                       poll_interval: float, require_all: bool) -> Optional[List[Tuple[Locator, WebElement]]]:
+        """
+        Polling loop shared by wait_for_any / wait_for_all
+
+        Each poll takes one page source snapshot and evaluates every locator it can
+        against it (id, accessibility id, class name, xpath). Other locator types
+        (e.g. -android uiautomator) fall back to a live find_elements call.
+        Live elements are only fetched for locators the snapshot reports as matched.
+        """
+        self.driver.implicitly_wait(0)
+        end_time = time.monotonic() + timeout
+        while True:
+            snapshot = self._get_page_snapshot()
+            matched = []
+            if require_all and any(
+                    self._snapshot_contains(snapshot, *locator, visible) is False for locator in locators):
+                locators_to_check = []
+            else:
+                locators_to_check = locators
+            for locator in locators_to_check:
+                element = self._match_locator(snapshot, locator, visible)
+                if element is not None:
+                    if self.cache_elements:
+                        self._element_cache[locator] = element
+                    matched.append((locator, element))
+                    if not require_all:
+                        return matched
+                elif require_all:
+                    break
+            if require_all and len(matched) == len(locators):
+                return matched
+
+            # The last poll happens at the deadline, an element showing up just before it still counts
+            remaining = end_time - time.monotonic()
+            if remaining <= 0:
+                return None
+            time.sleep(min(poll_interval, remaining))
+
+    def _get_page_snapshot(self):
+        """Parse current page source, None if lxml is missing or source is unparsable"""
+        try:
+            from lxml import etree
+        except ImportError:  # Without lxml every locator is checked with a live find_elements
+            return None
+        try:
+            return etree.fromstring(self.driver.page_source.encode('utf-8'))
+        except Exception as e:
+            print(f"Unable to parse page source snapshot: {str(e)}")
+            return None
+
+    def _match_locator(self, snapshot, locator: Locator, visible: bool) -> Optional[WebElement]:
+        """Return live element if locator matches, checking the snapshot first when possible"""
+        locator_type, locator_value = locator
+        in_snapshot = self._snapshot_contains(snapshot, locator_type, locator_value, visible)
+        if in_snapshot is False:
+            return None
+
+        try:
+            elements = self.driver.find_elements(locator_type, locator_value)
+        except Exception:
+            return None
+        for element in elements:
+            try:
+                # Snapshot already confirmed visibility, skip extra round trip
+                if not visible or in_snapshot or element.is_displayed():
+                    return element
+            except StaleElementReferenceException:
+                continue
+        return None
+
+    @staticmethod
+    def _snapshot_contains(snapshot, locator_type: str, locator_value: str, visible: bool) -> Optional[bool]:
+        """
+        Evaluate locator against a page source snapshot
+
+        Returns:
+            Optional[bool]: True/False if locator could be evaluated, None if it needs a live lookup
+        """
+        if snapshot is None:
+            return None
+        # A snapshot only exists when lxml could be imported
+        from lxml import etree
+
+        if locator_type == By.XPATH:
+            try:
+                nodes = snapshot.xpath(locator_value)
+            except etree.XPathError:
+                return None
+            if not isinstance(nodes, list):
+                return None
+            nodes = [node for node in nodes if isinstance(node, etree._Element)]
+        elif locator_type == By.ID:
+            suffix = f":id/{locator_value}"
+            nodes = [node for node in snapshot.iter()
+                     if node.get('resource-id') == locator_value
+                     or (node.get('resource-id') or '').endswith(suffix)
+                     or node.get('name') == locator_value]
+        elif locator_type == 'accessibility id':
+            nodes = [node for node in snapshot.iter()
+                     if node.get('content-desc') == locator_value or node.get('name') == locator_value]
+        elif locator_type == By.CLASS_NAME:
+            nodes = [node for node in snapshot.iter()
+                     if node.tag == locator_value or node.get('class') == locator_value]
+        else:
+            return None
+
+        if not visible:
+            return bool(nodes)
+        for node in nodes:
+            # UiAutomator2 exposes "displayed", XCUITest exposes "visible"
+            flag = node.get('displayed', node.get('visible'))
+            if flag is None:
+                return None
+            if flag == 'true':
+                return True
+        return False
+
+    def scroll_to_element_up(self, locator_type: str, locator_value: str, scroll_container: str = "//android.widget.ScrollView", max_swipes: int = 5, timeout: float = 0.5, screen: str = None) -> bool:
         """
         Scroll up in ScrollView until finding specified element
+        With a scroll index, swipes that found the element before are replayed first
 
         Args:
             locator_type: Locator type (e.g. AppiumBy.ID)
@@ -747,6 +1218,7 @@ class CommonActions:
             scroll_container: ScrollView container xpath, default is "//android.widget.ScrollView"
             max_swipes: Maximum swipe count, default is 5
             timeout: Waiting time after each swipe (seconds), default is 0.5 seconds
+            screen: Screen name for the scroll index, defaults to current activity (Android)
 
         Returns:
             bool: If element is found and visible, return True, otherwise return False
@@ -764,6 +1236,13 @@ class CommonActions:
         # Get screen size
         screen_width, screen_height = self.get_screen_size()
 
+        # Replay swipes learned from previous searches
+        index_key = self._get_scroll_index_key(
+            'up', locator_type, locator_value, scroll_container, screen, (screen_width, screen_height))
+        performed_swipes = []
+        if self._replay_learned_scroll(index_key, locator_type, locator_value, timeout, performed_swipes):
+            return True
+
         # Initialize swipe parameters (move screen up: finger from top to bottom)
         start_x = screen_width // 2
         start_y = int(screen_height * 0.30)  # Start from 30% position (top)
@@ -798,33 +1277,35 @@ class CommonActions:
 
         # Execute swipe
         swipe_count = 0
-        last_page_source = self.driver.page_source  # Record page content to detect if really swiped
+        last_screen_state = self._capture_screen_state()  # Record screen to detect if really swiped
 
         while swipe_count < max_swipes:
             try:
 
                 # Execute upward swipe (use the same parameters as downward swipe)
                 self.swipe(start_x, start_y, start_x, end_y, duration=1500)
-                time.sleep(timeout)
+                performed_swipes.append([start_x, start_y, start_x, end_y])
+                self._wait_after_swipe(timeout)
 
                 # Check if element is visible
                 try:
                     element = self.driver.find_element(
                         locator_type, locator_value)
                     if element.is_displayed():
+                        self._learn_scroll(index_key, performed_swipes)
                         return True
                 except (NoSuchElementException, StaleElementReferenceException):
                     pass
 
-                # Check if really swiped (by comparing page content)
-                current_page_source = self.driver.page_source
-                if current_page_source == last_page_source:
+                # Check if really swiped (by comparing page content or screen)
+                current_screen_state = self._capture_screen_state()
+                if not self._has_screen_state_changed(last_screen_state, current_screen_state):
                     print("Page content not changed, swipe may be无效")
                     # Try using larger swipe distance (move screen up: finger from top to bottom)
                     start_y = int(screen_height * 0.1)
                     end_y = int(screen_height * 0.9)
 
-                last_page_source = current_page_source
+                last_screen_state = current_screen_state
                 swipe_count += 1
 
             except Exception as e:
@@ -1,25 +1,30 @@
 import time
-import pytest
 import unittest
 import os
-from dotenv import dotenv_values
-from appium.webdriver import Remote
-from appium.options.android import UiAutomator2Options
-from appium.options.ios import XCUITestOptions
-from utils.initial_setup import get_app_path_for_environment
+from typing import TYPE_CHECKING
+from utils.config import get_config, get_bool
+from utils.session_registry import get_current_nodeid, get_registry, get_device_name
+from utils.driver_hooks import add_command_listener, instrument_driver
+from utils.step_timing import command_counter
 
+# Appium client, option classes and app path helpers are imported where they are used,
+# so collection (pytest --collect-only) and xdist worker startup do not pay for them
+if TYPE_CHECKING:
+    from appium.webdriver import Remote
 
-# TODO: Move the config and options to a separate file
-config = dotenv_values(".env")
 
-# In CI environment, read from environment variables if .env is not available
-if not config:
-    config = os.environ
+def __getattr__(name):
+    """Module level settings kept for backwards compatibility, resolved on first access"""
+    if name == 'config':
+        return get_config()
+    if name == 'noReset_bool':
+        return get_bool('NO_RESET')
+    if name == 'platform':
+        return get_config().get('APPIUM_OS', 'ios')
+    if name == 'auto_accept_alerts_bool':
+        return get_bool('AUTO_ACCEPT_ALERTS')
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
-# Set default values
-noReset_bool = config.get('NO_RESET', 'true').lower() == 'true'
-platform = config.get('APPIUM_OS', 'ios')
-auto_accept_alerts_bool = config.get('AUTO_ACCEPT_ALERTS', 'true').lower() == 'true'
 
 def _is_browserstack():
     """Check if using BrowserStack based on runner setting"""
@@ -27,13 +32,14 @@ def _is_browserstack():
     return os.getenv('CURRENT_TEST_RUNNER') == 'browserstack'
 
 
-def _get_browserstack_app_id():
-    """Get BrowserStack app ID based on environment and platform"""
+def _get_browserstack_app_id(platform: str = None):
+    """Get BrowserStack app ID based on environment and platform (APPIUM_OS if not specified)"""
+    config = get_config()
     env = os.getenv('APPIUM_ENV') or config.get('APPIUM_ENV', 'staging')
     env = env.lower()
     
-    # Get platform from APPIUM_OS environment variable
-    platform = os.getenv('APPIUM_OS', 'ios').lower()
+    # Roles pass their own platform, single sessions follow APPIUM_OS
+    platform = (platform or os.getenv('APPIUM_OS', 'ios')).lower()
     
     # Normalize platform names
     if platform == 'android':
@@ -71,6 +77,7 @@ def _get_browserstack_app_id():
 
 def _create_browserstack_options(platform='android'):
     """Create BrowserStack configuration options"""
+    config = get_config()
     # Use platform-specific device settings
     if platform == 'ios':
         device_name = config.get('BROWSERSTACK_IOS_DEVICE_NAME', 'iPhone 15 Pro')
@@ -98,12 +105,15 @@ def _create_browserstack_options(platform='android'):
 
 def _configure_android_ci_options(platform='android'):
     """Configure Android options for CI/BrowserStack environment"""
+    from appium.options.android import UiAutomator2Options
+
+    config = get_config()
     browserstack_options = _create_browserstack_options(platform)
     
     options = UiAutomator2Options()
     options.platform_name = 'Android'
     options.automation_name = 'UiAutomator2'
-    options.app = _get_browserstack_app_id()
+    options.app = _get_browserstack_app_id(platform)
     
     # Use Android-specific device configuration
     options.device_name = config.get('BROWSERSTACK_ANDROID_DEVICE_NAME', 'Google Pixel 8')
@@ -125,6 +135,9 @@ def _configure_android_ci_options(platform='android'):
 
 def _configure_ios_ci_options(platform='ios'):
     """Configure iOS options for CI/BrowserStack environment"""
+    from appium.options.ios import XCUITestOptions
+
+    config = get_config()
     browserstack_options = _create_browserstack_options(platform)
     
     options = XCUITestOptions()
@@ -132,34 +145,41 @@ def _configure_ios_ci_options(platform='ios'):
     options.automation_name = 'XCUITest'
     options.device_name = config.get('BROWSERSTACK_IOS_DEVICE_NAME', 'iPhone 15 Pro')
     options.platform_version = config.get('BROWSERSTACK_IOS_OS_VERSION', '17')
-    options.app = _get_browserstack_app_id()
+    options.app = _get_browserstack_app_id(platform)
     
     options.set_capability('autoAcceptAlerts', True)
     options.set_capability('autoGrantPermissions', True)
     options.set_capability('bstack:options', browserstack_options)
     options.set_capability('simulatorStartupTimeout', 60000)
     options.set_capability('disableAnimation', False)
-    options.set_capability('noReset', noReset_bool)
+    options.set_capability('noReset', get_bool('NO_RESET'))
     return options
 
 
 def _configure_android_local_options():
     """Configure Android options for local environment"""
+    from appium.options.android import UiAutomator2Options
+    from utils.initial_setup import get_app_path_for_environment
+
     options = UiAutomator2Options()
     options.platform_name = 'Android'
     options.automation_name = 'UiAutomator2'
     options.set_capability('language', 'zh')
     options.set_capability('locale', 'TW')
     options.set_capability('app', get_app_path_for_environment('android'))
-    options.set_capability('noReset', noReset_bool)
+    options.set_capability('noReset', get_bool('NO_RESET'))
     options.set_capability('autoGrantPermissions', True)
-    options.set_capability('autoAcceptAlerts', auto_accept_alerts_bool)
+    options.set_capability('autoAcceptAlerts', get_bool('AUTO_ACCEPT_ALERTS'))
     options.set_capability('skipUnlock', True)
     return options
 
 
 def _configure_ios_local_options():
     """Configure iOS options for local environment"""
+    from appium.options.ios import XCUITestOptions
+    from utils.initial_setup import get_app_path_for_environment
+
+    config = get_config()
     options = XCUITestOptions()
     options.platform_name = 'iOS'
     options.automation_name = 'XCUITest'
@@ -181,26 +201,25 @@ def _configure_ios_local_options():
     
     options.set_capability('simulatorStartupTimeout', '90000')
     options.set_capability('app', get_app_path_for_environment('ios'))
-    options.set_capability('noReset', noReset_bool)
-    options.set_capability('autoAcceptAlerts', auto_accept_alerts_bool)
+    options.set_capability('noReset', get_bool('NO_RESET'))
+    options.set_capability('autoAcceptAlerts', get_bool('AUTO_ACCEPT_ALERTS'))
     options.set_capability('autoGrantPermissions', True)
     return options
 
 
 def _get_appium_server_url():
     """Get appropriate Appium server URL based on environment"""
+    config = get_config()
     if _is_browserstack():
         return config.get('BROWSERSTACK_HUB_URL', 'https://hub-cloud.browserstack.com/wd/hub')
     return config.get('APPIUM_SERVER_URL', 'http://127.0.0.1:4723')
 
 
 class AppiumSetup(unittest.TestCase):
-    def _get_options(self):
+    def _get_options(self, platform: str = None):
         """Get Appium options based on platform and environment"""
-        global config, noReset_bool
-        
         # Get platform from environment variable set by conftest.py
-        platform = os.getenv('APPIUM_OS', 'ios')
+        platform = platform or os.getenv('APPIUM_OS', 'ios')
         is_browserstack_env = _is_browserstack()
         print(f"DEBUG: platform={platform}, is_browserstack={is_browserstack_env}")
         
@@ -226,27 +245,90 @@ class AppiumSetup(unittest.TestCase):
         
         raise ValueError(f"Unsupported platform for local: {platform}")
     
-    def setUp(self) -> Remote:
-        """Set up Appium driver"""
+    def setUp(self, platform: str = None, capabilities: dict = None, role: str = None) -> 'Remote':
+        """
+        Set up Appium driver
+
+        Args:
+            platform: android or ios, APPIUM_OS if not specified
+            capabilities: Capabilities overriding the generated options (e.g. device udid, app)
+            role: Actor name in multi-role tests, recorded in the session registry
+        """
+        from appium.webdriver import Remote
+
+        # Soak runs repeat the scenarios against the session of the first iteration
+        if self._reuse_soak_session(role):
+            return self.driver
+
         # Setting global variables
+        config = get_config()
         self.config = config
-        self.platform = platform
-        self.noReset_bool = noReset_bool
+        self.platform = platform or os.getenv('APPIUM_OS', 'ios')
+        self.noReset_bool = get_bool('NO_RESET')
+        self.role = role
 
         # Create screenshots directory only in local environment
         self._create_screenshots_directory()
 
         # Get options and create driver
-        options = self._get_options()
+        target_platform = self.platform
+        options = self._get_options(target_platform)
+        for name, value in (capabilities or {}).items():
+            options.set_capability(name, value)
+        device_key = self._avoid_quarantined_device(options, target_platform)
         appium_server_url = _get_appium_server_url()
-        self.driver = Remote(appium_server_url, options=options)
+        command_executor = self._create_command_executor(appium_server_url, target_platform)
+        try:
+            self.driver = Remote(command_executor, options=options)
+        except Exception as e:
+            self._record_infrastructure_failure(device_key, e)
+            raise
+        instrument_driver(self.driver)
+        add_command_listener(command_counter)
+        self._track_health(device_key)
+        self._watch_for_hangs()
         self.driver.implicitly_wait(int(config.get('IMPLICIT_WAIT', '25')))
 
-        # Save BrowserStack session ID if using BrowserStack
-        self._save_session_id_if_browserstack()
+        # Apply the configured Appium settings profile (waitForIdleTimeout, snapshot depth, ...)
+        self._apply_settings_profile(target_platform)
+
+        # Register session so it can be matched with the test outcome after the run
+        self._register_session()
 
+        # Sample device performance in the background if enabled
+        self._start_performance_sampler(target_platform)
+
+        from utils.soak import share_setup
+
+        share_setup(self, role)
         return self.driver
+
+    def _reuse_soak_session(self, role: str = None) -> bool:
+        """Take over the driver of the soak session of this role, False outside soak mode"""
+        from utils.soak import get_shared_setup
+
+        shared = get_shared_setup(role)
+        if shared is None:
+            return False
+        self._soak_setup = shared
+        self.config = shared.config
+        self.platform = shared.platform
+        self.noReset_bool = shared.noReset_bool
+        self.role = role
+        self.driver = shared.driver
+        self._register_session()
+        return True
     
+    def _create_command_executor(self, appium_server_url: str, platform: str):
+        """Server URL, or a recording / replaying executor when CASSETTE_MODE is record or replay"""
+        self.cassette_mode = get_config().get('CASSETTE_MODE', 'off').lower()
+        if self.cassette_mode == 'off':
+            return appium_server_url
+        from utils.cassette import cassette_path, create_connection
+
+        path = cassette_path(get_current_nodeid() or 'session', platform, self.role)
+        return create_connection(self.cassette_mode, appium_server_url, path)
+
     def _create_screenshots_directory(self):
         """Create screenshots directory for local environment"""
         if not _is_browserstack():
@@ -256,17 +338,147 @@ class AppiumSetup(unittest.TestCase):
             )
             os.makedirs(screenshots_dir, exist_ok=True)
     
-    def _save_session_id_if_browserstack(self):
-        """Save BrowserStack session ID if using BrowserStack"""
-        if _is_browserstack():
-            with open('browserstack_session_id.txt', 'w') as f:
-                f.write(self.driver.session_id)
+    def _avoid_quarantined_device(self, options, platform: str):
+        """
+        Move to a healthy pool device when the configured local device is quarantined
+
+        Returns:
+            Health key of the device the session will run on, None on BrowserStack
+            (every BrowserStack session gets its own device, only the session is tracked)
+        """
+        self._device_pool = None
+        self._leased_device = None
+        if _is_browserstack() or not get_bool('DEVICE_CIRCUIT_BREAKER'):
+            return None
+        from utils.circuit_breaker import DeviceQuarantinedError, get_circuit_breaker, get_device_key
+
+        breaker = get_circuit_breaker()
+        device_key = get_device_key(options.to_capabilities())
+        if device_key is None or not breaker.is_open(device_key):
+            return device_key
+
+        from utils.multi_role import DevicePool
+
+        pool = DevicePool.from_file()
+        leased = pool.try_acquire_all({'main': platform}) if pool.devices else None
+        if not leased:
+            raise DeviceQuarantinedError(f"{device_key} is quarantined and no healthy pool device is free: "
+                                         f"{breaker.reason(device_key)}")
+        self._device_pool, self._leased_device = pool, leased['main']
+        for name, value in self._leased_device.get('capabilities', {}).items():
+            options.set_capability(name, value)
+        print(f"{device_key} is quarantined, moved to pool device {self._leased_device['name']}")
+        return get_device_key(self._leased_device.get('capabilities', {}))
+
+    def _record_infrastructure_failure(self, device_key, error: Exception):
+        """Count a failed session start against the device"""
+        if device_key is None:
+            return
+        from utils.circuit_breaker import get_circuit_breaker, is_infrastructure_error
+
+        if is_infrastructure_error(error):
+            get_circuit_breaker().record_failure(device_key, error)
+
+    def _track_health(self, device_key):
+        """Count infrastructure failures of the session (and local device), fail fast once quarantined"""
+        if not get_bool('DEVICE_CIRCUIT_BREAKER'):
+            return
+        from utils.circuit_breaker import get_health_listener
+
+        self.driver._health_keys = [f"session:{self.driver.session_id}"] + ([device_key] if device_key else [])
+        add_command_listener(get_health_listener())
+
+    def _watch_for_hangs(self):
+        """Dump driver commands that hang longer than HANG_COMMAND_TIMEOUT, the socket timeout cuts them off"""
+        from utils.watchdog import get_watchdog
+
+        watchdog = get_watchdog()
+        if watchdog is None:
+            return
+        watchdog.limit_socket_timeout(self.driver)
+        add_command_listener(watchdog)
+
+    def _apply_settings_profile(self, platform: str):
+        """Apply APPIUM_SETTINGS_PROFILE, screens switch profiles with CommonActions.settings_profile"""
+        profile = get_config().get('APPIUM_SETTINGS_PROFILE')
+        if not profile:
+            return
+        from utils.appium_settings import get_settings_manager
+
+        try:
+            get_settings_manager(self.driver, platform).apply(profile)
+        except Exception as e:
+            print(f"Unable to apply Appium settings profile {profile}: {str(e)}")
+
+    def _register_session(self):
+        """Append session to the shared registry (safe under xdist)"""
+        get_registry().begin(self.driver.session_id, device=get_device_name(self.driver), role=self.role)
+
+    def _start_performance_sampler(self, platform: str):
+        """Start background performance sampler when PERF_SAMPLING is enabled"""
+        self.performance_sampler = None
+        # Background sampling commands would interleave differently on every run
+        if not get_bool('PERF_SAMPLING', 'false') or self.cassette_mode != 'off':
+            return
+        from utils.performance_sampler import PerformanceSampler, register_sampler
+
+        self.performance_sampler = PerformanceSampler(
+            self.driver,
+            platform=platform,
+            interval=float(get_config().get('PERF_SAMPLING_INTERVAL', '1.0')),
+            frame_stats=get_bool('PERF_FRAME_STATS'),
+            role=self.role,
+        )
+        self.performance_sampler.start()
+        register_sampler(self.performance_sampler)
+
+    def _stop_performance_sampler(self):
+        """Stop sampler and export scenario summary"""
+        sampler = getattr(self, 'performance_sampler', None)
+        if sampler is None:
+            return
+        from utils.performance_sampler import unregister_sampler
+
+        unregister_sampler(sampler)
+        try:
+            sampler.stop()
+            sampler.export()
+        except Exception as e:
+            print(f"Unable to export performance data: {str(e)}")
 
     def tearDown(self) -> None:
         """Clean up Appium driver"""
+        from utils.soak import is_shared
+
+        # Soak sessions stay open until the last iteration
+        if getattr(self, '_soak_setup', None) is not None or is_shared(self):
+            return
+        self._stop_performance_sampler()
+        text_input = getattr(self.driver, '_text_input', None)
+        if text_input is not None:
+            print(f"Text input strategies:\n{text_input.report()}")
         if self.driver:
-            self.driver.quit()
-            time.sleep(10)
+            try:
+                self.driver.quit()
+            finally:
+                if getattr(self, '_leased_device', None):
+                    self._device_pool.release(self._leased_device)
+                if getattr(self, 'cassette_mode', 'off') == 'record':
+                    self.driver.command_executor.save()
+            if getattr(self, 'cassette_mode', 'off') == 'replay':
+                # Unused recorded commands mean the test skipped steps, unless it already failed
+                if not self._test_failed():
+                    self.driver.command_executor.assert_consumed()
+            else:
+                time.sleep(10)
+
+    def _test_failed(self) -> bool:
+        """Whether the running test already failed, per unittest or the pytest reports in the session registry"""
+        outcome = getattr(self, '_outcome', None)
+        if outcome is not None and not outcome.success:
+            return True
+        nodeid = get_current_nodeid()
+        return nodeid is not None and get_registry().has_failed(nodeid)
 
 
 if __name__ == '__main__':
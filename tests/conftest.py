@@ -0,0 +1,238 @@
+import json
+import os
+
+import pytest
+
+from utils.config import get_bool, get_config
+from utils.session_registry import get_registry, push_session_statuses
+from utils import performance_sampler, step_timing
+from utils.circuit_breaker import format_quarantine_report, get_circuit_breaker
+from utils.watchdog import get_watchdog
+
+
+step_recorder = step_timing.StepTimingRecorder()
+
+
+def _is_xdist_worker(config) -> bool:
+    return hasattr(config, 'workerinput')
+
+
+def pytest_addoption(parser):
+    group = parser.getgroup('impact', 'test impact selection')
+    group.addoption('--impact-base', default=get_config().get('TEST_IMPACT_BASE'),
+                    help='Git ref to diff against, run only affected tests plus @smoke tests')
+    group.addoption('--impact-record', action='store_true',
+                    default=get_bool('TEST_IMPACT_RECORD', 'false'),
+                    help='Record functions and locators every test touches into the impact index')
+    group = parser.getgroup('soak', 'soak / endurance runs')
+    group.addoption('--soak-iterations', type=int, default=get_config().get('SOAK_ITERATIONS'),
+                    help='Repeat the selected tests this many times against one session')
+    group.addoption('--soak-duration', default=get_config().get('SOAK_DURATION'),
+                    help='Repeat the selected tests for this long, e.g. 900, 30m or 2h')
+    group.addoption('--soak-warmup', type=int, default=int(get_config().get('SOAK_WARMUP', '2')),
+                    help='Iterations excluded from the memory growth trend')
+
+
+def pytest_configure(config):
+    config.addinivalue_line(
+        'markers', 'roles(**roles): actors of a multi-role scenario, role name -> platform or RoleSpec')
+    config.addinivalue_line('markers', 'smoke: always selected by --impact-base')
+    base, record = config.getoption('impact_base'), config.getoption('impact_record')
+    if base or record:
+        from utils.impact import ImpactPlugin
+
+        config.pluginmanager.register(ImpactPlugin(config, record=record, base=base), 'test_impact')
+    iterations, duration = config.getoption('soak_iterations'), config.getoption('soak_duration')
+    if iterations or duration:
+        _register_soak_plugin(config, iterations, duration)
+
+
+def _register_soak_plugin(config, iterations, duration):
+    if _is_xdist_worker(config) or getattr(config.option, 'numprocesses', None):
+        raise pytest.UsageError('Soak runs keep one session per process, run them without -n')
+    from utils.soak import SoakPlugin, parse_duration
+
+    plugin = SoakPlugin(iterations=int(iterations) if iterations else None,
+                        duration=parse_duration(duration) if duration else None,
+                        warmup=config.getoption('soak_warmup'))
+    config.pluginmanager.register(plugin, 'soak')
+
+
+def pytest_sessionstart(session):
+    # Only the controller clears the registry, workers append to it
+    if not _is_xdist_worker(session.config):
+        get_registry().reset()
+        performance_sampler.reset_summaries()
+        step_timing.reset_records()
+        get_circuit_breaker().reset()
+
+
+def pytest_bdd_before_step(request, feature, scenario, step, step_func):
+    performance_sampler.set_current_step(step.name)
+    try:
+        step_index = scenario.steps.index(step)
+    except ValueError:
+        step_index = step.line_number
+    key = step_timing.make_step_key(feature.rel_filename, scenario.name, step_index, step.type, step_func.__name__)
+    step_recorder.start_step(key, f"{step.keyword} {step.name}")
+
+
+def pytest_bdd_after_step(request, feature, scenario, step, step_func, step_func_args):
+    step_recorder.end_step()
+
+
+def pytest_bdd_step_error(request, feature, scenario, step, step_func, step_func_args, exception):
+    step_recorder.end_step(failed=True)
+
+
+def pytest_bdd_after_scenario(request, feature, scenario):
+    records = step_recorder.pop_scenario_records()
+    if records:
+        import allure
+
+        allure.attach(json.dumps(records, indent=2, ensure_ascii=False), name='Step timing',
+                      attachment_type=allure.attachment_type.JSON)
+
+
+@pytest.fixture
+def roles(request):
+    """One driver and CommonActions per role declared with @pytest.mark.roles"""
+    marker = request.node.get_closest_marker('roles')
+    if marker is None or not marker.kwargs:
+        pytest.fail("roles fixture needs @pytest.mark.roles(customer='android', courier='android')")
+    from utils.multi_role import MultiRoleSession
+
+    session = MultiRoleSession(marker.kwargs)
+    session.start()
+    yield session
+    session.close()
+
+
+def pytest_runtest_setup(item):
+    watchdog = get_watchdog()
+    if watchdog is not None:
+        watchdog.start_test(item.nodeid)
+
+
+def pytest_runtest_teardown(item, nextitem):
+    # The wall-clock limit covers setup and call, a failed setup has no call report ending it
+    watchdog = get_watchdog()
+    if watchdog is not None:
+        watchdog.end_test()
+
+
+@pytest.hookimpl(hookwrapper=True)
+def pytest_runtest_makereport(item, call):
+    outcome = yield
+    report = outcome.get_result()
+    if report.when == 'call':
+        _check_test_deadline(report)
+    _attach_hang_dumps(item, report)
+    registry = get_registry()
+    registry.record_outcome(item.nodeid, report.outcome)
+    if report.when == 'teardown':
+        registry.finish(item.nodeid)
+
+
+def pytest_sessionfinish(session, exitstatus):
+    registry = get_registry()
+    registry.flush_pending()
+    if not _is_xdist_worker(session.config):
+        push_session_statuses(registry.records())
+        _report_performance(session)
+        _report_step_timing(session)
+        _report_quarantined_devices()
+
+
+def _check_test_deadline(report):
+    """Fail a test that ran past its TEST_TIMEOUT wall-clock limit"""
+    watchdog = get_watchdog()
+    if watchdog is None:
+        return
+    overrun = watchdog.end_test()
+    if overrun is None:
+        return
+    if report.passed:
+        report.outcome = 'failed'
+        report.longrepr = f"Hang watchdog: {overrun}"
+    else:
+        report.sections.append(('hang watchdog', overrun))
+
+
+def _attach_hang_dumps(item, report):
+    """Add hang watchdog dumps of the test to its report"""
+    watchdog = get_watchdog()
+    if watchdog is None:
+        return
+    for path in watchdog.pop_hangs(item.nodeid):
+        with open(path, 'r', encoding='utf-8') as f:
+            dump = f.read()
+        report.sections.append(('hang watchdog', dump))
+        try:
+            import allure
+
+            allure.attach(dump, name='Hang watchdog dump', attachment_type=allure.attachment_type.TEXT)
+        except Exception:
+            pass
+
+
+def _report_quarantined_devices():
+    """List devices and sessions the circuit breaker took out of the run"""
+    quarantined = get_circuit_breaker().quarantined()
+    if not quarantined:
+        return
+    print("\nQuarantined devices / sessions:")
+    for line in format_quarantine_report(quarantined):
+        print(f"  {line}")
+
+
+def _report_performance(session):
+    """Compare scenario performance summaries of all workers against the baseline"""
+    summaries = performance_sampler.collect_summaries()
+    if not summaries:
+        return
+
+    config = get_config()
+    baseline_path = config.get('PERF_BASELINE_PATH')
+    if not baseline_path:
+        return
+    if get_bool('PERF_UPDATE_BASELINE', 'false'):
+        performance_sampler.write_baseline(baseline_path, summaries)
+        print(f"Performance baseline updated: {baseline_path}")
+        return
+
+    tolerance = float(config.get('PERF_REGRESSION_TOLERANCE', '0.2'))
+    regressions = performance_sampler.compare_to_baseline(
+        summaries, performance_sampler.load_baseline(baseline_path), tolerance)
+    for regression in regressions:
+        print(f"Performance regression in {regression['nodeid']}: {regression['metric']} "
+              f"{regression['stat']} {regression['baseline']} -> {regression['current']}")
+    if regressions and get_bool('PERF_FAIL_ON_REGRESSION', 'false'):
+        session.exitstatus = pytest.ExitCode.TESTS_FAILED
+
+
+def _report_step_timing(session):
+    """Aggregate step timings of all workers, flag regressed steps and roll the baseline"""
+    summary = step_timing.aggregate(step_timing.collect_records())
+    if not summary:
+        return
+
+    config = get_config()
+    baseline_path = config.get('STEP_BASELINE_PATH', step_timing.DEFAULT_BASELINE_PATH)
+    baseline = step_timing.load_baseline(baseline_path)
+    regressions = step_timing.find_regressions(
+        summary, baseline,
+        threshold=float(config.get('STEP_REGRESSION_THRESHOLD', '0.25')),
+        min_delta_ms=float(config.get('STEP_REGRESSION_MIN_DELTA_MS', '200')),
+    )
+    report = step_timing.format_report(summary, regressions)
+    print(f"\n{report}")
+
+    alluredir = session.config.getoption('allure_report_dir', None)
+    if alluredir:
+        step_timing.write_allure_report(alluredir, report, regressions)
+    accept = get_bool('STEP_ACCEPT_REGRESSIONS', 'false')
+    step_timing.update_baseline(baseline_path, baseline, summary, regressions=regressions, accept_regressions=accept)
+    if regressions:
+        print(f"{len(regressions)} regressed step(s) accepted into the baseline" if accept else
+              "Regressed steps are kept out of the baseline, set STEP_ACCEPT_REGRESSIONS=true to accept them")
@@ -0,0 +1,119 @@
+import json
+import os
+
+import pytest
+
+from utils.allure_merge import AllureMerger, merge_history_files, merge_trend_files
+
+
+def _write(path, data):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(data, f)
+
+
+def _read(path):
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def _result(directory, uuid, history_id, status, stop, attachment=None):
+    result = {'uuid': uuid, 'historyId': history_id, 'status': status, 'start': stop - 10, 'stop': stop}
+    if attachment:
+        result['attachments'] = [{'name': 'screenshot', 'source': attachment, 'type': 'image/png'}]
+    _write(os.path.join(directory, f"{uuid}-result.json"), result)
+
+
+def _results(output):
+    return {name: _read(os.path.join(output, name)) for name in os.listdir(output) if name.endswith('-result.json')}
+
+
+@pytest.fixture
+def shards(tmp_path):
+    first, second = str(tmp_path / 'shard-1'), str(tmp_path / 'shard-2')
+    _result(first, 'a1', 'test_a', 'failed', 100, attachment='shot-1.png')
+    _result(second, 'a2', 'test_a', 'passed', 200, attachment='shot-2.png')
+    _result(second, 'b1', 'test_b', 'passed', 150, attachment='shot-3.png')
+    for directory, name in ((first, 'shot-1.png'), (second, 'shot-2.png'), (second, 'shot-3.png')):
+        with open(os.path.join(directory, name), 'wb') as f:
+            f.write(b'same screenshot')
+    _write(os.path.join(first, 'c1-container.json'), {'uuid': 'c1', 'children': ['a1']})
+    _write(os.path.join(second, 'c2-container.json'), {'uuid': 'c2', 'children': ['a2', 'b1']})
+    return [first, second]
+
+
+def test_keeps_last_attempt_and_marks_flaky(shards, tmp_path):
+    output = str(tmp_path / 'merged')
+
+    stats = AllureMerger(shards, output).merge()
+
+    results = _results(output)
+    assert sorted(results) == ['a2-result.json', 'b1-result.json']
+    assert results['a2-result.json']['statusDetails'] == {'flaky': True}
+    assert 'statusDetails' not in results['b1-result.json']
+    assert stats['dropped_retries'] == 1
+    # The container of the dropped attempt has no children left
+    assert sorted(name for name in os.listdir(output) if name.endswith('-container.json')) == ['c2-container.json']
+
+
+def test_identical_attachments_are_stored_once(shards, tmp_path):
+    output = str(tmp_path / 'merged')
+
+    stats = AllureMerger(shards, output).merge()
+
+    sources = {result['attachments'][0]['source'] for result in _results(output).values()}
+    assert len(sources) == 1
+    assert os.path.exists(os.path.join(output, sources.pop()))
+    assert stats['attachments'] == 1
+    assert stats['duplicate_attachments'] == 1
+
+
+def test_keep_retries(shards, tmp_path):
+    output = str(tmp_path / 'merged')
+
+    AllureMerger(shards, output, keep_retries=True).merge()
+
+    assert sorted(_results(output)) == ['a1-result.json', 'a2-result.json', 'b1-result.json']
+
+
+def test_output_must_not_be_an_input(shards):
+    with pytest.raises(ValueError):
+        AllureMerger(shards, shards[0]).merge()
+
+
+def test_previous_history_is_merged(shards, tmp_path):
+    previous = str(tmp_path / 'gh-pages' / 'last-history')
+    _write(os.path.join(previous, 'history.json'), {
+        'test_a': {'items': [{'uid': 'old', 'status': 'passed', 'time': {'start': 10}}]}})
+    _write(os.path.join(previous, 'history-trend.json'), [{'buildOrder': 1, 'data': {'passed': 2}}])
+    output = str(tmp_path / 'merged')
+
+    AllureMerger(shards, output, history_dirs=[previous]).merge()
+
+    history = _read(os.path.join(output, 'history', 'history.json'))
+    assert history['test_a']['statistic']['total'] == 1
+    assert _read(os.path.join(output, 'history', 'history-trend.json')) == [{'buildOrder': 1, 'data': {'passed': 2}}]
+
+
+def test_merge_history_files_newest_first_within_limit(tmp_path):
+    first, second = str(tmp_path / 'first.json'), str(tmp_path / 'second.json')
+    _write(first, {'test_a': {'items': [{'uid': f"u{index}", 'status': 'passed', 'time': {'start': index}}
+                                        for index in range(3)]}})
+    _write(second, {'test_a': {'items': [{'uid': 'u2', 'status': 'passed', 'time': {'start': 2}},
+                                         {'uid': 'u3', 'status': 'failed', 'time': {'start': 3}}]}})
+
+    history = merge_history_files([first, second, str(tmp_path / 'missing.json')], limit=3)
+
+    assert [item['uid'] for item in history['test_a']['items']] == ['u3', 'u2', 'u1']
+    assert history['test_a']['statistic'] == {'failed': 1, 'broken': 0, 'skipped': 0, 'passed': 2,
+                                              'unknown': 0, 'total': 3}
+
+
+def test_merge_trend_files_one_entry_per_build(tmp_path):
+    first, second = str(tmp_path / 'first.json'), str(tmp_path / 'second.json')
+    _write(first, [{'buildOrder': 1, 'data': {'passed': 1}}, {'buildOrder': 2, 'data': {'passed': 2}}])
+    _write(second, [{'buildOrder': 2, 'data': {'passed': 2}}, {'buildOrder': 3, 'data': {'passed': 3}}])
+
+    trend = merge_trend_files([first, second])
+
+    assert [entry['buildOrder'] for entry in trend] == [3, 2, 1]
@@ -0,0 +1,92 @@
+import pytest
+
+from utils.appium_settings import PROFILES, SettingsManager, main
+
+
+class FakeDriver:
+    def __init__(self, settings=None):
+        self.settings = dict(settings) if settings is not None else None
+        self.updates = []
+
+    def get_settings(self):
+        if self.settings is None:
+            raise RuntimeError('getSettings is not supported')
+        return dict(self.settings)
+
+    def update_settings(self, settings):
+        self.updates.append(dict(settings))
+        if self.settings is not None:
+            self.settings.update(settings)
+
+
+def _manager(driver, platform='android'):
+    return SettingsManager(driver, platform, profiles={name: dict(settings)
+                                                       for name, settings in PROFILES[platform].items()})
+
+
+def test_use_restores_previous_values_of_changed_settings():
+    driver = FakeDriver(PROFILES['android']['default'])
+    manager = _manager(driver)
+
+    with manager.use('fast'):
+        assert manager.current_profile == 'fast'
+        assert driver.settings['waitForIdleTimeout'] == 0
+
+    assert driver.settings == PROFILES['android']['default']
+    assert driver.updates[-1] == {'waitForIdleTimeout': 10000, 'waitForSelectorTimeout': 10000,
+                                  'ignoreUnimportantViews': False}
+    assert manager.current_profile is None
+
+
+def test_use_restores_after_exception_in_block():
+    driver = FakeDriver(PROFILES['android']['default'])
+    manager = _manager(driver)
+    manager.apply('animated')
+
+    with pytest.raises(ValueError):
+        with manager.use('fast'):
+            raise ValueError('step failed')
+
+    assert driver.settings['waitForIdleTimeout'] == 100
+    assert manager.current_profile == 'animated'
+
+
+def test_use_restores_defaults_when_settings_are_unknown():
+    driver = FakeDriver()
+    manager = _manager(driver)
+
+    with manager.use('fast'):
+        pass
+
+    assert driver.updates[-1] == {'waitForIdleTimeout': 10000, 'waitForSelectorTimeout': 10000,
+                                  'ignoreUnimportantViews': False}
+
+
+def test_apply_sends_only_changed_settings():
+    driver = FakeDriver(PROFILES['android']['default'])
+    manager = _manager(driver)
+
+    manager.apply('default')
+    manager.apply('fast')
+    manager.apply('fast')
+
+    assert driver.updates == [{'waitForIdleTimeout': 0, 'waitForSelectorTimeout': 0, 'ignoreUnimportantViews': True}]
+    assert manager.stats == {'updates': 1, 'skipped': 2}
+
+
+def test_ios_animated_profile_resets_excluded_attributes():
+    driver = FakeDriver(PROFILES['ios']['default'])
+    manager = _manager(driver, 'ios')
+
+    manager.apply('fast')
+    manager.apply('animated')
+
+    assert driver.settings['pageSourceExcludedAttributes'] == ''
+
+
+@pytest.mark.parametrize('option, value', [('--repeat', '0'), ('--warmup', '-1')])
+def test_cli_rejects_counts_below_minimum(option, value, capsys):
+    with pytest.raises(SystemExit):
+        main([option, value])
+
+    assert 'must be at least' in capsys.readouterr().err
@@ -0,0 +1,72 @@
+import json
+
+import pytest
+
+from utils.benchmark import LatencyBenchmark, append_history, check_budgets, load_transitions, summarize
+
+
+def test_summarize_statistics():
+    summary = summarize([100.0, 200.0, 300.0, 400.0, 1000.0])
+
+    assert summary['runs'] == 5
+    assert summary['median_ms'] == 300.0
+    assert summary['p95_ms'] == 880.0
+    assert summary['stdev_ms'] == 353.6
+    assert (summary['min_ms'], summary['max_ms']) == (100.0, 1000.0)
+
+
+def test_summarize_single_and_empty_samples():
+    assert summarize([123.44])['stdev_ms'] == 0.0
+    with pytest.raises(ValueError):
+        summarize([])
+
+
+def test_check_budgets_reports_exceeded_limits():
+    results = {'cold_start': summarize([7000.0, 9000.0]), 'warm_start': summarize([1000.0, 1200.0])}
+    budgets = {
+        'cold_start': {'p95_ms': 8000, 'median_ms': 9000},
+        'warm_start': {'median_ms': 1500},
+        'not_measured': {'median_ms': 1},
+    }
+
+    assert check_budgets(results, budgets) == ['cold_start p95_ms 8900.0 ms exceeds budget 8000 ms']
+
+
+def test_repeat_and_warmup_are_validated():
+    with pytest.raises(ValueError):
+        LatencyBenchmark(None, None, 'app', ('id', 'home'), repeat=0)
+    with pytest.raises(ValueError):
+        LatencyBenchmark(None, None, 'app', ('id', 'home'), warmup=-1)
+
+
+def test_measure_discards_warmup_runs():
+    class FakeActions:
+        def wait_for_element_visible(self, *locator, timeout, poll_frequency):
+            pass
+
+    triggers = []
+    benchmark = LatencyBenchmark(None, FakeActions(), 'app', ('id', 'home'), repeat=3, warmup=2)
+
+    result = benchmark.measure('cold_start', lambda: triggers.append(1), ('id', 'home'))
+
+    assert len(triggers) == 5
+    assert result['runs'] == 3
+    assert benchmark.results['cold_start'] is result
+
+
+def test_history_keeps_latest_entries(tmp_path, monkeypatch):
+    monkeypatch.setattr('utils.benchmark.MAX_HISTORY_ENTRIES', 2)
+    path = str(tmp_path / 'reports' / 'history.json')
+    for run in range(3):
+        append_history(path, {'run': run})
+
+    with open(path, 'r', encoding='utf-8') as f:
+        assert json.load(f) == [{'run': 1}, {'run': 2}]
+
+
+def test_load_transitions_requires_action_and_target(tmp_path):
+    path = tmp_path / 'transitions.json'
+    path.write_text(json.dumps({'to_payment': {'action': ['id', 'pay']}}))
+
+    with pytest.raises(ValueError, match='to_payment needs target'):
+        load_transitions(str(path))
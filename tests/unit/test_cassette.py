@@ -0,0 +1,135 @@
+import gzip
+import json
+
+import pytest
+from selenium.webdriver.remote.remote_connection import RemoteConnection
+
+from setup import AppiumSetup
+from utils.cassette import CassetteMismatchError, RecordingConnection, ReplayConnection, cassette_path
+
+PAGE_SOURCE = '<hierarchy>' + '<node/>' * 200 + '</hierarchy>'
+
+SERVER_RESPONSES = {
+    'newSession': {'value': {'sessionId': 'recorded', 'capabilities': {'platformName': 'Android'}}},
+    'getPageSource': {'value': PAGE_SOURCE},
+    'findElement': {'value': {'element-6066-11e4-a52e-4f735466cecf': 'e1'}},
+    'clickElement': {'value': None},
+}
+
+
+@pytest.fixture
+def cassette(tmp_path, monkeypatch):
+    """Record two page sources, a find and a click against a fake server"""
+    monkeypatch.setattr(RemoteConnection, 'execute', lambda self, command, params: SERVER_RESPONSES[command])
+    path = str(tmp_path / 'android' / 'test.json.gz')
+    recording = RecordingConnection('http://127.0.0.1:4723', path)
+    recording.execute('getPageSource', {'sessionId': 'recorded'})
+    recording.execute('findElement', {'sessionId': 'recorded', 'using': 'accessibility id', 'value': 'home'})
+    recording.execute('clickElement', {'sessionId': 'recorded', 'id': 'e1'})
+    recording.execute('getPageSource', {'sessionId': 'recorded'})
+    recording.save()
+    return path
+
+
+def test_cassette_path_per_platform_and_role(tmp_path):
+    path = cassette_path('tests/steps/test_order.py::test_place[1]', 'ios', 'courier', str(tmp_path))
+
+    assert path == str(tmp_path / 'ios' / 'tests_steps_test_order.py_test_place_1_.courier.json.gz')
+
+
+def test_recorded_page_sources_are_stored_once(cassette):
+    with gzip.open(cassette, 'rt', encoding='utf-8') as f:
+        data = json.load(f)
+
+    assert list(data['blobs'].values()) == [PAGE_SOURCE]
+    assert [interaction[0] for interaction in data['interactions']] == [
+        'getPageSource', 'findElement', 'clickElement', 'getPageSource']
+    assert 'sessionId' not in data['interactions'][1][1]
+
+
+def test_replay_serves_recorded_responses_in_order(cassette):
+    replay = ReplayConnection(cassette)
+
+    assert replay.execute('getPageSource', {'sessionId': 'new'}) == {'value': PAGE_SOURCE}
+    found = replay.execute('findElement', {'sessionId': 'new', 'using': 'accessibility id', 'value': 'home'})
+    # Polling faster than during recording repeats the previous request
+    assert replay.execute('findElement', {'sessionId': 'new', 'using': 'accessibility id', 'value': 'home'}) == found
+    replay.execute('clickElement', {'sessionId': 'new', 'id': 'e1'})
+    replay.execute('getPageSource', {'sessionId': 'new'})
+
+    replay.assert_consumed()
+
+
+def test_replay_mismatch(cassette):
+    replay = ReplayConnection(cassette)
+    replay.execute('getPageSource', {})
+
+    with pytest.raises(CassetteMismatchError, match='mismatch at command #2'):
+        replay.execute('findElement', {'using': 'accessibility id', 'value': 'settings'})
+    assert replay.execute('quit', {}) == {'value': None}
+
+
+def test_unused_commands_fail_assert_consumed(cassette):
+    replay = ReplayConnection(cassette)
+    replay.execute('getPageSource', {})
+
+    with pytest.raises(CassetteMismatchError, match='3 unused commands, next recorded command is findElement'):
+        replay.assert_consumed()
+
+
+class FakeDriver:
+    def __init__(self, command_executor):
+        self.command_executor = command_executor
+
+    def quit(self):
+        self.command_executor.execute('quit', {})
+
+
+def _replay_setup(cassette, consumed: int, monkeypatch) -> AppiumSetup:
+    monkeypatch.setattr('setup.get_current_nodeid', lambda: None)
+    replay = ReplayConnection(cassette)
+    for command, params, response in replay.interactions[:consumed]:
+        replay.execute(command, params)
+    setup = AppiumSetup()
+    setup.driver = FakeDriver(replay)
+    setup.cassette_mode = 'replay'
+    return setup
+
+
+def test_teardown_fails_replay_with_unused_commands(cassette, monkeypatch):
+    with pytest.raises(CassetteMismatchError, match='unused commands'):
+        _replay_setup(cassette, 2, monkeypatch).tearDown()
+
+    _replay_setup(cassette, 4, monkeypatch).tearDown()
+
+
+def test_teardown_keeps_original_failure_of_replay(cassette, monkeypatch):
+    setup = _replay_setup(cassette, 2, monkeypatch)
+    monkeypatch.setattr(AppiumSetup, '_test_failed', lambda self: True)
+
+    setup.tearDown()
+
+
+def _capabilities(udid, app, user, key):
+    return {'capabilities': {'alwaysMatch': {
+        'platformName': 'Android', 'appium:udid': udid, 'appium:app': app,
+        'bstack:options': {'userName': user, 'accessKey': key, 'buildName': f"build {udid}"}}}}
+
+
+def test_credentials_are_redacted_and_new_session_replays_with_other_capabilities(tmp_path, monkeypatch):
+    monkeypatch.setattr(RemoteConnection, 'execute', lambda self, command, params: SERVER_RESPONSES[command])
+    path = str(tmp_path / 'session.json.gz')
+    recording = RecordingConnection('http://127.0.0.1:4723', path)
+    recording.execute('newSession', _capabilities('emulator-5554', '/home/me/app.apk', 'me', 'secret-key'))
+    recording.execute('getPageSource', {'sessionId': 'recorded'})
+    recording.save()
+
+    with gzip.open(path, 'rt', encoding='utf-8') as f:
+        content = f.read()
+    assert 'secret-key' not in content and '"me"' not in content
+
+    replay = ReplayConnection(path)
+    response = replay.execute('newSession', _capabilities('ci-device', 'bs://app-id', 'ci', 'ci-key'))
+    assert response['value']['sessionId'] == 'recorded'
+    assert replay.execute('getPageSource', {'sessionId': 'replayed'}) == {'value': PAGE_SOURCE}
+    replay.assert_consumed()
@@ -0,0 +1,120 @@
+import pytest
+from selenium.common.exceptions import InvalidSessionIdException, NoSuchElementException, WebDriverException
+
+from utils.circuit_breaker import (CircuitBreaker, DeviceQuarantinedError, HealthListener, get_device_key,
+                                   is_infrastructure_error)
+
+
+class FakeDriver:
+    _health_keys = ('device:emulator-5554',)
+
+
+def _breaker(tmp_path, **kwargs):
+    return CircuitBreaker(str(tmp_path / 'health.json'), refresh_interval=0, **kwargs)
+
+
+def test_classifies_infrastructure_errors():
+    assert is_infrastructure_error(InvalidSessionIdException('gone'))
+    assert is_infrastructure_error(WebDriverException('An unknown server-side error: socket hang up'))
+    assert is_infrastructure_error(ConnectionResetError())
+    assert not is_infrastructure_error(NoSuchElementException('no such element'))
+    assert not is_infrastructure_error(DeviceQuarantinedError('invalid session id'))
+
+
+def test_device_key_prefers_udid():
+    assert get_device_key({'appium:udid': 'emulator-5554', 'appium:deviceName': 'Pixel'}) == 'device:emulator-5554'
+    assert get_device_key({'deviceName': 'iPhone 15'}) == 'device:iPhone 15'
+    assert get_device_key({}) is None
+
+
+def test_opens_after_consecutive_failures(tmp_path):
+    breaker = _breaker(tmp_path, threshold=3)
+    error = WebDriverException('instrumentation process is not running')
+
+    assert not breaker.record_failure('device:a', error)
+    assert not breaker.record_failure('device:a', error)
+    assert breaker.record_failure('device:a', error)
+    assert breaker.is_open('device:a')
+    assert not breaker.is_open('device:b')
+    assert 'instrumentation process is not running' in breaker.reason('device:a')
+    assert list(breaker.quarantined()) == ['device:a']
+
+
+def test_success_resets_count_but_not_open_breaker(tmp_path):
+    breaker = _breaker(tmp_path, threshold=2)
+    error = WebDriverException('device offline')
+
+    breaker.record_failure('device:a', error)
+    breaker.record_success('device:a')
+    assert not breaker.record_failure('device:a', error)
+
+    breaker.record_failure('device:a', error)
+    breaker.record_success('device:a')
+    assert breaker.is_open('device:a')
+
+
+def test_state_is_shared_through_file(tmp_path):
+    first = _breaker(tmp_path, threshold=1)
+    second = _breaker(tmp_path, threshold=1)
+
+    first.record_failure('device:a', WebDriverException('device offline'))
+
+    assert second.is_open('device:a')
+    second.reset()
+    assert not second.is_open('device:a')
+
+
+def test_cooldown_gives_device_another_chance(tmp_path, monkeypatch):
+    breaker = _breaker(tmp_path, threshold=1, cooldown=60)
+    now = [1000.0]
+    monkeypatch.setattr('utils.circuit_breaker.time.time', lambda: now[0])
+
+    breaker.record_failure('device:a', WebDriverException('device offline'))
+    assert breaker.is_open('device:a')
+    now[0] += 61
+    assert not breaker.is_open('device:a')
+
+
+def test_listener_fails_commands_of_quarantined_device_fast(tmp_path):
+    breaker = _breaker(tmp_path, threshold=1)
+    listener = HealthListener(breaker)
+    driver = FakeDriver()
+
+    listener.after_command(driver, 'findElement', {}, 0.1, NoSuchElementException('no such element'))
+    listener.before_command(driver, 'findElement', {})
+
+    listener.after_command(driver, 'findElement', {}, 0.1, WebDriverException('socket hang up'))
+    with pytest.raises(DeviceQuarantinedError):
+        listener.before_command(driver, 'findElement', {})
+    listener.before_command(driver, 'quit', {})
+
+
+def test_device_counts_one_failure_per_session(tmp_path):
+    breaker = _breaker(tmp_path, threshold=2)
+    listener = HealthListener(breaker)
+    first_session = FakeDriver()
+    first_session._health_keys = ('session:s1', 'device:emulator-5554')
+
+    for _ in range(3):
+        listener.after_command(first_session, 'findElement', {}, 0.1, InvalidSessionIdException('invalid session id'))
+
+    assert breaker.is_open('session:s1')
+    assert not breaker.is_open('device:emulator-5554')
+
+    second_session = FakeDriver()
+    second_session._health_keys = ('session:s2', 'device:emulator-5554')
+    listener.after_command(second_session, 'findElement', {}, 0.1, WebDriverException('socket hang up'))
+    assert breaker.is_open('device:emulator-5554')
+
+
+def test_healthy_session_resets_device_count(tmp_path):
+    breaker = _breaker(tmp_path, threshold=2)
+    listener = HealthListener(breaker)
+    failed_session, healthy_session, next_session = FakeDriver(), FakeDriver(), FakeDriver()
+
+    listener.after_command(failed_session, 'findElement', {}, 0.1, WebDriverException('device offline'))
+    listener.after_command(healthy_session, 'findElement', {}, 0.1)
+    listener.after_command(healthy_session, 'quit', {}, 0.1)
+    listener.after_command(next_session, 'findElement', {}, 0.1, WebDriverException('device offline'))
+
+    assert not breaker.is_open('device:emulator-5554')
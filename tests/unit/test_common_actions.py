@@ -0,0 +1,316 @@
+import time
+
+import pytest
+from selenium.common.exceptions import NoSuchElementException, StaleElementReferenceException, TimeoutException
+
+from pages.common.common_actions import CommonActions
+
+
+class FakeElement:
+    def __init__(self, name, displayed=True):
+        self.name = name
+        self.displayed = displayed
+        self.stale = False
+        self.clicks = 0
+
+    def is_displayed(self):
+        if self.stale:
+            raise StaleElementReferenceException(self.name)
+        return self.displayed
+
+    def is_enabled(self):
+        return True
+
+    def click(self):
+        if self.stale:
+            raise StaleElementReferenceException(self.name)
+        self.clicks += 1
+
+    @property
+    def text(self):
+        if self.stale:
+            raise StaleElementReferenceException(self.name)
+        return self.name
+
+
+class FakeDriver:
+    """Elements by (by, value), appear_at delays an element until the given monotonic time"""
+
+    def __init__(self, elements=None):
+        self.elements = dict(elements or {})
+        self.appear_at = {}
+        self.finds = 0
+
+    def implicitly_wait(self, seconds):
+        pass
+
+    def find_element(self, by, value):
+        self.finds += 1
+        element = self.elements.get((by, value))
+        if element is None or time.monotonic() < self.appear_at.get((by, value), 0):
+            raise NoSuchElementException(value)
+        return element
+
+    def find_elements(self, by, value):
+        try:
+            return [self.find_element(by, value)]
+        except NoSuchElementException:
+            return []
+
+    @property
+    def page_source(self):
+        """Android hierarchy of the accessibility id elements present now"""
+        nodes = ''.join(
+            f'<android.view.View content-desc="{value}" displayed="{str(element.displayed).lower()}"/>'
+            for (by, value), element in self.elements.items()
+            if by == 'accessibility id' and time.monotonic() >= self.appear_at.get((by, value), 0))
+        return f"<hierarchy>{nodes}</hierarchy>"
+
+
+def _actions(driver, **kwargs):
+    return CommonActions(driver, platform='android', **kwargs)
+
+
+def test_find_element_returns_present_element():
+    element = FakeElement('login')
+    actions = _actions(FakeDriver({('id', 'login'): element}))
+
+    assert actions.find_element('id', 'login', timeout=1) is element
+
+
+def test_find_element_raises_timeout_for_missing_element(monkeypatch):
+    monkeypatch.setattr('pages.common.common_actions.time.sleep', lambda seconds: None)
+    actions = _actions(FakeDriver())
+
+    with pytest.raises(TimeoutException, match='not found after 3 attempts'):
+        actions.find_element('id', 'missing', timeout=0)
+
+
+def test_wait_for_element_visible_waits_for_element():
+    element = FakeElement('home')
+    driver = FakeDriver({('id', 'home'): element})
+    driver.appear_at[('id', 'home')] = time.monotonic() + 0.1
+    actions = _actions(driver)
+
+    assert actions.wait_for_element_visible('id', 'home', timeout=2, poll_frequency=0.02) is element
+
+
+def test_wait_for_element_visible_times_out_on_hidden_element():
+    actions = _actions(FakeDriver({('id', 'home'): FakeElement('home', displayed=False)}))
+
+    with pytest.raises(TimeoutException, match='still not visible after 0.1 seconds'):
+        actions.wait_for_element_visible('id', 'home', timeout=0.1, poll_frequency=0.02)
+
+
+def test_wait_for_any_returns_first_matching_locator():
+    home = FakeElement('home')
+    driver = FakeDriver({('accessibility id', 'home'): home, ('accessibility id', 'hidden'): FakeElement('x', False)})
+    actions = _actions(driver)
+
+    locator, element = actions.wait_for_any([('accessibility id', 'login'), ('accessibility id', 'hidden'),
+                                             ('accessibility id', 'home')], timeout=1)
+
+    assert (locator, element) == (('accessibility id', 'home'), home)
+    # Only the locator the snapshot matched was looked up live
+    assert driver.finds == 1
+
+
+def test_wait_for_any_polls_once_more_at_the_deadline():
+    driver = FakeDriver({('accessibility id', 'home'): FakeElement('home')})
+    driver.appear_at[('accessibility id', 'home')] = time.monotonic() + 0.45
+    actions = _actions(driver)
+
+    locator, _ = actions.wait_for_any([('accessibility id', 'home')], timeout=0.5, poll_interval=0.4)
+
+    assert locator == ('accessibility id', 'home')
+
+
+def test_wait_for_any_times_out():
+    actions = _actions(FakeDriver())
+    started = time.monotonic()
+
+    with pytest.raises(TimeoutException, match='None of the elements'):
+        actions.wait_for_any([('accessibility id', 'home')], timeout=0.2, poll_interval=0.05)
+    assert time.monotonic() - started < 0.5
+
+
+def test_wait_for_all_needs_every_locator_in_one_snapshot():
+    driver = FakeDriver({('accessibility id', 'title'): FakeElement('title'),
+                         ('accessibility id', 'price'): FakeElement('price')})
+    driver.appear_at[('accessibility id', 'price')] = time.monotonic() + 0.1
+    actions = _actions(driver)
+
+    matched = actions.wait_for_all([('accessibility id', 'title'), ('accessibility id', 'price')],
+                                   timeout=1, poll_interval=0.05)
+
+    assert [locator[1] for locator, element in matched] == ['title', 'price']
+    with pytest.raises(TimeoutException, match='Not all elements'):
+        actions.wait_for_all([('accessibility id', 'title'), ('accessibility id', 'missing')],
+                             timeout=0.1, poll_interval=0.05)
+
+
+class FakeClock:
+    """Replaces the time module of common_actions, sleeping only advances the clock"""
+
+    def __init__(self):
+        self.now = 0.0
+        self.sleeps = []
+
+    def monotonic(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(round(seconds, 3))
+        self.now += seconds
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    fake = FakeClock()
+    monkeypatch.setattr('pages.common.common_actions.time', fake)
+    return fake
+
+
+def test_perform_until_polls_with_backoff(clock):
+    actions = _actions(FakeDriver())
+    performed = []
+
+    assert actions.perform_until(lambda: performed.append(clock.now), lambda: clock.now >= 0.65,
+                                 budget=3, max_actions=3, poll_interval=0.1, max_poll_interval=0.4)
+    assert performed == [0.0]
+    assert clock.sleeps == [0.1, 0.2, 0.4]
+
+
+def test_perform_until_splits_budget_and_settles_before_repeating(clock):
+    actions = _actions(FakeDriver())
+    performed = []
+
+    assert not actions.perform_until(lambda: performed.append(round(clock.now, 3)), lambda: False,
+                                     budget=3, max_actions=3, settle=0.5)
+    # One second window per action, the settle wait delays the second action, the budget ends before a third
+    assert performed == [0.0, 1.5]
+    assert clock.now == pytest.approx(3.0)
+
+
+def test_perform_until_does_not_repeat_after_slow_reaction(clock):
+    actions = _actions(FakeDriver())
+    performed = []
+
+    # A toggle reacting after its window but within the settle wait must not be clicked again
+    assert actions.perform_until(lambda: performed.append(clock.now), lambda: clock.now >= 1.2,
+                                 budget=3, max_actions=3, settle=0.5)
+    assert performed == [0.0]
+
+
+class FakeToggle(FakeElement):
+    def __init__(self):
+        super().__init__('toggle')
+        self.checked = False
+
+    def click(self):
+        super().click()
+        self.checked = not self.checked
+
+    def get_attribute(self, name):
+        if self.stale:
+            raise StaleElementReferenceException(self.name)
+        return str(self.checked).lower() if name == 'checked' else None
+
+
+def test_toggle_switch_clicks_once(clock):
+    toggle = FakeToggle()
+    actions = _actions(FakeDriver({('id', 'wifi'): toggle}))
+
+    assert actions.toggle_switch('id', 'wifi', should_be_on=True)
+    assert actions.toggle_switch('id', 'wifi', should_be_on=True)
+    assert toggle.clicks == 1
+
+
+class GestureDriver(FakeDriver):
+    """Records the screen changing commands"""
+
+    def __init__(self, elements=None):
+        super().__init__(elements)
+        self.commands = []
+
+    def swipe(self, start_x, start_y, end_x, end_y, duration):
+        self.commands.append('swipe')
+
+    def back(self):
+        self.commands.append('back')
+
+    def get_window_size(self):
+        return {'width': 1080, 'height': 1920}
+
+    def execute(self, command, params=None):
+        self.commands.append(command)
+        return {'value': None}
+
+
+def _cached(driver=None):
+    element = FakeElement('login')
+    driver = driver or GestureDriver()
+    driver.elements[('id', 'login')] = element
+    actions = _actions(driver)
+    actions.get_cached_element('id', 'login')
+    return actions, element
+
+
+def test_cached_element_is_not_looked_up_again():
+    actions, element = _cached()
+    finds = actions.driver.finds
+
+    assert actions.get_cached_element('id', 'login') is element
+    assert actions.driver.finds == finds
+    assert actions.element_cache_stats['hits'] == 1
+    assert actions.element_cache_stats['misses'] == 1
+
+
+def test_stale_element_is_found_again_once():
+    actions, element = _cached()
+    element.stale = True
+    fresh = FakeElement('login')
+    actions.driver.elements[('id', 'login')] = fresh
+
+    assert actions._run_on_element('id', 'login', lambda e: e.text) == 'login'
+    assert actions.get_cached_element('id', 'login') is fresh
+    assert actions.element_cache_stats['stale'] == 1
+
+
+def test_element_still_stale_after_refind_raises():
+    actions, element = _cached()
+    element.stale = True
+
+    with pytest.raises(StaleElementReferenceException):
+        actions._run_on_element('id', 'login', lambda e: e.text)
+    assert actions.element_cache_stats['stale'] == 1
+
+
+def test_cache_disabled_always_finds():
+    driver = FakeDriver({('id', 'login'): FakeElement('login')})
+    actions = _actions(driver, cache_elements=False)
+
+    actions.get_cached_element('id', 'login')
+    actions.get_cached_element('id', 'login')
+
+    assert driver.finds == 2
+
+
+@pytest.mark.parametrize('gesture, command', [
+    (lambda actions: actions.click_element('id', 'login'), None),
+    (lambda actions: actions.swipe(500, 1500, 500, 500), 'swipe'),
+    (lambda actions: actions.tap(0.5, 0.9), 'actions'),
+    (lambda actions: actions.navigate_back(), 'back'),
+])
+def test_screen_changing_gestures_invalidate_the_cache(gesture, command, monkeypatch):
+    monkeypatch.setattr('pages.common.common_actions.time.sleep', lambda seconds: None)
+    actions, element = _cached()
+
+    gesture(actions)
+
+    if command:
+        assert actions.driver.commands == [command]
+    assert actions.element_cache_stats['invalidations'] == 1
+    finds = actions.driver.finds
+    actions.get_cached_element('id', 'login')
+    assert actions.driver.finds == finds + 1
@@ -0,0 +1,72 @@
+import time
+
+import pytest
+
+from utils.driver_hooks import CommandListener, add_command_listener, instrument_driver, remove_command_listener
+from utils.step_timing import CommandCounter
+
+
+class FakeDriver:
+    def __init__(self):
+        self.executed = []
+
+    def execute(self, driver_command, params=None):
+        self.executed.append(driver_command)
+        return {'value': None}
+
+
+class RejectingListener(CommandListener):
+    def before_command(self, driver, command, params):
+        raise RuntimeError(f"{command} rejected")
+
+
+class RecordingListener(CommandListener):
+    def __init__(self):
+        self.events = []
+
+    def before_command(self, driver, command, params):
+        self.events.append(('before', command))
+
+    def after_command(self, driver, command, params, duration, error=None):
+        self.events.append(('after', command, type(error).__name__ if error else None))
+
+
+@pytest.fixture
+def listeners():
+    added = []
+
+    def add(listener):
+        add_command_listener(listener)
+        added.append(listener)
+        return listener
+
+    yield add
+    for listener in added:
+        remove_command_listener(listener)
+
+
+def test_listeners_see_every_command(listeners):
+    recording = listeners(RecordingListener())
+    driver = instrument_driver(FakeDriver())
+
+    driver.execute('findElement', {})
+
+    assert recording.events == [('before', 'findElement'), ('after', 'findElement', None)]
+    assert instrument_driver(driver) is driver
+
+
+def test_rejected_command_still_ends_notified_listeners(listeners):
+    counter = listeners(CommandCounter())
+    recording = listeners(RecordingListener())
+    listeners(RejectingListener())
+    driver = FakeDriver()
+    instrument_driver(driver)
+
+    with pytest.raises(RuntimeError, match='rejected'):
+        driver.execute('findElement', {})
+
+    assert driver.executed == []
+    assert recording.events == [('before', 'findElement'), ('after', 'findElement', 'RuntimeError')]
+    busy_time = counter.snapshot()[1]
+    time.sleep(0.02)
+    assert counter.snapshot()[1] == busy_time
@@ -0,0 +1,119 @@
+import subprocess
+from types import SimpleNamespace
+
+import pytest
+
+from utils.impact import DiffImpact, ImpactIndex, ImpactPlugin, select_tests
+
+LOGIN_PAGE = '''class LoginPage:
+    def open(self):
+        return "open"
+
+    def login(self, common_actions):
+        common_actions.click_element("accessibility id", "login_button")
+'''
+
+
+def _git(root, *args):
+    subprocess.run(['git', *args], cwd=root, check=True, capture_output=True)
+
+
+@pytest.fixture
+def repo(tmp_path):
+    _git(tmp_path, 'init', '-q')
+    _git(tmp_path, 'config', 'user.email', 'test@example.com')
+    _git(tmp_path, 'config', 'user.name', 'test')
+    (tmp_path / 'pages').mkdir()
+    (tmp_path / 'pages' / 'login_page.py').write_text(LOGIN_PAGE)
+    (tmp_path / 'tests').mkdir()
+    (tmp_path / 'tests' / 'login.feature').write_text('Feature: Login\n')
+    _git(tmp_path, 'add', '.')
+    _git(tmp_path, 'commit', '-q', '-m', 'base')
+    return tmp_path
+
+
+def _index(tmp_path, tests):
+    index = ImpactIndex(str(tmp_path / 'index.json'))
+    index.update({'nodeid': nodeid, 'functions': [], 'locators': [], 'files': [], **entry}
+                 for nodeid, entry in tests.items())
+    return index
+
+
+def test_diff_collects_changed_functions_and_literals(repo):
+    (repo / 'pages' / 'login_page.py').write_text(LOGIN_PAGE.replace('"login_button"', '"sign_in_button"'))
+
+    diff = DiffImpact('HEAD', str(repo))
+
+    assert diff.files == {'pages/login_page.py'}
+    assert diff.functions == {'pages/login_page.py::login'}
+    assert {'login_button', 'sign_in_button'} <= diff.literals
+
+
+def test_diff_of_removed_function_uses_old_source(repo):
+    (repo / 'pages' / 'login_page.py').write_text(LOGIN_PAGE.split('\n    def login')[0] + '\n')
+
+    diff = DiffImpact('HEAD', str(repo))
+
+    assert 'pages/login_page.py::login' in diff.functions
+    assert 'pages/login_page.py::open' not in diff.functions
+
+
+def test_select_tests_by_function_locator_and_file(repo, tmp_path):
+    (repo / 'pages' / 'login_page.py').write_text(LOGIN_PAGE.replace('"login_button"', '"sign_in_button"'))
+    (repo / 'tests' / 'login.feature').write_text('Feature: Login again\n')
+    diff = DiffImpact('HEAD', str(repo))
+    index = _index(tmp_path, {
+        'tests/steps/test_a.py::test_login': {'functions': ['pages/login_page.py::login']},
+        'tests/steps/test_b.py::test_button': {'locators': ['accessibility id=login_button']},
+        'tests/steps/test_c.py::test_feature': {'files': ['tests/login.feature']},
+        'tests/steps/test_d.py::test_other': {'functions': ['pages/home_page.py::open'],
+                                              'locators': ['accessibility id=home']},
+        'tests/steps/test_e.py::test_smoke': {},
+    })
+    nodeids = list(index.tests) + ['tests/steps/test_f.py::test_new']
+
+    selected = select_tests(nodeids, index, diff, smoke={'tests/steps/test_e.py::test_smoke'},
+                            run_all_patterns=[])
+
+    assert selected == {
+        'tests/steps/test_a.py::test_login': 'function pages/login_page.py::login',
+        'tests/steps/test_b.py::test_button': 'locator accessibility id=login_button',
+        'tests/steps/test_c.py::test_feature': 'file tests/login.feature',
+        'tests/steps/test_e.py::test_smoke': 'smoke',
+        'tests/steps/test_f.py::test_new': 'not in index',
+    }
+
+
+def test_global_change_selects_everything(repo, tmp_path):
+    (repo / 'setup.py').write_text('print("changed")\n')
+    _git(repo, 'add', 'setup.py')
+    diff = DiffImpact('HEAD', str(repo))
+    index = _index(tmp_path, {'tests/steps/test_d.py::test_other': {}})
+
+    selected = select_tests(['tests/steps/test_d.py::test_other'], index, diff, smoke=set())
+
+    assert selected == {'tests/steps/test_d.py::test_other': 'global change setup.py'}
+
+
+def test_untracked_files_count_as_added(repo):
+    (repo / 'pages' / 'cart_page.py').write_text('def checkout(common_actions):\n'
+                                                 '    common_actions.click_element("accessibility id", "checkout_button")\n')
+    (repo / 'index.json').write_text('{"tests": {"a": {"locators": ["id=home_button"]}}}')
+
+    diff = DiffImpact('HEAD', str(repo), ignore=[str(repo / 'index.json')])
+
+    assert diff.files == {'pages/cart_page.py'}
+    assert diff.functions == {'pages/cart_page.py::checkout'}
+    assert 'checkout_button' in diff.literals
+    assert 'home_button' not in diff.literals
+
+
+def test_unknown_base_runs_all_tests(repo, monkeypatch, capsys):
+    monkeypatch.chdir(repo)
+    plugin = ImpactPlugin(SimpleNamespace(rootpath=repo), record=False, base='origin/missing')
+    items = [SimpleNamespace(nodeid='tests/steps/test_a.py::test_login')]
+
+    plugin.pytest_collection_modifyitems(None, None, items)
+
+    assert [item.nodeid for item in items] == ['tests/steps/test_a.py::test_login']
+    assert 'skipped, running all tests' in capsys.readouterr().out
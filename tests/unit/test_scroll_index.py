@@ -0,0 +1,98 @@
+from selenium.common.exceptions import NoSuchElementException
+
+from pages.common.common_actions import CommonActions
+from utils.scroll_index import ScrollIndex, make_scroll_key
+
+
+class FakeElement:
+    def is_displayed(self):
+        return True
+
+
+class FakeListDriver:
+    """Vertical list, every upward swipe moves one page down, the target is on page `target`"""
+
+    def __init__(self, target):
+        self.target = target
+        self.page = 0
+        self.swipes = 0
+
+    def implicitly_wait(self, seconds):
+        pass
+
+    def get_window_size(self):
+        return {'width': 1000, 'height': 2000}
+
+    def swipe(self, start_x, start_y, end_x, end_y, duration):
+        self.swipes += 1
+        self.page += 1 if start_y > end_y else -1
+
+    def find_element(self, by, value):
+        if by == 'id' and value == 'target' and self.page == self.target:
+            return FakeElement()
+        raise NoSuchElementException(value)
+
+    @property
+    def page_source(self):
+        return f"<page {self.page}>"
+
+
+def test_learn_lookup_and_forget_after_misses(tmp_path):
+    index = ScrollIndex(str(tmp_path / 'index.json'), max_misses=2)
+    key = make_scroll_key('home', '1000x2000', 'down', 'id', 'target')
+    index.learn(key, [[500, 1600, 500, 400]] * 2)
+
+    assert ScrollIndex(index.path).lookup(key) == [[500, 1600, 500, 400]] * 2
+    index.record_miss(key)
+    assert index.lookup(key) is not None
+    index.record_miss(key)
+    assert index.lookup(key) is None
+    assert ScrollIndex(index.path).lookup(key) is None
+
+
+def test_save_keeps_entries_of_other_workers(tmp_path):
+    path = str(tmp_path / 'index.json')
+    first, second = ScrollIndex(path), ScrollIndex(path)
+    first.learn('a', [[1, 2, 3, 4]])
+    second.learn('b', [[5, 6, 7, 8]])
+
+    assert set(ScrollIndex(path).entries) == {'a', 'b'}
+    assert second.lookup('a') == [[1, 2, 3, 4]]
+
+
+def test_replay_hit_skips_incremental_search(tmp_path):
+    index = ScrollIndex(str(tmp_path / 'index.json'))
+    driver = FakeListDriver(target=3)
+    actions = CommonActions(driver, scroll_index=index)
+    assert actions.scroll_to_element('id', 'target', scroll_container='//list', timeout=0, screen='list')
+    learned_swipes = driver.swipes
+
+    driver.page = driver.swipes = 0
+    assert actions.scroll_to_element('id', 'target', scroll_container='//list', timeout=0, screen='list')
+    assert driver.swipes == learned_swipes == 3
+    assert index.stats['hits'] == 1
+
+
+def test_overshot_replay_scrolls_back_and_relearns(tmp_path):
+    index = ScrollIndex(str(tmp_path / 'index.json'))
+    driver = FakeListDriver(target=4)
+    actions = CommonActions(driver, scroll_index=index)
+    assert actions.scroll_to_element('id', 'target', scroll_container='//list', timeout=0, screen='list')
+
+    # The list got shorter, the learned swipes now overshoot the target
+    driver.page, driver.target = 0, 2
+    assert actions.scroll_to_element('id', 'target', scroll_container='//list', timeout=0, screen='list')
+    assert driver.page == 2
+    assert len(index.lookup(next(iter(index.entries)))) == 2
+
+
+def test_missed_replay_starts_incremental_search_from_the_top(tmp_path):
+    index = ScrollIndex(str(tmp_path / 'index.json'))
+    driver = FakeListDriver(target=2)
+    actions = CommonActions(driver, scroll_index=index)
+    assert actions.scroll_to_element('id', 'target', scroll_container='//list', timeout=0, screen='list')
+
+    # The target moved further down, replay ends above it and is undone
+    driver.page, driver.target = 0, 4
+    assert actions.scroll_to_element('id', 'target', scroll_container='//list', timeout=0, screen='list')
+    assert len(index.lookup(next(iter(index.entries)))) == 4
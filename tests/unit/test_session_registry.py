@@ -0,0 +1,60 @@
+from utils.session_registry import MockStatusServer, SessionRegistry, SessionStatusUpdater, summarize_sessions
+
+
+def _record(session_id, nodeid, outcome):
+    return {'session_id': session_id, 'nodeid': nodeid, 'outcome': outcome}
+
+
+def test_summarize_maps_outcomes_per_session():
+    summary = summarize_sessions([
+        _record('s1', 'test_a', 'passed'),
+        _record('s1', 'test_b', 'failed'),
+        _record('s2', 'test_c', 'passed'),
+        _record('s3', 'test_d', 'unknown'),
+    ])
+
+    assert summary['s1']['status'] == 'failed'
+    assert summary['s1']['name'] == 'test_a (+1 more)'
+    assert summary['s1']['reason'] == 'Failed: test_b'
+    assert summary['s2'] == {'status': 'passed', 'name': 'test_c', 'reason': ''}
+    assert summary['s3']['status'] == 'failed'
+
+
+def test_registry_keeps_worst_outcome(tmp_path):
+    registry = SessionRegistry(str(tmp_path / 'sessions.jsonl'))
+    registry.begin('s1', nodeid='test_a')
+    registry.record_outcome('test_a', 'failed')
+    registry.finish('test_a', 'passed')
+
+    assert [record['outcome'] for record in registry.records()] == ['failed']
+
+
+def test_updater_pushes_all_sessions_over_pooled_session():
+    summary = summarize_sessions([_record(f"s{index}", f"test_{index}", 'passed') for index in range(10)]
+                                 + [_record('s0', 'test_x', 'failed')])
+    with MockStatusServer() as server:
+        updater = SessionStatusUpdater('user', 'key', api_url=server.url, max_workers=4)
+        results = updater.update_all(summary)
+
+    assert results == {session_id: True for session_id in summary}
+    received = dict(server.received)
+    assert len(server.received) == 10
+    assert received['s0']['status'] == 'failed'
+    assert received['s0']['reason'] == 'Failed: test_x'
+    assert received['s1'] == {'status': 'passed', 'name': 'test_1', 'reason': ''}
+
+
+def test_updater_reports_rejected_updates():
+    with MockStatusServer(status_code=404) as server:
+        results = SessionStatusUpdater('user', 'key', api_url=server.url).update_all(
+            {'s1': {'status': 'passed', 'name': 'test_a', 'reason': ''}})
+
+    assert results == {'s1': False}
+
+
+def test_updater_survives_unreachable_server():
+    with MockStatusServer() as server:
+        url = server.url
+    updater = SessionStatusUpdater('user', 'key', api_url=url, timeout=1)
+
+    assert updater.update_all({'s1': {'status': 'passed', 'name': 'test_a', 'reason': ''}}) == {'s1': False}
@@ -0,0 +1,103 @@
+import tracemalloc
+
+import numpy as np
+import pytest
+
+from utils.soak import SoakMonitor, fit_slope, parse_duration
+
+
+@pytest.mark.parametrize('value, seconds', [
+    ('90', 90), ('45s', 45), ('30m', 1800), ('2h', 7200), ('1.5h', 5400), (' 10 m ', 600),
+])
+def test_parse_duration(value, seconds):
+    assert parse_duration(value) == seconds
+
+
+@pytest.mark.parametrize('value', ['', None, 'abc', '10d', '-5m', '1h30m'])
+def test_parse_duration_rejects_invalid(value):
+    with pytest.raises(ValueError, match='Invalid soak duration'):
+        parse_duration(value)
+
+
+def test_fit_slope():
+    assert fit_slope([]) == 0.0
+    assert fit_slope([5.0]) == 0.0
+    assert fit_slope([3.0, 3.0, 3.0]) == 0.0
+    assert fit_slope([10.0, 12.0, 14.0, 16.0]) == pytest.approx(2.0)
+    assert fit_slope([100.0, 90.0, 80.0]) == pytest.approx(-10.0)
+    # Noise around a steady growth keeps the trend, same as a least squares fit
+    noisy = [0.0, 3.0, 1.0, 4.0, 2.0, 5.0]
+    assert fit_slope(noisy) == pytest.approx(float(np.polyfit(range(len(noisy)), noisy, 1)[0]))
+
+
+def test_slopes_skip_warmup_and_missing_values():
+    monitor = SoakMonitor(warmup=2)
+    rss = [500.0, 300.0, 100.0, 110.0, 120.0, 130.0]
+    monitor.samples = [{'iteration': index, 'rss_kb': value, 'device_pss_kb': None}
+                       for index, value in enumerate(rss)]
+
+    slopes = monitor.slopes()
+
+    assert slopes['rss_kb'] == 10.0
+    assert 'device_pss_kb' not in slopes
+
+
+
+SOAK_CONFTEST = """
+from utils.soak import SoakPlugin
+
+def pytest_configure(config):
+    config.pluginmanager.register(SoakPlugin(iterations=3, duration=None, warmup=0), 'soak')
+
+def pytest_runtest_teardown(item, nextitem):
+    with open('nextitems.txt', 'a') as f:
+        f.write(f"{item.name} -> {nextitem.name if nextitem else None}\\n")
+"""
+
+SOAK_TESTS = """
+import pytest
+
+def _log(event):
+    with open('events.txt', 'a') as f:
+        f.write(event + '\\n')
+
+@pytest.fixture(scope='session')
+def session_resource():
+    _log('session setup')
+    yield
+    _log('session teardown')
+
+@pytest.fixture
+def per_test(request):
+    _log(f'setup {request.node.name}')
+    yield
+    _log(f'teardown {request.node.name}')
+
+def test_first(session_resource, per_test):
+    pass
+
+def test_second(session_resource, per_test):
+    pass
+"""
+
+
+def test_soak_loop_keeps_session_fixtures_until_the_final_iteration(pytester, monkeypatch):
+    monkeypatch.setattr('utils.soak.SLOPE_LIMITS', {})
+    pytester.makeconftest(SOAK_CONFTEST)
+    pytester.makepyfile(test_soak_run=SOAK_TESTS)
+    was_tracing = tracemalloc.is_tracing()
+
+    try:
+        result = pytester.inline_run()
+    finally:
+        if not was_tracing:
+            tracemalloc.stop()
+
+    result.assertoutcome(passed=6)
+    iteration = ['setup test_first', 'teardown test_first', 'setup test_second', 'teardown test_second']
+    events = (pytester.path / 'events.txt').read_text().splitlines()
+    assert events == ['session setup'] + iteration * 3 + ['session teardown']
+    nextitems = (pytester.path / 'nextitems.txt').read_text().splitlines()
+    assert nextitems == ['test_first -> test_second', 'test_second -> test_first'] * 2 + [
+        'test_first -> test_second', 'test_second -> None']
+    assert list((pytester.path / 'reports' / 'soak').iterdir())
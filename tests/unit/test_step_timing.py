@@ -0,0 +1,93 @@
+import json
+import threading
+import time
+
+from utils import step_timing
+from utils.driver_hooks import background_commands
+
+
+def _record(key, wall_ms, commands=2, wait_ms=10.0, failed=False):
+    return {'key': key, 'name': key, 'wall_ms': wall_ms, 'commands': commands, 'command_ms': wall_ms - wait_ms,
+            'wait_ms': wait_ms, 'failed': failed, 'worker': 'master'}
+
+
+def test_step_key_keeps_features_apart():
+    first = step_timing.make_step_key('features/a.feature', 'Login', 0, 'given', 'open_app')
+    second = step_timing.make_step_key('features/b.feature', 'Login', 0, 'given', 'open_app')
+
+    assert first != second
+
+
+def test_aggregate_skips_failed_steps():
+    summary = step_timing.aggregate([_record('a', 100), _record('a', 300), _record('a', 5000, failed=True)])
+
+    assert summary['a']['runs'] == 2
+    assert summary['a']['p50_ms'] == 200
+    assert summary['a']['commands_avg'] == 2
+
+
+def test_regressed_steps_are_not_rolled_into_the_baseline(tmp_path):
+    path = str(tmp_path / 'baseline.json')
+    baseline = {'slow': [1000.0, 1000.0, 1000.0], 'fast': [100.0]}
+    summary = {'slow': {'name': 'slow', 'p90_ms': 2000.0, 'commands_avg': 3},
+               'fast': {'name': 'fast', 'p90_ms': 110.0, 'commands_avg': 1}}
+
+    regressions = step_timing.find_regressions(summary, baseline)
+    step_timing.update_baseline(path, baseline, summary, regressions=regressions)
+
+    assert [regression['key'] for regression in regressions] == ['slow']
+    with open(path, 'r', encoding='utf-8') as f:
+        assert json.load(f) == {'slow': [1000.0, 1000.0, 1000.0], 'fast': [100.0, 110.0]}
+
+
+def test_accepted_regressions_restart_the_baseline(tmp_path):
+    path = str(tmp_path / 'baseline.json')
+    baseline = {'slow': [1000.0, 1000.0, 1000.0], 'fast': [100.0]}
+    summary = {'slow': {'name': 'slow', 'p90_ms': 2000.0, 'commands_avg': 3},
+               'fast': {'name': 'fast', 'p90_ms': 110.0, 'commands_avg': 1}}
+
+    regressions = step_timing.find_regressions(summary, baseline)
+    step_timing.update_baseline(path, baseline, summary, regressions=regressions, accept_regressions=True)
+
+    assert step_timing.load_baseline(path) == {'slow': [2000.0], 'fast': [100.0, 110.0]}
+    # The next run at the new speed is no longer flagged
+    assert step_timing.find_regressions(summary, step_timing.load_baseline(path)) == []
+
+
+def test_allure_report_never_fails(tmp_path):
+    step_timing.write_allure_report(str(tmp_path), 'report', [{'key': 'slow'}])
+
+    result_file = next(tmp_path.glob('*-result.json'))
+    result = json.loads(result_file.read_text(encoding='utf-8'))
+    assert result['status'] == 'passed'
+    assert '1 regressed' in result['name']
+
+
+def test_counter_measures_concurrent_commands_as_busy_time():
+    counter = step_timing.CommandCounter()
+
+    def command(seconds):
+        counter.before_command(None, 'click', {})
+        time.sleep(seconds)
+        counter.after_command(None, 'click', {}, seconds)
+
+    started = time.perf_counter()
+    threads = [threading.Thread(target=command, args=(0.2,)) for _ in range(3)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    wall = time.perf_counter() - started
+
+    count, busy_time = counter.snapshot()
+    assert count == 3
+    assert 0.2 <= busy_time <= wall
+
+
+def test_counter_ignores_background_commands():
+    counter = step_timing.CommandCounter()
+    with background_commands():
+        counter.before_command(None, 'getPerformanceData', {})
+        counter.after_command(None, 'getPerformanceData', {}, 0.1)
+
+    assert counter.snapshot() == (0, 0.0)
@@ -0,0 +1,99 @@
+import pytest
+from selenium.common.exceptions import WebDriverException
+
+from utils.text_input import TextInput, TextInputError
+
+
+class FakeField:
+    """Android text field, ignores replaceElementValue like a Flutter field"""
+
+    def __init__(self, password=False):
+        self.id = 'field-1'
+        self.text = ''
+        self.password = password
+
+    def click(self):
+        pass
+
+    def clear(self):
+        self.text = ''
+
+    def send_keys(self, text):
+        self.text += text
+
+    def get_attribute(self, name):
+        return 'true' if name == 'password' and self.password else None
+
+
+class FakeDriver:
+    def __init__(self, field, unsupported=()):
+        self.field = field
+        self.unsupported = set(unsupported)
+        self.clipboard = ''
+        self.scripts = []
+
+    def execute_script(self, script, args):
+        self.scripts.append(script)
+        if script in self.unsupported:
+            raise WebDriverException(f"Unknown mobile command \"{script}\"")
+        if script == 'mobile: type':
+            self.field.text += args['text']
+
+    def set_clipboard_text(self, text):
+        self.clipboard = text
+
+    def press_keycode(self, keycode):
+        if 'paste' not in self.unsupported:
+            self.field.text += self.clipboard
+
+
+def test_falls_through_when_value_does_not_match():
+    field = FakeField()
+    text_input = TextInput(FakeDriver(field), 'android')
+
+    strategy = text_input.enter_text(field, 'Taipei 101', field_key='address')
+
+    assert strategy == 'clipboard'
+    assert field.text == 'Taipei 101'
+    assert text_input.stats['replace_value']['attempts'] == 1
+    assert text_input.stats['replace_value']['successes'] == 0
+    # The working strategy is tried first for the field next time
+    field.text = ''
+    driver = text_input.driver
+    driver.scripts.clear()
+    assert text_input.enter_text(field, 'Xinyi Road', field_key='address') == 'clipboard'
+    assert driver.scripts == []
+
+
+def test_unsupported_strategy_is_skipped_for_the_session():
+    field = FakeField()
+    driver = FakeDriver(field, unsupported={'mobile: replaceElementValue', 'paste'})
+    text_input = TextInput(driver, 'android')
+
+    assert text_input.enter_text(field, 'hello') == 'mobile_type'
+    assert 'replace_value' in text_input.unsupported
+    assert 'clipboard' not in text_input.unsupported
+
+
+def test_secure_field_is_not_verified():
+    field = FakeField(password=True)
+    text_input = TextInput(FakeDriver(field), 'android')
+
+    assert text_input.enter_text(field, 'secret') == 'replace_value'
+
+
+def test_verify_can_be_turned_off_per_call():
+    field = FakeField()
+    text_input = TextInput(FakeDriver(field), 'android')
+
+    assert text_input.enter_text(field, '0912345678', verify=False) == 'replace_value'
+
+
+def test_raises_when_no_strategy_produces_the_value():
+    field = FakeField()
+    field.send_keys = lambda text: None
+    driver = FakeDriver(field, unsupported={'paste', 'mobile: type'})
+    text_input = TextInput(driver, 'android')
+
+    with pytest.raises(TextInputError, match='send_keys: field value differs'):
+        text_input.enter_text(field, 'hello')
@@ -0,0 +1,112 @@
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, HTTPServer
+
+from utils.watchdog import HangWatchdog
+
+
+class FakeDriver:
+    session_id = None
+    command_executor = None
+
+
+def test_stuck_command_is_dumped_once_without_interrupting(tmp_path):
+    watchdog = HangWatchdog(command_timeout=0.01, output_dir=str(tmp_path))
+    watchdog.start_test('tests/test_x.py::test_y')
+    watchdog.before_command(FakeDriver(), 'findElement', {})
+    time.sleep(0.02)
+
+    watchdog.check()
+    watchdog.check()
+    watchdog.after_command(FakeDriver(), 'findElement', {}, 0.02)
+
+    assert len(watchdog.pop_hangs('tests/test_x.py::test_y')) == 1
+    assert watchdog.end_test() is None
+
+
+def test_deadline_overrun_is_returned_by_end_test(tmp_path):
+    watchdog = HangWatchdog(command_timeout=0, test_timeout=0.01, output_dir=str(tmp_path))
+    watchdog.start_test('tests/test_x.py::test_y')
+    time.sleep(0.02)
+
+    assert watchdog.end_test() == 'test exceeded 0 s wall-clock limit'
+    assert watchdog.end_test() is None
+
+
+def test_deadline_within_limit(tmp_path):
+    watchdog = HangWatchdog(test_timeout=60, output_dir=str(tmp_path))
+    watchdog.start_test('tests/test_x.py::test_y')
+
+    watchdog.check()
+
+    assert watchdog.end_test() is None
+
+
+class RecordingServer:
+    """Appium server stand-in recording the requests it receives"""
+
+    def __enter__(self):
+        requests = self.requests = []
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_DELETE(self):
+                requests.append(('DELETE', self.path))
+                self.send_response(200)
+                self.end_headers()
+                self.wfile.write(b'{"value": null}')
+
+            def log_message(self, *args):
+                pass
+
+        self.server = HTTPServer(('127.0.0.1', 0), Handler)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.url = f"http://127.0.0.1:{self.server.server_port}"
+        return self
+
+    def __exit__(self, *exc):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+class FakeClientConfig:
+    def __init__(self, url):
+        self.remote_server_addr = url
+
+    def get_auth_header(self):
+        return {}
+
+
+class FakeConnectionPool:
+    def __init__(self):
+        self.cleared = False
+
+    def clear(self):
+        self.cleared = True
+
+
+class FakeRemoteDriver:
+    def __init__(self, url, session_id):
+        self.session_id = session_id
+        self.command_executor = type('Executor', (), {})()
+        self.command_executor._client_config = FakeClientConfig(url)
+        self.command_executor._conn = FakeConnectionPool()
+
+
+def test_deadline_overrun_deletes_sessions_of_the_test(tmp_path):
+    with RecordingServer() as server:
+        watchdog = HangWatchdog(command_timeout=0, test_timeout=0.01, output_dir=str(tmp_path))
+        other_test_driver = FakeRemoteDriver(server.url, 'other')
+        watchdog.before_command(other_test_driver, 'findElement', {})
+        watchdog.after_command(other_test_driver, 'findElement', {}, 0.01)
+        watchdog.start_test('tests/test_x.py::test_y')
+        driver = FakeRemoteDriver(server.url, 'abc')
+        # A test looping on short commands, none in flight when the deadline passes
+        watchdog.before_command(driver, 'findElement', {})
+        watchdog.after_command(driver, 'findElement', {}, 0.01)
+        time.sleep(0.02)
+
+        watchdog.check()
+
+        assert server.requests == [('DELETE', '/session/abc')]
+        assert driver.command_executor._conn.cleared
+        assert watchdog.end_test() == 'test exceeded 0 s wall-clock limit'
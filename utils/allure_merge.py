@@ -0,0 +1,311 @@
+"""
+Merge and compact allure-results of several shards and runs
+
+Usage:
+    python -m utils.allure_merge reports/allure/results shard-1/allure-results shard-2/allure-results
+    python -m utils.allure_merge merged allure-results --history gh-pages/last-history
+
+Results are streamed one file at a time. Of several attempts of a test (same
+historyId) only the last one is kept and marked flaky if an earlier attempt had
+another status. Attachments are copied once per content hash and the result
+and container files are rewritten to reference the deduplicated copies. The
+history of all inputs is merged, so the report keeps its trend graphs.
+"""
+import argparse
+import glob
+import hashlib
+import json
+import os
+import shutil
+from typing import Dict, Iterator, List, NamedTuple, Optional
+
+RESULT_SUFFIX = '-result.json'
+CONTAINER_SUFFIX = '-container.json'
+HISTORY_DIR = 'history'
+HISTORY_FILE = 'history.json'
+# Builds kept in history.json items and in the *-trend.json files
+HISTORY_LIMIT = 20
+_CHUNK_SIZE = 1024 * 1024
+
+
+class Attempt(NamedTuple):
+    path: str
+    uuid: str
+    status: Optional[str]
+    stop: int
+
+
+def _read_json(path: str):
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def _write_json(path: str, data):
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False, separators=(',', ':'))
+
+
+def _iter_files(directories: List[str], suffix: str) -> Iterator[str]:
+    for directory in directories:
+        for path in sorted(glob.glob(os.path.join(glob.escape(directory), f"*{suffix}"))):
+            yield path
+
+
+def file_digest(path: str) -> str:
+    digest = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(_CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class AllureMerger:
+    """
+    Stream-merge allure-results directories into one compact results directory
+
+    Example:
+    merger = AllureMerger(['shard-1', 'shard-2'], 'merged')
+    stats = merger.merge()
+    """
+
+    def __init__(self, inputs: List[str], output: str, history_dirs: List[str] = None,
+                 keep_retries: bool = False):
+        """
+        Args:
+            inputs: allure-results directories, later directories win on equal stop times
+            output: Results directory to write, replaced if it exists
+            history_dirs: Extra history directories, e.g. history of the previous report
+            keep_retries: Keep every attempt instead of the last one per historyId
+        """
+        self.inputs = inputs
+        self.output = output
+        self.history_dirs = history_dirs or []
+        self.keep_retries = keep_retries
+        self.stats = {'results': 0, 'dropped_retries': 0, 'containers': 0, 'attachments': 0,
+                      'duplicate_attachments': 0, 'missing_attachments': 0, 'bytes_saved': 0}
+        self._attachments: Dict[str, str] = {}  # source path -> output name
+        self._written: set = set()
+        self._target: Optional[str] = None
+
+    def merge(self) -> Dict[str, int]:
+        for directory in self.inputs:
+            if not os.path.isdir(directory):
+                raise FileNotFoundError(f"Allure results directory not found: {directory}")
+            if os.path.abspath(directory) == os.path.abspath(self.output):
+                raise ValueError(f"Output {self.output} must not be one of the inputs")
+
+        partial = f"{self.output.rstrip(os.sep)}.partial"
+        shutil.rmtree(partial, ignore_errors=True)
+        os.makedirs(partial)
+        self._target = partial
+
+        kept = self._select_attempts()
+        for attempts in kept.values():
+            last = attempts[-1]
+            for attempt in attempts if self.keep_retries else [last]:
+                self._copy_result(attempt, flaky=self._is_flaky(attempts) and attempt is last)
+            if not self.keep_retries:
+                self.stats['dropped_retries'] += len(attempts) - 1
+        kept_uuids = {attempt.uuid for attempts in kept.values()
+                      for attempt in (attempts if self.keep_retries else attempts[-1:])}
+        self._copy_containers(kept_uuids)
+        self._merge_metadata()
+        self._merge_history()
+
+        shutil.rmtree(self.output, ignore_errors=True)
+        os.replace(partial, self.output)
+        return self.stats
+
+    def _select_attempts(self) -> Dict[str, List[Attempt]]:
+        """historyId -> attempts ordered by stop time, only a few fields of each result are kept"""
+        attempts: Dict[str, List[Attempt]] = {}
+        for path in _iter_files(self.inputs, RESULT_SUFFIX):
+            try:
+                result = _read_json(path)
+            except (OSError, ValueError) as e:
+                print(f"Skip unreadable Allure result {path}: {str(e)}")
+                continue
+            uuid = result.get('uuid') or os.path.basename(path)[:-len(RESULT_SUFFIX)]
+            key = result.get('historyId') or uuid
+            attempts.setdefault(key, []).append(
+                Attempt(path, uuid, result.get('status'), result.get('stop') or result.get('start') or 0))
+        for key in attempts:
+            # sorted() is stable, so of equal stop times the attempt from the later input wins
+            attempts[key] = sorted(attempts[key], key=lambda attempt: attempt.stop)
+        return attempts
+
+    @staticmethod
+    def _is_flaky(attempts: List[Attempt]) -> bool:
+        return len({attempt.status for attempt in attempts}) > 1
+
+    def _copy_result(self, attempt: Attempt, flaky: bool):
+        result = _read_json(attempt.path)
+        self._rewrite_attachments(result, os.path.dirname(attempt.path))
+        if flaky:
+            result.setdefault('statusDetails', {})['flaky'] = True
+        _write_json(os.path.join(self._target, f"{attempt.uuid}{RESULT_SUFFIX}"), result)
+        self.stats['results'] += 1
+
+    def _copy_containers(self, kept_uuids: set):
+        for path in _iter_files(self.inputs, CONTAINER_SUFFIX):
+            try:
+                container = _read_json(path)
+            except (OSError, ValueError) as e:
+                print(f"Skip unreadable Allure container {path}: {str(e)}")
+                continue
+            children = [child for child in container.get('children', []) if child in kept_uuids]
+            if not children:
+                continue
+            container['children'] = children
+            self._rewrite_attachments(container, os.path.dirname(path))
+            _write_json(os.path.join(self._target, os.path.basename(path)), container)
+            self.stats['containers'] += 1
+
+    def _rewrite_attachments(self, node, directory: str):
+        """Point attachments of a result, container, fixture or step at the deduplicated files"""
+        if isinstance(node, list):
+            for item in node:
+                self._rewrite_attachments(item, directory)
+            return
+        if not isinstance(node, dict):
+            return
+        for attachment in node.get('attachments', []):
+            if attachment.get('source'):
+                attachment['source'] = self._copy_attachment(os.path.join(directory, attachment['source']))
+        for key in ('steps', 'befores', 'afters'):
+            if key in node:
+                self._rewrite_attachments(node[key], directory)
+
+    def _copy_attachment(self, source: str) -> str:
+        if source in self._attachments:
+            return self._attachments[source]
+        name = os.path.basename(source)
+        if not os.path.exists(source):
+            self.stats['missing_attachments'] += 1
+            self._attachments[source] = name
+            return name
+        extension = os.path.splitext(name)[1]
+        name = f"{file_digest(source)}-attachment{extension}"
+        if name in self._written:
+            self.stats['duplicate_attachments'] += 1
+            self.stats['bytes_saved'] += os.path.getsize(source)
+        else:
+            target = os.path.join(self._target, name)
+            try:
+                # Hard links avoid copying screenshots and videos on the same file system
+                os.link(source, target)
+            except OSError:
+                shutil.copyfile(source, target)
+            self._written.add(name)
+            self.stats['attachments'] += 1
+        self._attachments[source] = name
+        return name
+
+    def _merge_metadata(self):
+        """environment.properties and categories.json are merged, executor.json of the last input wins"""
+        environment = {}
+        categories = []
+        executor = None
+        for directory in self.inputs:
+            path = os.path.join(directory, 'environment.properties')
+            if os.path.exists(path):
+                with open(path, 'r', encoding='utf-8') as f:
+                    for line in f:
+                        key, separator, value = line.rstrip('\n').partition('=')
+                        if separator and not key.startswith('#'):
+                            environment[key.strip()] = value.strip()
+            path = os.path.join(directory, 'categories.json')
+            if os.path.exists(path):
+                names = {category.get('name') for category in categories}
+                categories.extend(category for category in _read_json(path) if category.get('name') not in names)
+            path = os.path.join(directory, 'executor.json')
+            if os.path.exists(path):
+                executor = _read_json(path)
+
+        if environment:
+            with open(os.path.join(self._target, 'environment.properties'), 'w', encoding='utf-8') as f:
+                f.writelines(f"{key}={value}\n" for key, value in environment.items())
+        if categories:
+            _write_json(os.path.join(self._target, 'categories.json'), categories)
+        if executor is not None:
+            _write_json(os.path.join(self._target, 'executor.json'), executor)
+
+    def _merge_history(self):
+        directories = [os.path.join(directory, HISTORY_DIR) for directory in self.inputs] + self.history_dirs
+        directories = [directory for directory in directories if directory and os.path.isdir(directory)]
+        if not directories:
+            return
+        output_dir = os.path.join(self._target, HISTORY_DIR)
+        os.makedirs(output_dir)
+
+        history = merge_history_files([os.path.join(directory, HISTORY_FILE) for directory in directories])
+        if history:
+            _write_json(os.path.join(output_dir, HISTORY_FILE), history)
+
+        trend_names = sorted({name for directory in directories for name in os.listdir(directory)
+                              if name.endswith('-trend.json')})
+        for name in trend_names:
+            trend = merge_trend_files([os.path.join(directory, name) for directory in directories])
+            _write_json(os.path.join(output_dir, name), trend)
+
+
+def merge_history_files(paths: List[str], limit: int = HISTORY_LIMIT) -> dict:
+    """Merge history.json files: items of every historyId joined by uid, newest first"""
+    merged: Dict[str, Dict[str, dict]] = {}
+    for path in paths:
+        if not os.path.exists(path):
+            continue
+        for history_id, entry in _read_json(path).items():
+            items = merged.setdefault(history_id, {})
+            for item in entry.get('items', []):
+                items.setdefault(item.get('uid') or json.dumps(item, sort_keys=True), item)
+
+    history = {}
+    for history_id, items in merged.items():
+        newest = sorted(items.values(), key=lambda item: (item.get('time') or {}).get('start') or 0,
+                        reverse=True)[:limit]
+        statistic = {'failed': 0, 'broken': 0, 'skipped': 0, 'passed': 0, 'unknown': 0}
+        for item in newest:
+            status = item.get('status', 'unknown')
+            statistic[status if status in statistic else 'unknown'] += 1
+        statistic['total'] = len(newest)
+        history[history_id] = {'statistic': statistic, 'items': newest}
+    return history
+
+
+def merge_trend_files(paths: List[str], limit: int = HISTORY_LIMIT) -> list:
+    """Merge *-trend.json files: one entry per build, newest build first"""
+    builds = {}
+    for path in paths:
+        if not os.path.exists(path):
+            continue
+        for entry in _read_json(path):
+            key = (entry.get('buildOrder'), entry.get('reportUrl'), json.dumps(entry.get('data'), sort_keys=True))
+            builds.setdefault(key, entry)
+    entries = sorted(builds.values(), key=lambda entry: entry.get('buildOrder') or 0, reverse=True)
+    return entries[:limit]
+
+
+def main(argv: List[str] = None) -> int:
+    parser = argparse.ArgumentParser(description="Merge and compact allure-results of several shards and runs")
+    parser.add_argument('output', help="Merged results directory, replaced if it exists")
+    parser.add_argument('inputs', nargs='+', help="allure-results directories (globs allowed)")
+    parser.add_argument('--history', action='append', default=[],
+                        help="History directory of a previous report, may be given several times")
+    parser.add_argument('--keep-retries', action='store_true', help="Keep every attempt of retried tests")
+    args = parser.parse_args(argv)
+
+    inputs = [path for pattern in args.inputs for path in sorted(glob.glob(pattern)) or [pattern]]
+    merger = AllureMerger(inputs, args.output, history_dirs=args.history, keep_retries=args.keep_retries)
+    stats = merger.merge()
+    print(f"Merged {len(inputs)} result directories into {args.output}: {stats['results']} results, "
+          f"{stats['containers']} containers, {stats['attachments']} attachments")
+    print(f"Dropped {stats['dropped_retries']} superseded retries and {stats['duplicate_attachments']} "
+          f"duplicate attachments ({stats['bytes_saved'] / 1024 / 1024:.1f} MB)")
+    if stats['missing_attachments']:
+        print(f"{stats['missing_attachments']} referenced attachments were missing")
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,256 @@
+"""
+Named Appium settings profiles, applied per screen or step
+
+Usage (from project root, Appium server running), compare profiles on the current screen:
+    python -m utils.appium_settings --locator "accessibility id" "home" --profiles default fast --repeat 10
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, List, Union
+
+from utils.config import get_config
+
+
+# Values of the server defaults, so a profile can be reset to them explicitly
+PROFILES: Dict[str, Dict[str, dict]] = {
+    'android': {
+        'default': {
+            'waitForIdleTimeout': 10000,
+            'waitForSelectorTimeout': 10000,
+            'ignoreUnimportantViews': False,
+            'allowInvisibleElements': False,
+        },
+        # Animated Flutter screens never become idle, skip the idle wait and use the compressed layout
+        'fast': {
+            'waitForIdleTimeout': 0,
+            'waitForSelectorTimeout': 0,
+            'ignoreUnimportantViews': True,
+        },
+        # Short idle wait for screens that settle quickly but must be idle before interacting
+        'animated': {
+            'waitForIdleTimeout': 100,
+            'waitForSelectorTimeout': 0,
+            'ignoreUnimportantViews': True,
+        },
+    },
+    'ios': {
+        'default': {
+            'waitForIdleTimeout': 10,
+            'animationCoolOffTimeout': 2,
+            'snapshotMaxDepth': 50,
+            'customSnapshotTimeout': 15,
+            'pageSourceExcludedAttributes': '',
+        },
+        # Flutter trees are deep but interactive elements are rarely below depth 30
+        'fast': {
+            'waitForIdleTimeout': 0,
+            'animationCoolOffTimeout': 0,
+            'snapshotMaxDepth': 30,
+            'customSnapshotTimeout': 5,
+            'pageSourceExcludedAttributes': 'accessible,index',
+        },
+        'animated': {
+            'waitForIdleTimeout': 0.5,
+            'animationCoolOffTimeout': 0,
+            'snapshotMaxDepth': 50,
+            'customSnapshotTimeout': 5,
+            'pageSourceExcludedAttributes': '',
+        },
+    },
+}
+
+
+def load_profiles(platform: str, path: str = None) -> Dict[str, dict]:
+    """
+    Built-in profiles of the platform, extended by APPIUM_SETTINGS_PROFILES_PATH
+
+    The file maps platform to profile name to settings:
+        {"android": {"checkout": {"waitForIdleTimeout": 50}}}
+    """
+    profiles = {name: dict(settings) for name, settings in PROFILES.get(platform, {}).items()}
+    path = path or get_config().get('APPIUM_SETTINGS_PROFILES_PATH')
+    if path and os.path.exists(path):
+        with open(path, 'r', encoding='utf-8') as f:
+            for name, settings in json.load(f).get(platform, {}).items():
+                profiles.setdefault(name, {}).update(settings)
+    return profiles
+
+
+class SettingsManager:
+    """
+    Apply Appium settings profiles, sending only settings that differ from the current ones
+
+    The current settings are read once from the server and cached, so switching
+    back and forth between profiles costs one update_settings call per switch
+    and none if the screen already uses the profile.
+
+    Example:
+    settings = get_settings_manager(driver)
+    settings.apply('fast')
+    with settings.use('animated'):
+        common_actions.click_element(AppiumBy.ACCESSIBILITY_ID, "place_order")
+    """
+
+    def __init__(self, driver, platform: str, profiles: Dict[str, dict] = None):
+        """
+        Args:
+            driver: WebDriver instance
+            platform: android or ios
+            profiles: Profile name -> settings, built-in and file profiles if not specified
+        """
+        self.driver = driver
+        self.platform = platform
+        self.profiles = profiles if profiles is not None else load_profiles(platform)
+        self.current_profile = None
+        self.stats = {'updates': 0, 'skipped': 0}
+        self._current: Dict[str, Any] = None
+
+    @property
+    def current(self) -> Dict[str, Any]:
+        """Cached server settings, read from the server on first access"""
+        if self._current is None:
+            try:
+                self._current = dict(self.driver.get_settings())
+            except Exception as e:
+                print(f"Unable to read Appium settings, every setting is sent once: {str(e)}")
+                self._current = {}
+        return self._current
+
+    def resolve(self, profile: Union[str, dict]) -> dict:
+        if isinstance(profile, dict):
+            return profile
+        if profile not in self.profiles:
+            raise ValueError(f"Unknown settings profile {profile} for {self.platform}, "
+                             f"available: {', '.join(sorted(self.profiles))}")
+        return self.profiles[profile]
+
+    def apply(self, profile: Union[str, dict]) -> dict:
+        """
+        Apply a profile (name or settings dict)
+
+        Returns:
+            dict: Settings that were actually sent, empty if nothing changed
+        """
+        changed = {name: value for name, value in self.resolve(profile).items()
+                   if name not in self.current or self.current[name] != value}
+        if changed:
+            self.driver.update_settings(changed)
+            self.current.update(changed)
+            self.stats['updates'] += 1
+        else:
+            self.stats['skipped'] += 1
+        self.current_profile = profile if isinstance(profile, str) else None
+        return changed
+
+    @contextmanager
+    def use(self, profile: Union[str, dict]):
+        """
+        Apply a profile for a block, restore the previous values of the changed settings afterwards
+
+        The previous values are taken before the profile is applied. Settings the server did not
+        report (get_settings failed) are restored to the 'default' profile. A failed restore is
+        logged, so it never hides an exception raised inside the block.
+        """
+        previous_profile = self.current_profile
+        previous = self._snapshot(self.resolve(profile))
+        try:
+            self.apply(profile)
+            yield self
+        finally:
+            try:
+                self.apply(previous)
+            except Exception as e:
+                print(f"Unable to restore Appium settings {previous}: {str(e)}")
+            self.current_profile = previous_profile
+
+    def _snapshot(self, settings: dict) -> dict:
+        defaults = self.profiles.get('default', {})
+        snapshot = {}
+        for name in settings:
+            if name in self.current:
+                snapshot[name] = self.current[name]
+            elif name in defaults:
+                snapshot[name] = defaults[name]
+        return snapshot
+
+    def invalidate(self):
+        """Forget cached settings, e.g. after the session was restarted"""
+        self._current = None
+        self.current_profile = None
+
+
+def get_settings_manager(driver, platform: str = None) -> SettingsManager:
+    """Get the settings manager of a driver, shared by setup and all CommonActions of the driver"""
+    manager = getattr(driver, '_settings_manager', None)
+    if manager is None:
+        platform = (platform or os.getenv('APPIUM_OS', 'ios')).lower()
+        manager = SettingsManager(driver, platform)
+        driver._settings_manager = manager
+    return manager
+
+
+def benchmark_profiles(manager: SettingsManager, profiles: List[str], action: Callable[[], Any],
+                       repeat: int = 5, warmup: int = 1) -> Dict[str, dict]:
+    """
+    Time an action (e.g. page_source or a find_element) under each profile
+
+    Returns:
+        Dict[str, dict]: Profile name -> latency summary (median / p95 / stdev)
+    """
+    from utils.benchmark import summarize
+
+    results = {}
+    for profile in profiles:
+        with manager.use(profile):
+            samples = []
+            for run in range(warmup + repeat):
+                started = time.perf_counter()
+                action()
+                if run >= warmup:
+                    samples.append((time.perf_counter() - started) * 1000)
+        results[profile] = summarize(samples)
+        print(f"{profile}: median {results[profile]['median_ms']} ms, p95 {results[profile]['p95_ms']} ms")
+    return results
+
+
+def main(argv: List[str] = None) -> int:
+    from utils.benchmark import at_least
+
+    parser = argparse.ArgumentParser(description="Compare Appium settings profiles on the current screen")
+    parser.add_argument('--locator', nargs=2, metavar=('TYPE', 'VALUE'),
+                        help='Element to find per run, page_source is measured if not specified')
+    parser.add_argument('--profiles', nargs='+', default=['default', 'fast'])
+    parser.add_argument('--repeat', type=at_least(1), default=5)
+    parser.add_argument('--warmup', type=at_least(0), default=1)
+    parser.add_argument('--output', help='Write results as JSON to this file')
+    args = parser.parse_args(argv)
+
+    from setup import AppiumSetup
+
+    appium = AppiumSetup()
+    driver = appium.setUp()
+    try:
+        manager = get_settings_manager(driver)
+        if args.locator:
+            action = lambda: driver.find_element(*args.locator)
+        else:
+            action = lambda: driver.page_source
+        results = benchmark_profiles(manager, args.profiles, action, repeat=args.repeat, warmup=args.warmup)
+    finally:
+        appium.tearDown()
+
+    if args.output:
+        directory = os.path.dirname(args.output)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
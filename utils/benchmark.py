@@ -0,0 +1,293 @@
+"""
+App cold/warm start and screen transition latency benchmark
+
+Usage (from project root, Appium server running):
+    python -m utils.benchmark --ready-locator "accessibility id" "home" --repeat 10 --warmup 2 \
+        --budgets benchmark_budgets.json
+
+Budgets file maps benchmark name to limits in milliseconds:
+    {"cold_start": {"p95_ms": 8000}, "warm_start": {"median_ms": 1500}}
+
+Screen transitions are measured after the start benchmarks with --transitions:
+    {"place_order_to_payment": {"action": ["accessibility id", "place_order"],
+                                "target": ["accessibility id", "payment"],
+                                "back": ["accessibility id", "back"]}}
+"action" is clicked on the start screen, "target" marks the new screen as shown and
+"back" (optional, system back if missing) returns to the start screen before each run.
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+from typing import Callable, Dict, List, Optional
+
+from utils.config import get_config
+from utils.session_registry import get_device_name
+
+
+DEFAULT_HISTORY_PATH = os.path.join('reports', 'benchmark_history.json')
+MAX_HISTORY_ENTRIES = 200
+
+
+def summarize(samples_ms: List[float]) -> dict:
+    """Median / p95 / stdev of latency samples (milliseconds)"""
+    import numpy as np
+
+    if not samples_ms:
+        raise ValueError("No latency samples to summarize, repeat must be at least 1")
+    return {
+        'runs': len(samples_ms),
+        'median_ms': round(statistics.median(samples_ms), 1),
+        'p95_ms': round(float(np.percentile(samples_ms, 95)), 1),
+        'stdev_ms': round(statistics.stdev(samples_ms), 1) if len(samples_ms) > 1 else 0.0,
+        'min_ms': round(min(samples_ms), 1),
+        'max_ms': round(max(samples_ms), 1),
+        'samples_ms': [round(sample, 1) for sample in samples_ms],
+    }
+
+
+class LatencyBenchmark:
+    """
+    Measure time until the first meaningful element is visible
+
+    Every measurement is repeated warmup + repeat times, warmup runs are discarded.
+
+    Example:
+    benchmark = LatencyBenchmark(driver, common_actions, app_id, (AppiumBy.ACCESSIBILITY_ID, "home"))
+    benchmark.cold_start()
+    benchmark.warm_start()
+    benchmark.transition(
+        "place_order_to_payment",
+        action=lambda: common_actions.click_element(AppiumBy.ACCESSIBILITY_ID, "place_order"),
+        locator=(AppiumBy.ACCESSIBILITY_ID, "payment"),
+        prepare=lambda: common_actions.navigate_back(),
+    )
+    """
+
+    def __init__(self, driver, common_actions, app_id: str, ready_locator: tuple, repeat: int = 5,
+                 warmup: int = 1, timeout: int = 60, poll_frequency: float = 0.05):
+        """
+        Args:
+            driver: WebDriver instance
+            common_actions: CommonActions instance of the driver
+            app_id: Android package / iOS bundle id
+            ready_locator: (locator_type, locator_value) of the first meaningful element after start
+            repeat: Measured runs per benchmark
+            warmup: Discarded runs before measuring
+            timeout: Maximum waiting time per run (seconds)
+            poll_frequency: Waiting time between visibility checks (seconds)
+        """
+        if repeat < 1 or warmup < 0:
+            raise ValueError(f"repeat must be at least 1 and warmup at least 0, got {repeat} and {warmup}")
+        self.driver = driver
+        self.common_actions = common_actions
+        self.app_id = app_id
+        self.ready_locator = ready_locator
+        self.repeat = repeat
+        self.warmup = warmup
+        self.timeout = timeout
+        self.poll_frequency = poll_frequency
+        self.results: Dict[str, dict] = {}
+
+    def measure(self, name: str, trigger: Callable[[], None], locator: tuple,
+                prepare: Optional[Callable[[], None]] = None) -> dict:
+        """
+        Measure time from trigger until locator is visible
+
+        Args:
+            name: Benchmark name
+            trigger: Callable starting the measured operation
+            locator: (locator_type, locator_value) that marks the operation as done
+            prepare: Callable run before each run, not measured
+
+        Returns:
+            dict: Summary of measured runs
+        """
+        samples = []
+        for run in range(self.warmup + self.repeat):
+            if prepare:
+                prepare()
+            started = time.perf_counter()
+            trigger()
+            self.common_actions.wait_for_element_visible(
+                *locator, timeout=self.timeout, poll_frequency=self.poll_frequency)
+            elapsed_ms = (time.perf_counter() - started) * 1000
+            label = 'warmup' if run < self.warmup else 'run'
+            print(f"{name} {label} {run + 1}: {elapsed_ms:.0f} ms")
+            if run >= self.warmup:
+                samples.append(elapsed_ms)
+
+        self.results[name] = summarize(samples)
+        return self.results[name]
+
+    def cold_start(self, clear_data: bool = True) -> dict:
+        """Terminate (and clear) the app, then launch it"""
+        def prepare():
+            self.driver.terminate_app(self.app_id)
+            if clear_data:
+                self._clear_app_data()
+
+        return self.measure('cold_start', lambda: self.driver.activate_app(self.app_id), self.ready_locator, prepare)
+
+    def warm_start(self) -> dict:
+        """Send the app to background, then bring it back"""
+        def prepare():
+            self.driver.execute_script('mobile: backgroundApp', {'seconds': -1})
+
+        return self.measure('warm_start', lambda: self.driver.activate_app(self.app_id), self.ready_locator, prepare)
+
+    def transition(self, name: str, action: Callable[[], None], locator: tuple,
+                   prepare: Optional[Callable[[], None]] = None) -> dict:
+        """Measure a screen transition, prepare must bring the app back to the start screen"""
+        return self.measure(name, action, locator, prepare)
+
+    def click_transition(self, name: str, action_locator: tuple, target_locator: tuple,
+                         back_locator: tuple = None) -> dict:
+        """
+        Measure a transition started by clicking an element, going back to the start screen between runs
+
+        Args:
+            name: Benchmark name
+            action_locator: Element on the start screen that starts the transition
+            target_locator: First meaningful element of the new screen
+            back_locator: Element returning to the start screen, system back if not specified
+        """
+        def prepare():
+            self.driver.implicitly_wait(0)
+            if any(element.is_displayed() for element in self.driver.find_elements(*action_locator)):
+                return
+            if back_locator:
+                self.common_actions.click_element(*back_locator)
+            else:
+                self.driver.back()
+            self.common_actions.wait_for_element_visible(
+                *action_locator, timeout=self.timeout, poll_frequency=self.poll_frequency)
+
+        return self.transition(name, lambda: self.common_actions.click_element(*action_locator),
+                               target_locator, prepare)
+
+    def _clear_app_data(self):
+        key = 'appId' if self.common_actions.get_platform() == 'android' else 'bundleId'
+        try:
+            self.driver.execute_script('mobile: clearApp', {key: self.app_id})
+        except Exception as e:
+            print(f"Unable to clear app data, cold start without clearing: {str(e)}")
+
+
+def check_budgets(results: Dict[str, dict], budgets: Dict[str, dict]) -> List[str]:
+    """
+    Check results against budgets
+
+    Returns:
+        List[str]: Budget violations, empty if all benchmarks are within budget
+    """
+    violations = []
+    for name, limits in budgets.items():
+        result = results.get(name)
+        if result is None:
+            continue
+        for stat, limit in limits.items():
+            if stat in result and result[stat] > limit:
+                violations.append(f"{name} {stat} {result[stat]} ms exceeds budget {limit} ms")
+    return violations
+
+
+def append_history(path: str, entry: dict):
+    """Append a run to the JSON history file, keeping the latest MAX_HISTORY_ENTRIES"""
+    history = []
+    if os.path.exists(path):
+        with open(path, 'r', encoding='utf-8') as f:
+            history = json.load(f)
+    history.append(entry)
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(history[-MAX_HISTORY_ENTRIES:], f, indent=2, ensure_ascii=False)
+
+
+def load_transitions(path: str) -> Dict[str, dict]:
+    """Read transition definitions: name -> action / target / back locators"""
+    with open(path, 'r', encoding='utf-8') as f:
+        transitions = json.load(f)
+    for name, transition in transitions.items():
+        missing = [key for key in ('action', 'target') if not transition.get(key)]
+        if missing:
+            raise ValueError(f"Transition {name} needs {' and '.join(missing)} locators")
+    return transitions
+
+
+def at_least(minimum: int):
+    """argparse type for an integer option with a lower bound"""
+    def parse(value: str) -> int:
+        number = int(value)
+        if number < minimum:
+            raise argparse.ArgumentTypeError(f"must be at least {minimum}, got {number}")
+        return number
+    return parse
+
+
+def main(argv: List[str] = None) -> int:
+    parser = argparse.ArgumentParser(description="App start and screen transition latency benchmark")
+    parser.add_argument('--ready-locator', nargs=2, metavar=('TYPE', 'VALUE'), required=True,
+                        help='Locator of the first meaningful element, e.g. "accessibility id" home')
+    parser.add_argument('--repeat', type=at_least(1), default=5)
+    parser.add_argument('--warmup', type=at_least(0), default=1)
+    parser.add_argument('--timeout', type=int, default=60)
+    parser.add_argument('--app-id', help='Android package / iOS bundle id, default is APP_ID_<ENV>')
+    parser.add_argument('--no-clear', action='store_true', help='Do not clear app data before cold start')
+    parser.add_argument('--history', default=DEFAULT_HISTORY_PATH)
+    parser.add_argument('--budgets', help='JSON file with budgets per benchmark')
+    parser.add_argument('--transitions', help='JSON file with screen transitions to measure after the start')
+    args = parser.parse_args(argv)
+    transitions = load_transitions(args.transitions) if args.transitions else {}
+
+    from setup import AppiumSetup
+    from pages.common.common_actions import CommonActions
+
+    config = get_config()
+    env = (os.getenv('APPIUM_ENV') or config.get('APPIUM_ENV', 'staging')).upper()
+    app_id = args.app_id or config.get(f'APP_ID_{env}')
+    if not app_id:
+        parser.error(f"App id not found, set APP_ID_{env} or pass --app-id")
+
+    appium = AppiumSetup()
+    driver = appium.setUp()
+    try:
+        common_actions = CommonActions(driver, platform=appium.platform)
+        benchmark = LatencyBenchmark(driver, common_actions, app_id, tuple(args.ready_locator),
+                                     repeat=args.repeat, warmup=args.warmup, timeout=args.timeout)
+        benchmark.cold_start(clear_data=not args.no_clear)
+        benchmark.warm_start()
+        for name, transition in transitions.items():
+            benchmark.click_transition(name, tuple(transition['action']), tuple(transition['target']),
+                                       tuple(transition['back']) if transition.get('back') else None)
+        platform = common_actions.get_platform()
+        device = get_device_name(driver)
+    finally:
+        appium.tearDown()
+
+    append_history(args.history, {
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'platform': platform,
+        'device': device,
+        'app_id': app_id,
+        'results': benchmark.results,
+    })
+    for name, result in benchmark.results.items():
+        print(f"{name}: median {result['median_ms']} ms, p95 {result['p95_ms']} ms, stdev {result['stdev_ms']} ms")
+
+    if args.budgets:
+        with open(args.budgets, 'r', encoding='utf-8') as f:
+            violations = check_budgets(benchmark.results, json.load(f))
+        for violation in violations:
+            print(f"Budget exceeded: {violation}")
+        if violations:
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,188 @@
+"""
+Record/replay cassettes of Appium traffic
+
+Record once against a device, then re-run page objects and steps offline:
+    CASSETTE_MODE=record pytest tests/steps/android --platform android
+    CASSETTE_MODE=replay pytest tests/steps/android --platform android
+
+A cassette stores every command with its parameters and the raw server response
+(page sources, element ids, errors). Large strings such as page sources and
+screenshots are stored once per content hash and the file is gzip compressed.
+
+Credentials (e.g. bstack:options userName / accessKey) are redacted while recording,
+so cassettes can be committed and replayed in CI. newSession is matched on the
+command alone, a cassette recorded with one device, app path or build name
+replays with other capabilities.
+"""
+import copy
+import gzip
+import hashlib
+import json
+import os
+import re
+from typing import Any, List, Optional
+
+from appium.webdriver.appium_connection import AppiumConnection
+from appium.webdriver.client_config import AppiumClientConfig
+
+from utils.config import get_config
+
+
+DEFAULT_CASSETTE_DIR = 'cassettes'
+CASSETTE_VERSION = 2
+# Strings longer than this are stored in the blob table, identical page sources are stored once
+BLOB_MIN_LENGTH = 512
+# Capability / parameter names whose values are never written to a cassette (compared lowercase, without vendor prefix)
+CREDENTIAL_KEYS = {'username', 'accesskey', 'access_key', 'password', 'apikey', 'api_key', 'token', 'authorization'}
+REDACTED = '<redacted>'
+# Commands replayed whatever their parameters, capabilities differ between machines
+_MATCH_COMMAND_ONLY = {'newSession'}
+
+
+class CassetteMismatchError(AssertionError):
+    pass
+
+
+def cassette_path(nodeid: str, platform: str, role: str = None, cassette_dir: str = None) -> str:
+    """Cassette file of a test, one per platform and role"""
+    cassette_dir = cassette_dir or get_config().get('CASSETTE_DIR', DEFAULT_CASSETTE_DIR)
+    name = re.sub(r'[^A-Za-z0-9_.-]+', '_', nodeid)[:150]
+    if role:
+        name = f"{name}.{role}"
+    return os.path.join(cassette_dir, platform, f"{name}.json.gz")
+
+
+def _redact(value: Any) -> Any:
+    """Copy of value with credential fields replaced"""
+    if isinstance(value, dict):
+        return {key: REDACTED if key.split(':')[-1].lower() in CREDENTIAL_KEYS else _redact(item)
+                for key, item in value.items()}
+    if isinstance(value, list):
+        return [_redact(item) for item in value]
+    return value
+
+
+def _normalize_params(params: Optional[dict]) -> dict:
+    """Request parameters without the session id, which differs between sessions, and without credentials"""
+    normalized = _redact(params) if params else {}
+    normalized.pop('sessionId', None)
+    return normalized
+
+
+def _pack(value: Any, blobs: dict) -> Any:
+    if isinstance(value, str) and len(value) >= BLOB_MIN_LENGTH:
+        digest = hashlib.sha1(value.encode('utf-8')).hexdigest()[:16]
+        blobs[digest] = value
+        return {'$blob': digest}
+    if isinstance(value, dict):
+        return {key: _pack(item, blobs) for key, item in value.items()}
+    if isinstance(value, list):
+        return [_pack(item, blobs) for item in value]
+    return value
+
+
+def _unpack(value: Any, blobs: dict) -> Any:
+    if isinstance(value, dict):
+        if set(value) == {'$blob'}:
+            return blobs[value['$blob']]
+        return {key: _unpack(item, blobs) for key, item in value.items()}
+    if isinstance(value, list):
+        return [_unpack(item, blobs) for item in value]
+    return value
+
+
+class RecordingConnection(AppiumConnection):
+    """Command executor that forwards to the server and records every command and response"""
+
+    def __init__(self, remote_server_addr: str, path: str):
+        super().__init__(client_config=AppiumClientConfig(remote_server_addr=remote_server_addr))
+        self.path = path
+        self.interactions: List[list] = []
+
+    def execute(self, command, params):
+        request = _normalize_params(params)
+        response = super().execute(command, params)
+        self.interactions.append([command, request, _redact(response)])
+        return response
+
+    def save(self) -> str:
+        blobs = {}
+        interactions = [[command, _pack(params, blobs), _pack(response, blobs)]
+                        for command, params, response in self.interactions]
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with gzip.open(self.path, 'wt', encoding='utf-8', compresslevel=6) as f:
+            json.dump({'version': CASSETTE_VERSION, 'interactions': interactions, 'blobs': blobs},
+                      f, separators=(',', ':'), ensure_ascii=False)
+        print(f"Cassette recorded: {self.path} ({len(self.interactions)} commands)")
+        return self.path
+
+
+class ReplayConnection(AppiumConnection):
+    """
+    Command executor that serves a recorded cassette without a server
+
+    Commands must arrive in the recorded order with the recorded parameters.
+    Polling loops may poll more often than during recording (replay is faster),
+    so an immediate repeat of the previous request is answered with the
+    previous response. Anything else that differs raises CassetteMismatchError.
+    """
+
+    def __init__(self, path: str):
+        super().__init__(client_config=AppiumClientConfig(remote_server_addr='http://cassette.replay'))
+        self.path = path
+        if not os.path.exists(path):
+            raise FileNotFoundError(f"Cassette not found: {path}, record it with CASSETTE_MODE=record")
+        with gzip.open(path, 'rt', encoding='utf-8') as f:
+            data = json.load(f)
+        if data.get('version') != CASSETTE_VERSION:
+            raise CassetteMismatchError(f"Cassette {path} has version {data.get('version')}, "
+                                        f"expected {CASSETTE_VERSION}, record it again")
+        self.blobs = data['blobs']
+        self.interactions = data['interactions']
+        self.position = 0
+        self._previous = None
+
+    def execute(self, command, params):
+        request = _normalize_params(params)
+        if self.position < len(self.interactions):
+            recorded_command, recorded_params, response = self.interactions[self.position]
+            recorded_params = _unpack(recorded_params, self.blobs)
+            if recorded_command == command and (command in _MATCH_COMMAND_ONLY or recorded_params == request):
+                self.position += 1
+                self._previous = (command, request, response)
+                return _unpack(copy.deepcopy(response), self.blobs)
+        else:
+            recorded_command, recorded_params = None, None
+
+        if self._previous and self._previous[:2] == (command, request):
+            return _unpack(copy.deepcopy(self._previous[2]), self.blobs)
+        # Quitting early (e.g. a replayed test failed) must not hide the original error
+        if command == 'quit':
+            return {'value': None}
+        if recorded_command is None:
+            raise CassetteMismatchError(
+                f"Cassette {self.path} exhausted after {len(self.interactions)} commands, "
+                f"got extra command {command} {json.dumps(request)[:300]}")
+        raise CassetteMismatchError(
+            f"Cassette {self.path} mismatch at command #{self.position + 1}:\n"
+            f"  recorded: {recorded_command} {json.dumps(recorded_params)[:300]}\n"
+            f"  actual:   {command} {json.dumps(request)[:300]}")
+
+    def assert_consumed(self):
+        """Fail if the test issued fewer commands than were recorded"""
+        remaining = len(self.interactions) - self.position
+        if remaining:
+            command = self.interactions[self.position][0]
+            raise CassetteMismatchError(
+                f"Cassette {self.path} has {remaining} unused commands, next recorded command is {command}")
+
+
+def create_connection(mode: str, remote_server_addr: str, path: str) -> AppiumConnection:
+    """Command executor for CASSETTE_MODE record or replay"""
+    if mode == 'record':
+        return RecordingConnection(remote_server_addr, path)
+    if mode == 'replay':
+        return ReplayConnection(path)
+    raise ValueError(f"Unsupported CASSETTE_MODE: {mode}, use off, record or replay")
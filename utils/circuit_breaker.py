@@ -0,0 +1,281 @@
+import json
+import os
+import threading
+import time
+from typing import Dict, List, Optional
+
+from selenium.common.exceptions import InvalidSessionIdException, WebDriverException
+
+from utils.config import get_config
+from utils.driver_hooks import CommandListener
+
+try:
+    import fcntl
+except ImportError:  # Windows has no fcntl, updates are then not serialized between workers
+    fcntl = None
+
+
+DEFAULT_HEALTH_PATH = os.path.join('reports', 'device_health.json')
+
+# Messages of failures caused by the device, driver server or connection, not by the app under test
+INFRASTRUCTURE_ERROR_MARKERS = (
+    'session is either terminated or not started',
+    'session not found',
+    'invalid session id',
+    'instrumentation process is not running',
+    'uiautomator2 server',
+    'cannot be proxied to uiautomator2',
+    'could not proxy command',
+    'socket hang up',
+    'econnrefused',
+    'econnreset',
+    'connection refused',
+    'connection reset',
+    'device offline',
+    'device not found',
+    'xcodebuild failed',
+    'wda is not running',
+)
+
+_INFRASTRUCTURE_ERROR_TYPES = (
+    'MaxRetryError', 'ProtocolError', 'NewConnectionError', 'ReadTimeoutError', 'RemoteDisconnected',
+)
+
+
+class DeviceQuarantinedError(WebDriverException):
+    pass
+
+
+def is_infrastructure_error(error: BaseException) -> bool:
+    """Whether an error means the device or session is unhealthy (vs. an app or test failure)"""
+    if isinstance(error, DeviceQuarantinedError):
+        return False
+    if isinstance(error, (InvalidSessionIdException, ConnectionError)):
+        return True
+    if type(error).__name__ in _INFRASTRUCTURE_ERROR_TYPES:
+        return True
+    message = str(error).lower()
+    return any(marker in message for marker in INFRASTRUCTURE_ERROR_MARKERS)
+
+
+def is_device_key(key: str) -> bool:
+    return key.startswith('device:')
+
+
+def get_device_key(capabilities: dict) -> Optional[str]:
+    """Health key of a local device from its capabilities, None if it cannot be identified"""
+    for name in ('appium:udid', 'udid', 'appium:deviceName', 'deviceName'):
+        if capabilities.get(name):
+            return f"device:{capabilities[name]}"
+    return None
+
+
+class CircuitBreaker:
+    """
+    Count consecutive infrastructure failures per device and session, open after a threshold
+
+    An open breaker quarantines the device (or session): its commands fail
+    immediately with DeviceQuarantinedError instead of waiting out find_element
+    retries, reruns and new session timeouts. State is kept in one JSON file
+    shared by all xdist workers, so a device one worker quarantined is skipped
+    by the others too.
+    """
+
+    def __init__(self, path: str = None, threshold: int = 3, cooldown: float = 0, refresh_interval: float = 5):
+        """
+        Args:
+            path: JSON file the health state is shared through
+            threshold: Consecutive infrastructure failures that open the breaker
+            cooldown: Seconds until a quarantined device gets another chance, 0 keeps it out for the run
+            refresh_interval: Seconds between re-reads of the state written by other workers
+        """
+        self.path = path or get_config().get('DEVICE_HEALTH_PATH', DEFAULT_HEALTH_PATH)
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.refresh_interval = refresh_interval
+        self._state: Dict[str, dict] = {}
+        self._loaded_at = 0.0
+        self._lock = threading.Lock()
+
+    def reset(self):
+        """Forget health of a previous run, call once from the controller process"""
+        if os.path.exists(self.path):
+            os.remove(self.path)
+        with self._lock:
+            self._state = {}
+            self._loaded_at = 0.0
+
+    def is_open(self, key: str) -> bool:
+        entry = self._get(key)
+        if not entry or entry.get('opened_at') is None:
+            return False
+        if self.cooldown and time.time() - entry['opened_at'] > self.cooldown:
+            return False
+        return True
+
+    def reason(self, key: str) -> str:
+        entry = self._get(key) or {}
+        return entry.get('reason', '')
+
+    def record_failure(self, key: str, error: BaseException) -> bool:
+        """
+        Count an infrastructure failure
+
+        Returns:
+            bool: Whether this failure opened the breaker
+        """
+        reason = str(error).splitlines()[0][:200] if str(error) else type(error).__name__
+
+        def update(state):
+            entry = state.setdefault(key, {'failures': 0, 'opened_at': None})
+            entry['failures'] += 1
+            entry['reason'] = reason
+            if entry['failures'] >= self.threshold and entry['opened_at'] is None:
+                entry['opened_at'] = round(time.time(), 3)
+                return True
+            return False
+
+        opened = self._update(update)
+        if opened:
+            print(f"Circuit breaker opened, quarantine {key}: {reason}")
+        return opened
+
+    def record_success(self, key: str):
+        """Reset the failure count, only touches the shared file if there were failures"""
+        entry = self._get(key, refresh=False)
+        if not entry or not entry.get('failures'):
+            return
+
+        def update(state):
+            current = state.get(key)
+            if current and (current.get('opened_at') is None or self.cooldown):
+                current['failures'] = 0
+                current['opened_at'] = None
+
+        self._update(update)
+
+    def quarantined(self) -> Dict[str, dict]:
+        """Open breakers, key -> failures / reason / opened_at"""
+        self._refresh(force=True)
+        with self._lock:
+            return {key: dict(entry) for key, entry in self._state.items() if entry.get('opened_at') is not None}
+
+    def _get(self, key: str, refresh: bool = True) -> Optional[dict]:
+        if refresh:
+            self._refresh()
+        with self._lock:
+            return self._state.get(key)
+
+    def _refresh(self, force: bool = False):
+        if not force and time.monotonic() - self._loaded_at < self.refresh_interval:
+            return
+        state = self._load()
+        with self._lock:
+            self._state = state
+            self._loaded_at = time.monotonic()
+
+    def _load(self) -> Dict[str, dict]:
+        if not os.path.exists(self.path):
+            return {}
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _update(self, update):
+        """Read-modify-write the shared state under an exclusive lock"""
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(self.path, 'a+', encoding='utf-8') as f:
+            if fcntl:
+                fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+            try:
+                f.seek(0)
+                content = f.read()
+                state = json.loads(content) if content.strip() else {}
+                result = update(state)
+                f.seek(0)
+                f.truncate()
+                json.dump(state, f)
+                f.flush()
+            finally:
+                if fcntl:
+                    fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+        with self._lock:
+            self._state = state
+            self._loaded_at = time.monotonic()
+        return result
+
+
+class HealthListener(CommandListener):
+    """
+    Feed command outcomes into the breaker and fail commands of quarantined devices fast
+
+    Session keys count every failed command. Device keys count sessions: the first
+    infrastructure failure of a session counts once against its device (retries on
+    the same dead session do not), and a session that quits without one resets the device.
+    """
+
+    def __init__(self, breaker: CircuitBreaker):
+        self.breaker = breaker
+
+    def before_command(self, driver, command, params):
+        # Quitting a quarantined session must still be possible
+        if command == 'quit':
+            return
+        for key in getattr(driver, '_health_keys', ()):
+            if self.breaker.is_open(key):
+                raise DeviceQuarantinedError(f"{key} is quarantined after repeated infrastructure failures: "
+                                             f"{self.breaker.reason(key)}")
+
+    def after_command(self, driver, command, params, duration, error=None):
+        failed_devices = getattr(driver, '_health_failed_devices', None)
+        if failed_devices is None:
+            failed_devices = driver._health_failed_devices = set()
+        for key in getattr(driver, '_health_keys', ()):
+            if not is_device_key(key):
+                if command == 'quit':
+                    continue
+                if error is None:
+                    self.breaker.record_success(key)
+                elif is_infrastructure_error(error):
+                    self.breaker.record_failure(key, error)
+            elif command == 'quit':
+                if error is None and key not in failed_devices:
+                    self.breaker.record_success(key)
+            elif error is not None and key not in failed_devices and is_infrastructure_error(error):
+                failed_devices.add(key)
+                self.breaker.record_failure(key, error)
+
+
+_breaker: Optional[CircuitBreaker] = None
+_listener: Optional[HealthListener] = None
+
+
+def get_circuit_breaker() -> CircuitBreaker:
+    """Get the process-wide circuit breaker"""
+    global _breaker
+    if _breaker is None:
+        config = get_config()
+        _breaker = CircuitBreaker(
+            threshold=int(config.get('DEVICE_FAILURE_THRESHOLD', '3')),
+            cooldown=float(config.get('DEVICE_QUARANTINE_SECONDS', '0')),
+        )
+    return _breaker
+
+
+def get_health_listener() -> HealthListener:
+    global _listener
+    if _listener is None:
+        _listener = HealthListener(get_circuit_breaker())
+    return _listener
+
+
+def format_quarantine_report(quarantined: Dict[str, dict]) -> List[str]:
+    lines = []
+    for key, entry in sorted(quarantined.items()):
+        opened = time.strftime('%H:%M:%S', time.localtime(entry['opened_at']))
+        lines.append(f"{key}: quarantined at {opened} after {entry['failures']} failures, {entry.get('reason', '')}")
+    return lines
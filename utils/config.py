@@ -0,0 +1,22 @@
+import os
+from functools import lru_cache
+from typing import Mapping
+
+
+@lru_cache(maxsize=None)
+def get_config() -> Mapping[str, str]:
+    """
+    Load configuration once per process and share it
+    Reads .env, in CI environment (no .env) falls back to environment variables
+    """
+    from dotenv import dotenv_values
+
+    config = dotenv_values(".env")
+    if not config:
+        config = os.environ
+    return config
+
+
+def get_bool(name: str, default: str = 'true') -> bool:
+    """Read a "true"/"false" setting"""
+    return str(get_config().get(name, default)).lower() == 'true'
@@ -0,0 +1,81 @@
+import threading
+import time
+from contextlib import contextmanager
+from typing import List
+
+
+class CommandListener:
+    """Base class for listeners notified around every driver command"""
+
+    def before_command(self, driver, command: str, params: dict):
+        pass
+
+    def after_command(self, driver, command: str, params: dict, duration: float, error: Exception = None):
+        pass
+
+
+_listeners: List[CommandListener] = []
+_listeners_lock = threading.Lock()
+_thread_state = threading.local()
+
+
+@contextmanager
+def background_commands():
+    """Mark commands sent by the current thread as background work (e.g. samplers), not test activity"""
+    previous = getattr(_thread_state, 'background', False)
+    _thread_state.background = True
+    try:
+        yield
+    finally:
+        _thread_state.background = previous
+
+
+def is_background_command() -> bool:
+    """Whether the command being sent on this thread is background work"""
+    return getattr(_thread_state, 'background', False)
+
+
+def add_command_listener(listener: CommandListener):
+    with _listeners_lock:
+        if listener not in _listeners:
+            _listeners.append(listener)
+
+
+def remove_command_listener(listener: CommandListener):
+    with _listeners_lock:
+        if listener in _listeners:
+            _listeners.remove(listener)
+
+
+def instrument_driver(driver):
+    """
+    Route every command of the driver through the registered listeners
+    Wraps driver.execute on the instance, calling it twice is a no-op
+    """
+    if getattr(driver, '_command_hooks_installed', False):
+        return driver
+    original_execute = driver.execute
+
+    def execute(driver_command, params=None):
+        # A listener may reject the command in before_command (e.g. quarantined device),
+        # every listener notified before it still gets after_command with that error
+        notified = []
+        started = time.perf_counter()
+        error = None
+        try:
+            for listener in list(_listeners):
+                listener.before_command(driver, driver_command, params)
+                notified.append(listener)
+            started = time.perf_counter()
+            return original_execute(driver_command, params)
+        except Exception as e:
+            error = e
+            raise
+        finally:
+            duration = time.perf_counter() - started
+            for listener in notified:
+                listener.after_command(driver, driver_command, params, duration, error)
+
+    driver.execute = execute
+    driver._command_hooks_installed = True
+    return driver
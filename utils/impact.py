@@ -0,0 +1,352 @@
+"""
+Locator-aware test impact index and git diff based test selection
+
+Record what every test touches (page object / CommonActions functions, locators
+sent to the driver, feature files) and select only affected tests for a change:
+    pytest --impact-record                    # run everything once, builds the index
+    pytest --impact-base origin/main --impact-record   # affected tests + smoke set, updates the index
+"""
+import ast
+import fnmatch
+import json
+import os
+import re
+import subprocess
+import sys
+import threading
+from typing import Dict, Iterable, List, Optional, Set
+
+import pytest
+
+from utils.config import get_config
+from utils.driver_hooks import CommandListener, add_command_listener, remove_command_listener
+from utils.session_registry import get_worker_id
+
+
+DEFAULT_INDEX_PATH = '.impact_index.json'
+DEFAULT_RECORD_DIR = os.path.join('reports', 'impact')
+DEFAULT_TRACED_PATHS = ['pages']
+# Changes to these files can affect every test
+DEFAULT_RUN_ALL_PATTERNS = ['setup.py', 'tests/conftest.py', 'conftest.py', 'pytest.ini', 'requirements.txt',
+                            'utils/*.py']
+
+_LITERAL_PATTERN = re.compile(r'''(["'])(.{3,}?)(?<!\\)\1''')
+_FIND_COMMANDS = {'findElement', 'findElements', 'findChildElement', 'findChildElements'}
+
+
+class Footprint(CommandListener):
+    """Collect functions under the traced paths and locators a single test used"""
+
+    def __init__(self, root: str, traced_paths: List[str]):
+        self.root = os.path.abspath(root)
+        self.prefixes = tuple(os.path.join(self.root, path) + os.sep for path in traced_paths)
+        self.functions: Set[str] = set()
+        self.locators: Set[str] = set()
+        self._file_cache: Dict[str, Optional[str]] = {}
+        self._lock = threading.Lock()
+
+    def start(self):
+        sys.setprofile(self._profile)
+        threading.setprofile(self._profile)
+        add_command_listener(self)
+
+    def stop(self):
+        sys.setprofile(None)
+        threading.setprofile(None)
+        remove_command_listener(self)
+
+    def _profile(self, frame, event, arg):
+        if event != 'call':
+            return
+        filename = frame.f_code.co_filename
+        relative = self._file_cache.get(filename, False)
+        if relative is False:
+            relative = os.path.relpath(filename, self.root).replace(os.sep, '/') \
+                if filename.startswith(self.prefixes) else None
+            self._file_cache[filename] = relative
+        if relative is not None:
+            self.functions.add(f"{relative}::{frame.f_code.co_name}")
+
+    def before_command(self, driver, command, params):
+        if command in _FIND_COMMANDS and params:
+            with self._lock:
+                self.locators.add(f"{params.get('using')}={params.get('value')}")
+
+
+class ImpactIndex:
+    """
+    Persistent map of test node id -> functions, locators and files it touched
+
+    Tests that ran replace their entry, all other entries are kept, so the
+    index stays current from whatever subset CI runs.
+    """
+
+    def __init__(self, path: str = None):
+        self.path = path or get_config().get('TEST_IMPACT_INDEX', DEFAULT_INDEX_PATH)
+        self.tests: Dict[str, dict] = self._load()
+
+    def _load(self) -> Dict[str, dict]:
+        if not os.path.exists(self.path):
+            return {}
+        with open(self.path, 'r', encoding='utf-8') as f:
+            return json.load(f).get('tests', {})
+
+    def update(self, records: Iterable[dict]) -> int:
+        count = 0
+        for record in records:
+            self.tests[record['nodeid']] = {
+                'functions': sorted(record['functions']),
+                'locators': sorted(record['locators']),
+                'files': sorted(record['files']),
+            }
+            count += 1
+        return count
+
+    def save(self):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'version': 1, 'tests': self.tests}, f, indent=1, sort_keys=True, ensure_ascii=False)
+        os.replace(tmp_path, self.path)
+
+
+class DiffImpact:
+    """
+    Changed files, functions and string literals of a git diff
+
+    Untracked files that are not ignored count as added, a new page object
+    is usually not staged yet when selecting tests locally. Paths in ignore
+    (the impact index itself) are left out.
+    """
+
+    def __init__(self, base: str, root: str = '.', ignore: Iterable[str] = ()):
+        self.base = base
+        self.root = root
+        self.ignore = {os.path.relpath(os.path.abspath(path), os.path.abspath(root)).replace(os.sep, '/')
+                       for path in ignore}
+        self.files: Set[str] = set()
+        self.functions: Set[str] = set()
+        self.literals: Set[str] = set()
+        self._parse(self._git('diff', '--unified=0', '--no-color', '--no-renames', base))
+        self._add_untracked(self._git('ls-files', '--others', '--exclude-standard', '--full-name').splitlines())
+
+    def _git(self, *args) -> str:
+        return subprocess.run(['git', *args], cwd=self.root, capture_output=True, text=True, check=True).stdout
+
+    def _parse(self, diff: str):
+        old_path = new_path = None
+        old_lines: Dict[str, Set[int]] = {}
+        new_lines: Dict[str, Set[int]] = {}
+        for line in diff.splitlines():
+            if line.startswith('--- '):
+                old_path = None if line == '--- /dev/null' else line[6:]
+            elif line.startswith('+++ '):
+                new_path = None if line == '+++ /dev/null' else line[6:]
+                self.files.update(path for path in (old_path, new_path) if path)
+            elif line.startswith('@@'):
+                match = re.match(r'@@ -(\d+)(?:,(\d+))? \+(\d+)(?:,(\d+))? @@', line)
+                old_start, old_count, new_start, new_count = (int(value) if value is not None else 1
+                                                              for value in match.groups())
+                if old_path:
+                    old_lines.setdefault(old_path, set()).update(range(old_start, old_start + old_count))
+                if new_path:
+                    new_lines.setdefault(new_path, set()).update(range(new_start, new_start + new_count))
+            elif line[:1] in '+-' and not line.startswith(('+++', '---')):
+                self.literals.update(match.group(2) for match in _LITERAL_PATTERN.finditer(line[1:]))
+
+        for path, lines in old_lines.items():
+            if path.endswith('.py'):
+                self.functions.update(self._functions_at(path, self._old_source(path), lines))
+        for path, lines in new_lines.items():
+            if path.endswith('.py') and os.path.exists(os.path.join(self.root, path)):
+                with open(os.path.join(self.root, path), 'r', encoding='utf-8') as f:
+                    self.functions.update(self._functions_at(path, f.read(), lines))
+
+    def _add_untracked(self, paths: List[str]):
+        for path in paths:
+            if path in self.ignore:
+                continue
+            self.files.add(path)
+            try:
+                with open(os.path.join(self.root, path), 'r', encoding='utf-8') as f:
+                    source = f.read()
+            except (OSError, UnicodeDecodeError):
+                continue
+            for line in source.splitlines():
+                self.literals.update(match.group(2) for match in _LITERAL_PATTERN.finditer(line))
+            if path.endswith('.py'):
+                self.functions.update(self._functions_at(path, source, set(range(1, source.count('\n') + 2))))
+
+    def _old_source(self, path: str) -> str:
+        try:
+            return self._git('show', f"{self.base}:{path}")
+        except subprocess.CalledProcessError:
+            return ''
+
+    @staticmethod
+    def _functions_at(path: str, source: str, lines: Set[int]) -> Set[str]:
+        try:
+            tree = ast.parse(source)
+        except SyntaxError:
+            return set()
+        functions = set()
+        for node in ast.walk(tree):
+            if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)):
+                start = min([node.lineno] + [decorator.lineno for decorator in node.decorator_list])
+                if any(start <= line <= node.end_lineno for line in lines):
+                    functions.add(f"{path}::{node.name}")
+        return functions
+
+
+def select_tests(nodeids: List[str], index: ImpactIndex, diff: DiffImpact, smoke: Set[str],
+                 run_all_patterns: List[str] = None) -> Dict[str, str]:
+    """
+    Select tests affected by a diff
+
+    Returns:
+        Dict[str, str]: Selected node id -> reason
+    """
+    run_all_patterns = DEFAULT_RUN_ALL_PATTERNS if run_all_patterns is None else run_all_patterns
+    global_changes = [path for path in diff.files
+                      if any(fnmatch.fnmatch(path, pattern) for pattern in run_all_patterns)]
+    if global_changes:
+        return {nodeid: f"global change {global_changes[0]}" for nodeid in nodeids}
+
+    literals = {literal for literal in diff.literals if len(literal) >= 3}
+    selected = {}
+    for nodeid in nodeids:
+        entry = index.tests.get(nodeid)
+        test_file = nodeid.split('::', 1)[0]
+        if nodeid in smoke:
+            selected[nodeid] = 'smoke'
+        elif entry is None:
+            selected[nodeid] = 'not in index'
+        elif test_file in diff.files:
+            selected[nodeid] = f"test file {test_file}"
+        elif diff.files.intersection(entry['files']):
+            selected[nodeid] = f"file {sorted(diff.files.intersection(entry['files']))[0]}"
+        elif diff.functions.intersection(entry['functions']):
+            selected[nodeid] = f"function {sorted(diff.functions.intersection(entry['functions']))[0]}"
+        else:
+            locator = _match_locator(entry['locators'], literals)
+            if locator:
+                selected[nodeid] = f"locator {locator}"
+    return selected
+
+
+def _match_locator(locators: List[str], literals: Set[str]) -> Optional[str]:
+    for locator in locators:
+        value = locator.split('=', 1)[-1]
+        for literal in literals:
+            if literal == value or (len(literal) >= 4 and literal in value):
+                return locator
+    return None
+
+
+class ImpactPlugin:
+    """pytest plugin recording per-test footprints and deselecting tests a diff does not affect"""
+
+    def __init__(self, config, record: bool, base: Optional[str]):
+        self.config = config
+        self.record = record
+        self.base = base
+        self.root = str(config.rootpath)
+        self.record_dir = get_config().get('TEST_IMPACT_RECORD_DIR', DEFAULT_RECORD_DIR)
+        self.traced_paths = [path for path in get_config().get('TEST_IMPACT_PATHS', ','.join(DEFAULT_TRACED_PATHS))
+                             .split(',') if path]
+        self.is_worker = hasattr(config, 'workerinput')
+
+    def pytest_sessionstart(self, session):
+        if self.record and not self.is_worker and os.path.isdir(self.record_dir):
+            for name in os.listdir(self.record_dir):
+                if name.startswith('records-') and name.endswith('.jsonl'):
+                    os.remove(os.path.join(self.record_dir, name))
+
+    def pytest_collection_modifyitems(self, session, config, items):
+        if not self.base:
+            return
+        index = ImpactIndex()
+        try:
+            diff = DiffImpact(self.base, self.root, ignore=[index.path])
+        except subprocess.CalledProcessError as e:
+            # Unknown base ref or a shallow clone without it, running everything is the safe choice
+            if not self.is_worker:
+                print(f"\nImpact selection against {self.base} skipped, running all tests: "
+                      f"{(e.stderr or '').strip() or e}")
+            return
+        smoke = {item.nodeid for item in items if item.get_closest_marker('smoke')}
+        selected = select_tests([item.nodeid for item in items], index, diff, smoke)
+        deselected = [item for item in items if item.nodeid not in selected]
+        if deselected:
+            config.hook.pytest_deselected(items=deselected)
+            items[:] = [item for item in items if item.nodeid in selected]
+        if not self.is_worker:
+            reasons = {}
+            for reason in selected.values():
+                kind = reason.split(' ', 1)[0]
+                reasons[kind] = reasons.get(kind, 0) + 1
+            summary = ', '.join(f"{count} {kind}" for kind, count in sorted(reasons.items()))
+            print(f"\nImpact selection against {self.base}: {len(items)}/{len(items) + len(deselected)} tests"
+                  f"{f' ({summary})' if summary else ''}")
+
+    def pytest_runtest_protocol(self, item, nextitem):
+        if not self.record:
+            return None
+        footprint = Footprint(self.root, self.traced_paths)
+        item.stash[_footprint_key] = footprint
+        footprint.start()
+        return None
+
+    def pytest_runtest_makereport(self, item, call):
+        if call.when != 'teardown' or not self.record:
+            return
+        footprint = item.stash.get(_footprint_key, None)
+        if footprint is None:
+            return
+        footprint.stop()
+        files = set()
+        feature = getattr(getattr(item.function, '__scenario__', None), 'feature', None)
+        feature_path = getattr(feature, 'abs_filename', None) or getattr(feature, 'filename', None)
+        if feature_path:
+            files.add(os.path.relpath(feature_path, self.root).replace(os.sep, '/'))
+        self._append({
+            'nodeid': item.nodeid,
+            'functions': sorted(footprint.functions),
+            'locators': sorted(footprint.locators),
+            'files': sorted(files),
+        })
+
+    def pytest_sessionfinish(self, session, exitstatus):
+        if not self.record or self.is_worker:
+            return
+        records = collect_records(self.record_dir)
+        if not records:
+            return
+        index = ImpactIndex()
+        updated = index.update(records)
+        index.save()
+        print(f"Impact index updated: {updated} tests, {len(index.tests)} total in {index.path}")
+
+    def _append(self, record: dict):
+        os.makedirs(self.record_dir, exist_ok=True)
+        path = os.path.join(self.record_dir, f"records-{get_worker_id()}.jsonl")
+        with open(path, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(record, ensure_ascii=False) + '\n')
+
+
+def collect_records(record_dir: str = None) -> List[dict]:
+    """Read footprints written by all workers"""
+    record_dir = record_dir or get_config().get('TEST_IMPACT_RECORD_DIR', DEFAULT_RECORD_DIR)
+    if not os.path.isdir(record_dir):
+        return []
+    records = []
+    for name in sorted(os.listdir(record_dir)):
+        if name.startswith('records-') and name.endswith('.jsonl'):
+            with open(os.path.join(record_dir, name), 'r', encoding='utf-8') as f:
+                records.extend(json.loads(line) for line in f if line.strip())
+    return records
+
+
+_footprint_key = pytest.StashKey[Footprint]()
@@ -1,5 +1,8 @@
 import logging
 
+_logger = None
+
+
 def setup_logging():
     logging.basicConfig(
         level=logging.INFO,
@@ -11,4 +14,17 @@ def setup_logging():
     )
     return logging.getLogger(__name__)
 
-logger = setup_logging()
\ No newline at end of file
+
+def get_logger():
+    """Configure logging on first use instead of opening the log file at import"""
+    global _logger
+    if _logger is None:
+        _logger = setup_logging()
+    return _logger
+
+
+def __getattr__(name):
+    # Keeps `from utils.logger import logger` working without the import side effect
+    if name == 'logger':
+        return get_logger()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,376 @@
+"""
+Multi-role scenarios: one driver per actor, actors run concurrently
+
+Example (customer places an order, courier accepts it):
+
+    @pytest.mark.roles(customer='android', courier=RoleSpec('android', {'appium:appPackage': 'com.gogox.driver'}))
+    @scenario('order.feature', 'Courier accepts a new order')
+    def test_courier_accepts_order():
+        pass
+
+    @when('the courier goes online while the customer places an order')
+    def step_go_online_and_order(roles):
+        roles.submit('courier', lambda courier: go_online(courier.common_actions))
+        order_id = roles.run('customer', lambda customer: place_order(customer.common_actions))
+        roles.signal('order_placed', order_id)
+
+    @then('the courier accepts the order')
+    def step_accept(roles):
+        roles.run('courier', lambda courier: accept_order(courier.common_actions, roles.wait_for('order_placed')))
+"""
+import json
+import os
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Union
+
+from utils.config import get_config
+
+try:
+    import fcntl
+except ImportError:  # Windows has no fcntl, leases fall back to exclusive lock file creation
+    fcntl = None
+
+
+DEFAULT_LEASE_DIR = os.path.join('reports', 'device_leases')
+
+
+class RoleSpec(NamedTuple):
+    platform: str
+    capabilities: Optional[dict] = None
+
+
+class DevicePool:
+    """
+    Devices multi-role tests lease, shared between xdist workers
+
+    The pool file (DEVICE_POOL_PATH) lists devices and the capabilities selecting them:
+        [{"name": "pixel-8", "platform": "android",
+          "capabilities": {"appium:udid": "emulator-5554", "appium:systemPort": 8201}},
+         {"name": "pixel-7", "platform": "android",
+          "capabilities": {"appium:udid": "emulator-5556", "appium:systemPort": 8202}}]
+
+    A lease is an exclusive flock on a per-device lock file, so a device serves one
+    session across all worker processes and is released even if a worker dies.
+    Without a pool file roles get the default options (BrowserStack assigns a device per session).
+    """
+
+    def __init__(self, devices: List[dict] = None, lease_dir: str = None):
+        self.devices = devices or []
+        self.lease_dir = lease_dir or get_config().get('DEVICE_LEASE_DIR', DEFAULT_LEASE_DIR)
+        self._leases: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_file(cls, path: str = None) -> 'DevicePool':
+        path = path or get_config().get('DEVICE_POOL_PATH')
+        if not path or not os.path.exists(path):
+            return cls()
+        with open(path, 'r', encoding='utf-8') as f:
+            return cls(json.load(f))
+
+    def try_acquire_all(self, platforms: Dict[str, str]) -> Optional[Dict[str, Optional[dict]]]:
+        """
+        Lease one device per role, all or nothing
+
+        Holding some devices while waiting for the rest would deadlock two workers
+        that each got one device, so partial leases are released again.
+
+        Returns:
+            Optional[Dict[str, Optional[dict]]]: role -> device (None without pool), None if not all are free
+        """
+        if not self.devices:
+            return {role: None for role in platforms}
+        leased = {}
+        for role, platform in platforms.items():
+            device = self._lease_free_device(platform, exclude=leased.values())
+            if device is None:
+                for device in leased.values():
+                    self.release(device)
+                return None
+            leased[role] = device
+        return leased
+
+    def acquire_all(self, platforms: Dict[str, str], timeout: float = 300,
+                    poll_interval: float = 2) -> Dict[str, Optional[dict]]:
+        """Wait until one device per role is free, raise TimeoutError otherwise"""
+        if self.devices:
+            for role, platform in platforms.items():
+                if not any(device.get('platform') == platform for device in self.devices):
+                    raise ValueError(f"Device pool has no {platform} device for role {role}")
+        end_time = time.monotonic() + timeout
+        while True:
+            leased = self.try_acquire_all(platforms)
+            if leased is not None:
+                return leased
+            if time.monotonic() + poll_interval > end_time:
+                raise TimeoutError(f"No free devices for roles {sorted(platforms)} after {timeout} seconds")
+            time.sleep(poll_interval)
+
+    def release(self, device: Optional[dict]):
+        if device is None:
+            return
+        with self._lock:
+            fd = self._leases.pop(device['name'], None)
+        if fd is None:
+            return
+        if fcntl:
+            fcntl.flock(fd, fcntl.LOCK_UN)
+            os.close(fd)
+        else:
+            os.close(fd)
+            os.remove(self._lease_path(device))
+
+    def _lease_free_device(self, platform: str, exclude) -> Optional[dict]:
+        from utils.circuit_breaker import get_circuit_breaker, get_device_key
+
+        breaker = get_circuit_breaker()
+        excluded = {device['name'] for device in exclude}
+        for device in self.devices:
+            if device.get('platform') != platform or device['name'] in excluded:
+                continue
+            device_key = get_device_key(device.get('capabilities', {}))
+            if device_key and breaker.is_open(device_key):
+                continue
+            if self._try_lease(device):
+                return device
+        return None
+
+    def _try_lease(self, device: dict) -> bool:
+        os.makedirs(self.lease_dir, exist_ok=True)
+        path = self._lease_path(device)
+        if fcntl:
+            fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                os.close(fd)
+                return False
+        else:
+            try:
+                fd = os.open(path, os.O_RDWR | os.O_CREAT | os.O_EXCL, 0o644)
+            except FileExistsError:
+                return False
+        with self._lock:
+            self._leases[device['name']] = fd
+        return True
+
+    def _lease_path(self, device: dict) -> str:
+        return os.path.join(self.lease_dir, f"{device['name']}.lock")
+
+
+class RoleSession:
+    """
+    Driver and CommonActions of one actor
+
+    Work submitted for a role runs on the role's own thread in submission order,
+    so steps of one actor never overlap while different actors run concurrently.
+    """
+
+    def __init__(self, name: str, spec: RoleSpec, device: Optional[dict] = None):
+        self.name = name
+        self.spec = spec
+        self.device = device
+        self.setup = None
+        self.driver = None
+        self.common_actions = None
+        self.busy_time = 0.0
+        self.futures: List[Future] = []
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix=f"role-{name}")
+
+    def start(self):
+        from setup import AppiumSetup
+        from pages.common.common_actions import CommonActions
+
+        capabilities = dict(self.spec.capabilities or {})
+        if self.device:
+            capabilities.update(self.device.get('capabilities', {}))
+        self.setup = AppiumSetup()
+        self.driver = self.setup.setUp(platform=self.spec.platform, capabilities=capabilities, role=self.name)
+        self.common_actions = CommonActions(self.driver, platform=self.setup.platform)
+        print(f"Role {self.name} started on {self.device['name'] if self.device else self.spec.platform}")
+
+    def stop(self):
+        # setUp may have created the driver before a later start step failed
+        if getattr(self.setup, 'driver', None) is not None:
+            try:
+                self.setup.tearDown()
+            except Exception as e:
+                print(f"Unable to stop role {self.name}: {str(e)}")
+        self.executor.shutdown(wait=False)
+
+
+class MultiRoleSession:
+    """
+    Coordinate several actors, each with its own driver, in one scenario
+
+    Independent work of different roles runs concurrently, so the scenario takes
+    about as long as its longest single actor path. Roles synchronize through
+    named barriers and events; a failure of one role breaks all barriers and
+    waits, so the other roles fail fast instead of waiting for their timeout.
+    """
+
+    def __init__(self, roles: Dict[str, Union[str, RoleSpec]], pool: DevicePool = None,
+                 lease_timeout: float = 300):
+        """
+        Args:
+            roles: Role name -> platform or RoleSpec
+            pool: Device pool roles lease devices from, DEVICE_POOL_PATH if not specified
+            lease_timeout: Maximum waiting time for free devices (seconds)
+        """
+        self.specs = {name: spec if isinstance(spec, RoleSpec) else RoleSpec(spec) for name, spec in roles.items()}
+        self.pool = pool if pool is not None else DevicePool.from_file()
+        self.lease_timeout = lease_timeout
+        self.roles: Dict[str, RoleSession] = {}
+        self._barriers: Dict[str, threading.Barrier] = {}
+        self._events: Dict[str, threading.Event] = {}
+        self._values: Dict[str, Any] = {}
+        self._errors: List[BaseException] = []
+        self._lock = threading.Lock()
+        self._started_at = None
+
+    def __getitem__(self, name: str) -> RoleSession:
+        return self.roles[name]
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def start(self):
+        """Lease devices and start all drivers concurrently"""
+        devices = self.pool.acquire_all({name: spec.platform for name, spec in self.specs.items()},
+                                        timeout=self.lease_timeout)
+        self.roles = {name: RoleSession(name, spec, devices[name]) for name, spec in self.specs.items()}
+        self._started_at = time.perf_counter()
+        futures = [role.executor.submit(role.start) for role in self.roles.values()]
+        wait(futures)
+        errors = [future.exception() for future in futures if future.exception()]
+        if errors:
+            self.close()
+            raise errors[0]
+
+    def submit(self, role: str, action: Callable[..., Any], *args, **kwargs) -> Future:
+        """
+        Queue an action on the role's thread without waiting for it
+
+        Args:
+            role: Role name
+            action: Called with the RoleSession followed by args and kwargs
+
+        Returns:
+            Future: Result of the action
+        """
+        role_session = self.roles[role]
+
+        def run():
+            started = time.perf_counter()
+            try:
+                return action(role_session, *args, **kwargs)
+            except BaseException as e:
+                self._fail(e)
+                raise
+            finally:
+                role_session.busy_time += time.perf_counter() - started
+
+        future = role_session.executor.submit(run)
+        role_session.futures.append(future)
+        return future
+
+    def run(self, role: str, action: Callable[..., Any], *args, **kwargs) -> Any:
+        """Run an action on the role's thread, after the work already queued for it"""
+        return self.submit(role, action, *args, **kwargs).result()
+
+    def parallel(self, **actions: Callable[..., Any]) -> Dict[str, Any]:
+        """
+        Run one action per role concurrently and wait for all of them
+
+        Ex.
+        roles.parallel(customer=open_order_form, courier=go_online)
+        """
+        futures = {role: self.submit(role, action) for role, action in actions.items()}
+        wait(futures.values())
+        for future in futures.values():
+            if future.exception():
+                raise future.exception()
+        return {role: future.result() for role, future in futures.items()}
+
+    def join(self, *roles: str, timeout: float = None):
+        """Wait for all queued work of the roles (all roles if none specified), re-raise the first failure"""
+        futures = [future for name in (roles or self.roles) for future in self.roles[name].futures]
+        done, not_done = wait(futures, timeout=timeout)
+        if not_done:
+            raise TimeoutError(f"Roles {sorted(roles or self.roles)} still busy after {timeout} seconds")
+        for future in futures:
+            if future.exception():
+                raise future.exception()
+
+    def barrier(self, name: str, parties: int = None) -> threading.Barrier:
+        """
+        Named barrier, parties defaults to the number of roles
+
+        Ex. (inside actions of both roles)
+        roles.barrier('both_online').wait(timeout=60)
+        """
+        with self._lock:
+            if name not in self._barriers:
+                self._barriers[name] = threading.Barrier(parties or len(self.specs))
+                if self._errors:
+                    self._barriers[name].abort()
+            return self._barriers[name]
+
+    def signal(self, name: str, value: Any = None):
+        """Set a named event, optionally passing a value (e.g. an order id) to waiting roles"""
+        with self._lock:
+            self._values[name] = value
+            event = self._events.setdefault(name, threading.Event())
+        event.set()
+
+    def wait_for(self, name: str, timeout: float = 60, poll_interval: float = 0.2) -> Any:
+        """
+        Wait until a named event is signalled
+
+        Returns:
+            Any: Value passed to signal
+
+        Raises:
+            TimeoutError: Event was not signalled in time
+            RuntimeError: Another role failed while waiting
+        """
+        with self._lock:
+            event = self._events.setdefault(name, threading.Event())
+        end_time = time.monotonic() + timeout
+        while not event.wait(poll_interval):
+            if self._errors:
+                raise RuntimeError(f"Stop waiting for {name}, another role failed: {self._errors[0]}")
+            if time.monotonic() > end_time:
+                raise TimeoutError(f"Event {name} was not signalled within {timeout} seconds")
+        return self._values.get(name)
+
+    def close(self):
+        """Stop all drivers concurrently and release the leased devices"""
+        for role in self.roles.values():
+            for future in role.futures:
+                future.cancel()
+        threads = [threading.Thread(target=role.stop, name=f"stop-{role.name}") for role in self.roles.values()]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        for role in self.roles.values():
+            self.pool.release(role.device)
+        if self._started_at is not None and self.roles:
+            busy = ', '.join(f"{role.name} {role.busy_time:.1f}s" for role in self.roles.values())
+            print(f"Role busy time: {busy}, wall {time.perf_counter() - self._started_at:.1f}s")
+        self.roles = {}
+
+    def _fail(self, error: BaseException):
+        """Break barriers so other roles do not wait for a role that already failed"""
+        with self._lock:
+            self._errors.append(error)
+            barriers = list(self._barriers.values())
+        for barrier in barriers:
+            barrier.abort()
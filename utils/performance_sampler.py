@@ -0,0 +1,378 @@
+import base64
+import json
+import os
+import re
+import threading
+import time
+from array import array
+from typing import Dict, List, Optional
+
+from utils.config import get_config
+from utils.driver_hooks import background_commands
+from utils.session_registry import get_current_nodeid, get_worker_id
+
+
+DEFAULT_PERFORMANCE_DIR = os.path.join('reports', 'performance')
+NO_STEP = '<no step>'
+
+_GFX_PATTERNS = {
+    'frames_total': re.compile(r'Total frames rendered:\s*(\d+)'),
+    'frames_janky': re.compile(r'Janky frames:\s*(\d+)'),
+    'frame_p50_ms': re.compile(r'50th percentile:\s*(\d+)ms'),
+    'frame_p95_ms': re.compile(r'95th percentile:\s*(\d+)ms'),
+}
+
+
+class MetricSeries:
+    """Compact time series backed by two float arrays"""
+
+    __slots__ = ('timestamps', 'values')
+
+    def __init__(self):
+        self.timestamps = array('d')
+        self.values = array('d')
+
+    def append(self, timestamp: float, value: float):
+        self.timestamps.append(timestamp)
+        self.values.append(value)
+
+    def __len__(self):
+        return len(self.values)
+
+    def summary(self) -> dict:
+        import numpy as np
+
+        values = np.frombuffer(self.values, dtype=np.float64)
+        return {
+            'count': int(values.size),
+            'p50': round(float(np.percentile(values, 50)), 3),
+            'p95': round(float(np.percentile(values, 95)), 3),
+            'max': round(float(values.max()), 3),
+        }
+
+
+def _parse_table(data) -> Dict[str, float]:
+    """Parse getPerformanceData result ([headers, values]) to header -> float"""
+    if not data or len(data) < 2:
+        return {}
+    parsed = {}
+    for header, value in zip(data[0], data[1]):
+        try:
+            parsed[header] = float(value)
+        except (TypeError, ValueError):
+            continue
+    return parsed
+
+
+class PerformanceSampler:
+    """
+    Sample device performance on a background thread during a session
+
+    Android: CPU and memory through get_performance_data, frame stats through
+    `dumpsys gfxinfo` (needs the server started with --relaxed-security or
+    --allow-insecure adb_shell). Samples are stored per BDD step.
+
+    iOS: XCUITest has no live counters, an Activity Monitor trace is recorded
+    with mobile: startPerfRecord for the whole session and saved next to the
+    summaries (also needs relaxed security).
+
+    Example:
+    sampler = PerformanceSampler(driver, platform='android', interval=1.0)
+    sampler.start()
+    sampler.set_step("I place an order")
+    ...
+    sampler.stop()
+    sampler.export()
+    """
+
+    def __init__(self, driver, platform: str, interval: float = 1.0, package_name: str = None,
+                 data_types: List[str] = None, frame_stats: bool = True, output_dir: str = None,
+                 role: str = None):
+        """
+        Args:
+            driver: WebDriver instance
+            platform: android or ios
+            interval: Sampling interval (seconds)
+            package_name: Android package, current package if not specified
+            data_types: getPerformanceData types, default is cpuinfo and memoryinfo
+            frame_stats: Whether to sample dumpsys gfxinfo on Android
+            output_dir: Directory summaries and traces are written to
+            role: Actor of the session in multi-role tests, keeps the summaries of several roles apart
+        """
+        self.driver = driver
+        self.platform = platform
+        self.interval = interval
+        self.package_name = package_name
+        self.data_types = data_types or ['cpuinfo', 'memoryinfo']
+        self.frame_stats = frame_stats
+        self.output_dir = output_dir or get_config().get('PERF_OUTPUT_DIR', DEFAULT_PERFORMANCE_DIR)
+        self.nodeid = get_current_nodeid() or 'unknown'
+        self.role = role
+
+        self.series: Dict[str, Dict[str, MetricSeries]] = {}
+        self.current_step = NO_STEP
+        self._last_frames = None
+        self._lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._ios_recording = False
+
+    def start(self):
+        if self.platform == 'android':
+            if self.package_name is None:
+                self.package_name = self.driver.current_package
+            self._thread = threading.Thread(target=self._run, name='performance-sampler', daemon=True)
+            self._thread.start()
+        elif self.platform == 'ios':
+            self._start_ios_recording()
+
+    def stop(self):
+        self._stop_event.set()
+        if self._thread:
+            self._thread.join(timeout=self.interval + 5)
+        if self._ios_recording:
+            self._stop_ios_recording()
+
+    def set_step(self, step_name: str):
+        """Attribute following samples to a BDD step"""
+        with self._lock:
+            self.current_step = step_name or NO_STEP
+
+    def record(self, metric: str, value: float, timestamp: float = None):
+        with self._lock:
+            step_series = self.series.setdefault(self.current_step, {})
+            step_series.setdefault(metric, MetricSeries()).append(timestamp or time.time(), value)
+
+    def sample(self):
+        """Take one sample of every metric"""
+        now = time.time()
+        for data_type in list(self.data_types):
+            try:
+                values = _parse_table(self.driver.get_performance_data(self.package_name, data_type))
+            except Exception as e:
+                print(f"Disable {data_type} sampling: {str(e)}")
+                self.data_types.remove(data_type)
+                continue
+            if data_type == 'cpuinfo':
+                user, kernel = values.get('user', 0.0), values.get('kernel', 0.0)
+                self.record('cpu_user', user, now)
+                self.record('cpu_kernel', kernel, now)
+                self.record('cpu_total', user + kernel, now)
+            elif data_type == 'memoryinfo':
+                for header, metric in (('totalPss', 'memory_total_pss_kb'),
+                                       ('totalPrivateDirty', 'memory_private_dirty_kb'),
+                                       ('nativeHeapAllocatedSize', 'memory_native_heap_kb')):
+                    if header in values:
+                        self.record(metric, values[header], now)
+            else:
+                for header, value in values.items():
+                    self.record(f"{data_type}_{header}", value, now)
+
+        if self.frame_stats:
+            self._sample_frame_stats(now)
+
+    def _sample_frame_stats(self, now: float):
+        try:
+            output = self.driver.execute_script(
+                'mobile: shell', {'command': 'dumpsys', 'args': ['gfxinfo', self.package_name]})
+        except Exception as e:
+            print(f"Disable frame stats sampling: {str(e)}")
+            self.frame_stats = False
+            return
+
+        stats = {}
+        for name, pattern in _GFX_PATTERNS.items():
+            match = pattern.search(output or '')
+            if match:
+                stats[name] = float(match.group(1))
+        for name in ('frame_p50_ms', 'frame_p95_ms'):
+            if name in stats:
+                self.record(name, stats[name], now)
+
+        # Counters are cumulative, derive FPS and jank ratio from the delta to the previous sample
+        if 'frames_total' in stats:
+            if self._last_frames is not None:
+                last_time, last_total, last_janky = self._last_frames
+                frames = stats['frames_total'] - last_total
+                if frames >= 0 and now > last_time:
+                    self.record('fps', frames / (now - last_time), now)
+                    if frames > 0:
+                        janky = stats.get('frames_janky', 0.0) - last_janky
+                        self.record('janky_ratio', max(janky, 0.0) / frames, now)
+            self._last_frames = (now, stats['frames_total'], stats.get('frames_janky', 0.0))
+
+    def _run(self):
+        # Sampling commands share the test driver, keep them out of step command counts
+        with background_commands():
+            while not self._stop_event.is_set():
+                started = time.monotonic()
+                try:
+                    self.sample()
+                except Exception as e:
+                    print(f"Performance sampling error: {str(e)}")
+                if not self.data_types and not self.frame_stats:
+                    return
+                self._stop_event.wait(max(0.0, self.interval - (time.monotonic() - started)))
+
+    def _start_ios_recording(self):
+        try:
+            self.driver.execute_script('mobile: startPerfRecord', {
+                'profileName': get_config().get('PERF_IOS_PROFILE', 'Activity Monitor'),
+                'pid': 'current',
+                'timeout': 10 * 60 * 1000,
+            })
+            self._ios_recording = True
+        except Exception as e:
+            print(f"iOS performance recording not available: {str(e)}")
+
+    def _stop_ios_recording(self):
+        self._ios_recording = False
+        try:
+            trace = self.driver.execute_script('mobile: stopPerfRecord', {
+                'profileName': get_config().get('PERF_IOS_PROFILE', 'Activity Monitor'),
+            })
+        except Exception as e:
+            print(f"Unable to stop iOS performance recording: {str(e)}")
+            return
+        if trace:
+            os.makedirs(self.output_dir, exist_ok=True)
+            path = os.path.join(self.output_dir, f"{_safe_name(baseline_key(self.summary_key()))}.trace.zip")
+            with open(path, 'wb') as f:
+                f.write(base64.b64decode(trace))
+
+    def summary_key(self) -> dict:
+        return {'nodeid': self.nodeid, 'role': self.role}
+
+    def summary(self) -> dict:
+        """Per step and overall p50/p95/max of every metric"""
+        with self._lock:
+            steps = {step: {metric: series.summary() for metric, series in metrics.items() if len(series)}
+                     for step, metrics in self.series.items()}
+            overall = {}
+            for metrics in self.series.values():
+                for metric, series in metrics.items():
+                    merged = overall.setdefault(metric, MetricSeries())
+                    merged.timestamps.extend(series.timestamps)
+                    merged.values.extend(series.values)
+        return {
+            'nodeid': self.nodeid,
+            'role': self.role,
+            'platform': self.platform,
+            'worker': get_worker_id(),
+            'steps': steps,
+            'overall': {metric: series.summary() for metric, series in overall.items() if len(series)},
+        }
+
+    def export(self):
+        """Append scenario summary to this worker's summary file"""
+        summary = self.summary()
+        if not summary['overall']:
+            return
+        os.makedirs(self.output_dir, exist_ok=True)
+        path = os.path.join(self.output_dir, f"summary-{get_worker_id()}.jsonl")
+        with open(path, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(summary, ensure_ascii=False) + '\n')
+
+
+def baseline_key(summary: dict) -> str:
+    """Baseline key of a scenario summary, the role is appended for multi-role sessions"""
+    if summary.get('role'):
+        return f"{summary['nodeid']}[{summary['role']}]"
+    return summary['nodeid']
+
+
+def _safe_name(value: str) -> str:
+    return re.sub(r'[^A-Za-z0-9_.-]+', '_', value)[:150]
+
+
+_active_samplers: List[PerformanceSampler] = []
+
+
+def register_sampler(sampler: PerformanceSampler):
+    _active_samplers.append(sampler)
+
+
+def unregister_sampler(sampler: PerformanceSampler):
+    if sampler in _active_samplers:
+        _active_samplers.remove(sampler)
+
+
+def set_current_step(step_name: str):
+    """Tag samples of all active samplers in this process with a BDD step"""
+    for sampler in _active_samplers:
+        sampler.set_step(step_name)
+
+
+def reset_summaries(output_dir: str = None):
+    """Remove scenario summaries of a previous run, call once from the controller process"""
+    output_dir = output_dir or get_config().get('PERF_OUTPUT_DIR', DEFAULT_PERFORMANCE_DIR)
+    if not os.path.isdir(output_dir):
+        return
+    for name in os.listdir(output_dir):
+        if name.startswith('summary-') and name.endswith('.jsonl'):
+            os.remove(os.path.join(output_dir, name))
+
+
+def collect_summaries(output_dir: str = None) -> List[dict]:
+    """Read scenario summaries written by all workers"""
+    output_dir = output_dir or get_config().get('PERF_OUTPUT_DIR', DEFAULT_PERFORMANCE_DIR)
+    if not os.path.isdir(output_dir):
+        return []
+    summaries = []
+    for name in sorted(os.listdir(output_dir)):
+        if name.startswith('summary-') and name.endswith('.jsonl'):
+            with open(os.path.join(output_dir, name), 'r', encoding='utf-8') as f:
+                summaries.extend(json.loads(line) for line in f if line.strip())
+    return summaries
+
+
+def compare_to_baseline(summaries: List[dict], baseline: Dict[str, dict], tolerance: float = 0.2) -> List[dict]:
+    """
+    Compare scenario p95 values against a baseline
+
+    Args:
+        summaries: Scenario summaries of this run
+        baseline: baseline_key -> overall metrics, as written by write_baseline
+        tolerance: Allowed relative increase of p95 (0.2 = 20%)
+
+    Returns:
+        List[dict]: Regressions with nodeid, metric, baseline and current p95
+    """
+    regressions = []
+    for summary in summaries:
+        baseline_metrics = baseline.get(baseline_key(summary), {})
+        for metric, current in summary['overall'].items():
+            previous = baseline_metrics.get(metric)
+            if not previous:
+                continue
+            # Higher is better for FPS, worse for everything else
+            if metric == 'fps':
+                regressed = current['p50'] < previous['p50'] * (1 - tolerance)
+                key = 'p50'
+            else:
+                regressed = current['p95'] > previous['p95'] * (1 + tolerance)
+                key = 'p95'
+            if regressed:
+                regressions.append({
+                    'nodeid': baseline_key(summary),
+                    'metric': metric,
+                    'stat': key,
+                    'baseline': previous[key],
+                    'current': current[key],
+                })
+    return regressions
+
+
+def load_baseline(path: str) -> Dict[str, dict]:
+    if not os.path.exists(path):
+        return {}
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def write_baseline(path: str, summaries: List[dict]):
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump({baseline_key(summary): summary['overall'] for summary in summaries}, f, indent=2, sort_keys=True)
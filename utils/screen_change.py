@@ -0,0 +1,158 @@
+import time
+from io import BytesIO
+from typing import NamedTuple, Optional
+
+import numpy as np
+from PIL import Image
+
+
+class Frame(NamedTuple):
+    """Downscaled grayscale screen frame"""
+    pixels: np.ndarray
+    hash: int
+    captured_at: float
+
+
+class ScreenChangeDetector:
+    """
+    Detect visual screen changes from downscaled screenshots
+
+    Comparing page_source misses visual-only changes (Flutter canvases, lists
+    reusing nodes) and is slow on large trees. Frames are compared with a
+    difference hash (dHash) plus a block difference score computed with NumPy.
+
+    Example:
+    detector = ScreenChangeDetector(driver)
+    before = detector.capture()
+    common_actions.swipe(...)
+    detector.wait_until_stable(stable_ms=300)
+    if not detector.has_changed(before):
+        print("Reached end of list")
+    """
+
+    def __init__(self, driver, width: int = 120, grid: int = 16, hash_threshold: int = 3,
+                 block_threshold: float = 0.04, changed_blocks_ratio: float = 0.02, mjpeg_url: str = None):
+        """
+        Args:
+            driver: WebDriver instance
+            width: Approximate width frames are downscaled to (pixels)
+            grid: Frames are split into grid x grid blocks for the block difference score
+            hash_threshold: Hamming distance of dHash from which frames count as changed
+            block_threshold: Mean absolute difference (0.0 ~ 1.0) from which a block counts as changed
+            changed_blocks_ratio: Ratio of changed blocks from which frames count as changed
+            mjpeg_url: MJPEG stream URL (appium:mjpegServerPort), frames are read from it instead of screenshots
+        """
+        self.driver = driver
+        self.width = width
+        self.grid = grid
+        self.hash_threshold = hash_threshold
+        self.block_threshold = block_threshold
+        self.changed_blocks_ratio = changed_blocks_ratio
+        self.mjpeg_url = mjpeg_url
+        self.last_frame: Optional[Frame] = None
+
+    def capture(self) -> Frame:
+        """Capture a new downscaled frame"""
+        data = self._read_mjpeg_frame() if self.mjpeg_url else self.driver.get_screenshot_as_png()
+        image = Image.open(BytesIO(data))
+        image.draft('L', (self.width, self.width * 4))  # Cheap downscale while decoding JPEG frames
+        image = image.convert('L')
+        factor = max(1, image.width // self.width)
+        if factor > 1:
+            image = image.reduce(factor)
+        pixels = np.asarray(image, dtype=np.float32) / 255.0
+        self.last_frame = Frame(pixels, self._dhash(pixels), time.monotonic())
+        return self.last_frame
+
+    def latest(self, max_age_ms: int = 100) -> Frame:
+        """Return the last captured frame if it is recent enough, otherwise capture a new one"""
+        if self.last_frame and (time.monotonic() - self.last_frame.captured_at) * 1000 <= max_age_ms:
+            return self.last_frame
+        return self.capture()
+
+    def difference(self, before: Frame, after: Frame) -> float:
+        """
+        Block difference score between two frames
+
+        Returns:
+            float: Ratio of changed blocks (0.0 ~ 1.0), 1.0 if frame sizes differ (e.g. rotation)
+        """
+        if before.pixels.shape != after.pixels.shape:
+            return 1.0
+        height, width = before.pixels.shape
+        block_h, block_w = max(1, height // self.grid), max(1, width // self.grid)
+        rows, cols = height // block_h, width // block_w
+
+        def block_means(pixels: np.ndarray) -> np.ndarray:
+            cropped = pixels[:rows * block_h, :cols * block_w]
+            return cropped.reshape(rows, block_h, cols, block_w).mean(axis=(1, 3))
+
+        delta = np.abs(block_means(before.pixels) - block_means(after.pixels))
+        return float(np.count_nonzero(delta > self.block_threshold)) / delta.size
+
+    def has_changed(self, before: Frame, after: Frame = None) -> bool:
+        """
+        Check if the screen changed since a frame
+
+        Args:
+            before: Reference frame
+            after: Frame to compare, captures a new one if not specified
+        """
+        if after is None:
+            after = self.capture()
+        if bin(before.hash ^ after.hash).count('1') >= self.hash_threshold:
+            return True
+        return self.difference(before, after) >= self.changed_blocks_ratio
+
+    def wait_until_stable(self, stable_ms: int = 300, timeout: float = 5, poll_interval: float = 0.05) -> bool:
+        """
+        Wait until the screen has not changed for stable_ms (animations settled, scroll stopped)
+
+        Args:
+            stable_ms: Time the screen must stay unchanged (milliseconds)
+            timeout: Maximum waiting time (seconds)
+            poll_interval: Waiting time between captures (seconds)
+
+        Returns:
+            bool: If screen became stable within timeout, return True, otherwise return False
+        """
+        end_time = time.monotonic() + timeout
+        reference = self.capture()
+        stable_since = reference.captured_at
+        while True:
+            if (time.monotonic() - stable_since) * 1000 >= stable_ms:
+                return True
+            if time.monotonic() >= end_time:
+                return False
+            time.sleep(poll_interval)
+            frame = self.capture()
+            if self.has_changed(reference, frame):
+                reference = frame
+                stable_since = frame.captured_at
+
+    @staticmethod
+    def _dhash(pixels: np.ndarray, size: int = 8) -> int:
+        """Difference hash: compare neighbouring cells of a size x (size+1) area-averaged thumbnail"""
+        height, width = pixels.shape
+        row_edges = np.linspace(0, height, size + 1).astype(int)
+        col_edges = np.linspace(0, width, size + 2).astype(int)
+        sums = np.add.reduceat(np.add.reduceat(pixels, row_edges[:-1], axis=0), col_edges[:-1], axis=1)
+        thumbnail = sums / np.outer(np.diff(row_edges), np.diff(col_edges))
+        bits = (thumbnail[:, 1:] > thumbnail[:, :-1]).flatten()
+        return int(sum(1 << i for i, bit in enumerate(bits) if bit))
+
+    def _read_mjpeg_frame(self, chunk_size: int = 16384, max_bytes: int = 8 * 1024 * 1024) -> bytes:
+        """Read one JPEG frame from the MJPEG stream"""
+        import requests
+
+        buffer = b''
+        with requests.get(self.mjpeg_url, stream=True, timeout=5) as response:
+            for chunk in response.iter_content(chunk_size):
+                buffer += chunk
+                start = buffer.find(b'\xff\xd8')
+                end = buffer.find(b'\xff\xd9', start + 2) if start != -1 else -1
+                if start != -1 and end != -1:
+                    return buffer[start:end + 2]
+                if len(buffer) > max_bytes:
+                    break
+        raise RuntimeError(f"No MJPEG frame received from {self.mjpeg_url}")
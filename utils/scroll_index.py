@@ -0,0 +1,135 @@
+import json
+import os
+import tempfile
+import time
+from typing import Dict, List, Optional
+
+from utils.config import get_config
+
+try:
+    import fcntl
+except ImportError:  # Windows has no fcntl, saves are then only atomic, not serialized
+    fcntl = None
+
+
+DEFAULT_SCROLL_INDEX_PATH = os.path.join('reports', 'scroll_index.json')
+
+Swipe = List[int]  # [start_x, start_y, end_x, end_y]
+
+
+def make_scroll_key(screen: str, resolution: str, direction: str, locator_type: str, locator_value: str) -> str:
+    """Build index key: screen fingerprint + device resolution + scroll direction + target locator"""
+    return f"{screen}|{resolution}|{direction}|{locator_type}={locator_value}"
+
+
+class ScrollIndex:
+    """
+    Persistent index of swipes that reached a target element
+
+    Scroll helpers look up the swipes that found a locator on a screen last
+    time and replay them back to back (no element lookup or page_source
+    capture between swipes). On a miss they fall back to incremental search
+    and the entry is re-learned.
+
+    The index is shared between xdist workers through one JSON file, saves
+    merge with what is on disk so entries learned by other workers are kept.
+    """
+
+    def __init__(self, path: str = None, max_misses: int = 2):
+        """
+        Args:
+            path: JSON file the index is persisted to
+            max_misses: Consecutive replay misses after which an entry is dropped
+        """
+        self.path = path or get_config().get('SCROLL_INDEX_PATH', DEFAULT_SCROLL_INDEX_PATH)
+        self.max_misses = max_misses
+        self.entries: Dict[str, dict] = self._load()
+        self.stats = {'hits': 0, 'misses': 0, 'learned': 0}
+
+    def lookup(self, key: str) -> Optional[List[Swipe]]:
+        """Get swipes that reached the target last time, None if unknown"""
+        entry = self.entries.get(key)
+        return entry['swipes'] if entry else None
+
+    def record_hit(self, key: str):
+        self.stats['hits'] += 1
+        entry = self.entries.get(key)
+        if entry:
+            entry['hits'] = entry.get('hits', 0) + 1
+            entry['misses'] = 0
+            self.save({key: entry})
+
+    def record_miss(self, key: str):
+        self.stats['misses'] += 1
+        entry = self.entries.get(key)
+        if not entry:
+            return
+        entry['misses'] = entry.get('misses', 0) + 1
+        if entry['misses'] >= self.max_misses:
+            self.forget(key)
+        else:
+            self.save({key: entry})
+
+    def learn(self, key: str, swipes: List[Swipe]):
+        """Store swipes that reached the target"""
+        self.stats['learned'] += 1
+        entry = {
+            'swipes': [list(map(int, swipe)) for swipe in swipes],
+            'hits': 0,
+            'misses': 0,
+            'updated_at': round(time.time(), 3),
+        }
+        self.entries[key] = entry
+        self.save({key: entry})
+
+    def forget(self, key: str):
+        self.entries.pop(key, None)
+        self.save({key: None})
+
+    def save(self, changes: Dict[str, Optional[dict]]):
+        """Merge changed entries (None removes the entry) into the file on disk"""
+        directory = os.path.dirname(self.path) or '.'
+        os.makedirs(directory, exist_ok=True)
+        lock_fd = os.open(self.path + '.lock', os.O_WRONLY | os.O_CREAT, 0o644)
+        try:
+            if fcntl:
+                fcntl.flock(lock_fd, fcntl.LOCK_EX)
+            entries = self._load()
+            for key, entry in changes.items():
+                if entry is None:
+                    entries.pop(key, None)
+                else:
+                    entries[key] = entry
+            fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump(entries, f, ensure_ascii=False, separators=(',', ':'), sort_keys=True)
+            os.replace(tmp_path, self.path)
+            # Keep entries learned by other workers in memory as well
+            self.entries.update({key: value for key, value in entries.items() if key not in changes})
+        except OSError as e:
+            print(f"Unable to save scroll index: {str(e)}")
+        finally:
+            if fcntl:
+                fcntl.flock(lock_fd, fcntl.LOCK_UN)
+            os.close(lock_fd)
+
+    def _load(self) -> Dict[str, dict]:
+        if not os.path.exists(self.path):
+            return {}
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            print(f"Scroll index {self.path} is unreadable, starting empty")
+            return {}
+
+
+_scroll_index: Optional[ScrollIndex] = None
+
+
+def get_scroll_index() -> Optional[ScrollIndex]:
+    """Get the process-wide scroll index, None if SCROLL_INDEX_PATH is not configured"""
+    global _scroll_index
+    if _scroll_index is None and get_config().get('SCROLL_INDEX_PATH'):
+        _scroll_index = ScrollIndex()
+    return _scroll_index
@@ -0,0 +1,321 @@
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional
+
+from utils.config import get_config
+
+try:
+    import fcntl
+except ImportError:  # Windows has no fcntl, O_APPEND alone is used there
+    fcntl = None
+
+
+DEFAULT_REGISTRY_PATH = os.path.join('reports', 'sessions.jsonl')
+DEFAULT_BROWSERSTACK_API_URL = 'https://api-cloud.browserstack.com/app-automate'
+
+# Worst outcome wins when a test reports several phases (setup/call/teardown)
+_OUTCOME_PRIORITY = {'passed': 0, 'skipped': 1, 'failed': 2}
+
+
+def get_worker_id() -> str:
+    """Get xdist worker id, 'master' when running without xdist"""
+    return os.getenv('PYTEST_XDIST_WORKER', 'master')
+
+
+def get_current_nodeid() -> Optional[str]:
+    """Get node id of the running test from PYTEST_CURRENT_TEST"""
+    current = os.getenv('PYTEST_CURRENT_TEST')
+    if not current:
+        return None
+    # Value looks like "tests/steps/test_x.py::test_y (call)"
+    return current.rsplit(' ', 1)[0]
+
+
+def get_device_name(driver) -> str:
+    """Get a readable device name from driver capabilities"""
+    caps = getattr(driver, 'capabilities', None) or {}
+    for key in ('deviceName', 'appium:deviceName', 'udid', 'appium:udid'):
+        if caps.get(key):
+            return str(caps[key])
+    return 'unknown'
+
+
+class SessionRegistry:
+    """
+    Append-only registry of Appium sessions, one JSON line per test
+
+    Every xdist worker appends to the same file. Each record is written with
+    a single O_APPEND write (plus an advisory lock where available), so
+    records from concurrent workers never interleave or overwrite each other.
+    """
+
+    def __init__(self, path: str = None):
+        self.path = path or get_config().get('SESSION_REGISTRY_PATH', DEFAULT_REGISTRY_PATH)
+        # nodeid -> session_id -> record, multi-role tests run several sessions
+        self._pending: Dict[str, Dict[str, dict]] = {}
+        self._lock = threading.Lock()
+
+    def reset(self):
+        """Remove records of a previous run, call once from the controller process"""
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+    def begin(self, session_id: str, device: str = 'unknown', nodeid: str = None, role: str = None):
+        """
+        Start tracking a session for the running test
+
+        Args:
+            session_id: Appium / BrowserStack session id
+            device: Device name the session runs on
+            nodeid: Test node id, detected from PYTEST_CURRENT_TEST if not specified
+            role: Actor the session belongs to in multi-role tests
+        """
+        nodeid = nodeid or get_current_nodeid() or 'unknown'
+        record = {
+            'session_id': session_id,
+            'nodeid': nodeid,
+            'worker': get_worker_id(),
+            'device': device,
+            'started_at': round(time.time(), 3),
+            'finished_at': None,
+            'outcome': 'passed',
+        }
+        if role:
+            record['role'] = role
+        with self._lock:
+            self._pending.setdefault(nodeid, {})[session_id] = record
+
+    def record_outcome(self, nodeid: str, outcome: str):
+        """Merge a phase outcome (passed/failed/skipped) into the pending record"""
+        with self._lock:
+            for record in self._pending.get(nodeid, {}).values():
+                if _OUTCOME_PRIORITY.get(outcome, 0) > _OUTCOME_PRIORITY.get(record['outcome'], 0):
+                    record['outcome'] = outcome
+
+    def has_failed(self, nodeid: str) -> bool:
+        """Whether a phase of a running test already failed"""
+        with self._lock:
+            return any(record['outcome'] == 'failed' for record in self._pending.get(nodeid, {}).values())
+
+    def finish(self, nodeid: str, outcome: str = None):
+        """Write the record of a finished test, no-op for tests without a session"""
+        if outcome:
+            self.record_outcome(nodeid, outcome)
+        with self._lock:
+            records = self._pending.pop(nodeid, {})
+        for record in records.values():
+            record['finished_at'] = round(time.time(), 3)
+            self._append(record)
+
+    def flush_pending(self, outcome: str = 'unknown'):
+        """Write records of tests that never reached teardown (e.g. interrupted run)"""
+        with self._lock:
+            nodeids = list(self._pending)
+        for nodeid in nodeids:
+            with self._lock:
+                for record in self._pending.get(nodeid, {}).values():
+                    record['outcome'] = outcome
+            self.finish(nodeid)
+
+    def records(self) -> List[dict]:
+        """Read all records written so far"""
+        if not os.path.exists(self.path):
+            return []
+        records = []
+        with open(self.path, 'r', encoding='utf-8') as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    records.append(json.loads(line))
+                except ValueError:
+                    print(f"Skip broken session registry line: {line[:80]}")
+        return records
+
+    def _append(self, record: dict):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        data = (json.dumps(record, ensure_ascii=False) + '\n').encode('utf-8')
+        fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        try:
+            if fcntl:
+                fcntl.flock(fd, fcntl.LOCK_EX)
+            os.write(fd, data)
+        finally:
+            if fcntl:
+                fcntl.flock(fd, fcntl.LOCK_UN)
+            os.close(fd)
+
+
+_registry: Optional[SessionRegistry] = None
+
+
+def get_registry() -> SessionRegistry:
+    """Get the process-wide session registry"""
+    global _registry
+    if _registry is None:
+        _registry = SessionRegistry()
+    return _registry
+
+
+def summarize_sessions(records: List[dict]) -> Dict[str, dict]:
+    """
+    Group registry records by session id
+
+    Returns:
+        Dict[str, dict]: session_id -> {'status', 'name', 'reason'}
+    """
+    grouped: Dict[str, List[dict]] = {}
+    for record in records:
+        if record.get('session_id'):
+            grouped.setdefault(record['session_id'], []).append(record)
+
+    summary = {}
+    for session_id, session_records in grouped.items():
+        failed = [r['nodeid'] for r in session_records if r.get('outcome') in ('failed', 'unknown')]
+        name = session_records[0]['nodeid']
+        if len(session_records) > 1:
+            name = f"{name} (+{len(session_records) - 1} more)"
+        summary[session_id] = {
+            'status': 'failed' if failed else 'passed',
+            'name': name[:255],
+            'reason': f"Failed: {', '.join(failed)}"[:255] if failed else '',
+        }
+    return summary
+
+
+class SessionStatusUpdater:
+    """
+    Push session status and name to the BrowserStack REST API
+
+    Requests share one pooled HTTP session and are sent concurrently, so a
+    run with many sessions is updated in roughly one round trip.
+    """
+
+    def __init__(self, username: str, access_key: str, api_url: str = DEFAULT_BROWSERSTACK_API_URL,
+                 max_workers: int = 8, timeout: float = 10):
+        import requests
+        from requests.adapters import HTTPAdapter
+        from urllib3.util.retry import Retry
+
+        self.api_url = api_url.rstrip('/')
+        self.max_workers = max_workers
+        self.timeout = timeout
+
+        retry = Retry(total=2, backoff_factor=0.5, status_forcelist=[429, 500, 502, 503, 504],
+                      allowed_methods=['PUT'])
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max_workers, max_retries=retry)
+        self.http = requests.Session()
+        self.http.auth = (username, access_key)
+        self.http.mount('https://', adapter)
+        self.http.mount('http://', adapter)
+
+    def update_session(self, session_id: str, payload: dict) -> bool:
+        url = f"{self.api_url}/sessions/{session_id}.json"
+        try:
+            response = self.http.put(url, json=payload, timeout=self.timeout)
+            if response.status_code >= 400:
+                print(f"Failed to update session {session_id}: HTTP {response.status_code}")
+                return False
+            return True
+        except Exception as e:
+            print(f"Failed to update session {session_id}: {str(e)}")
+            return False
+
+    def update_all(self, summary: Dict[str, dict]) -> Dict[str, bool]:
+        """
+        Update all sessions concurrently
+
+        Args:
+            summary: Output of summarize_sessions
+
+        Returns:
+            Dict[str, bool]: session_id -> whether the update succeeded
+        """
+        if not summary:
+            return {}
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            futures = {
+                session_id: pool.submit(self.update_session, session_id, payload)
+                for session_id, payload in summary.items()
+            }
+            results = {session_id: future.result() for session_id, future in futures.items()}
+        self.http.close()
+        return results
+
+
+def push_session_statuses(records: List[dict]) -> Dict[str, bool]:
+    """Push statuses of all registered sessions when running on BrowserStack"""
+    if os.getenv('CURRENT_TEST_RUNNER') != 'browserstack':
+        return {}
+
+    config = get_config()
+    username = config.get('BROWSERSTACK_USERNAME')
+    access_key = config.get('BROWSERSTACK_ACCESS_KEY')
+    if not username or not access_key:
+        print("BrowserStack credentials not found, skip session status update")
+        return {}
+
+    updater = SessionStatusUpdater(
+        username,
+        access_key,
+        api_url=config.get('BROWSERSTACK_API_URL', DEFAULT_BROWSERSTACK_API_URL),
+        max_workers=int(config.get('BROWSERSTACK_STATUS_WORKERS', '8')),
+    )
+    results = updater.update_all(summarize_sessions(records))
+    print(f"BrowserStack session status updated: {sum(results.values())}/{len(results)}")
+    return results
+
+
+class MockStatusServer:
+    """
+    Local stand-in for the BrowserStack session REST API
+
+    Example:
+    with MockStatusServer() as server:
+        SessionStatusUpdater('user', 'key', api_url=server.url).update_all(summary)
+        print(server.received)  # [(session_id, payload), ...]
+    """
+
+    def __init__(self, status_code: int = 200):
+        self.status_code = status_code
+        self.received = []
+        self._server = None
+        self._thread = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def __enter__(self):
+        owner = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_PUT(self):
+                length = int(self.headers.get('Content-Length', 0))
+                body = self.rfile.read(length) if length else b'{}'
+                session_id = self.path.rsplit('/', 1)[-1].replace('.json', '')
+                owner.received.append((session_id, json.loads(body)))
+                self.send_response(owner.status_code)
+                self.send_header('Content-Type', 'application/json')
+                self.end_headers()
+                self.wfile.write(b'{}')
+
+            def log_message(self, *args):
+                pass
+
+        self._server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._server.shutdown()
+        self._server.server_close()
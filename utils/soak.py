@@ -0,0 +1,272 @@
+"""
+Soak mode: repeat the selected scenarios against one Appium session and watch for leaks
+
+Usage (single process, no -n):
+    pytest tests/steps/android -k order --soak-duration 2h
+    pytest tests/steps/android -k order --soak-iterations 200 --soak-warmup 3
+
+After every iteration the harness RSS, tracemalloc usage, Python object count,
+log file size, iteration duration and (Android) app PSS are sampled. A least
+squares trend line is fitted per metric, the run fails if a slope exceeds its
+SOAK_MAX_*_SLOPE limit.
+"""
+import gc
+import json
+import linecache
+import os
+import re
+import sys
+import time
+import tracemalloc
+from typing import Dict, List, Optional
+
+import pytest
+
+from utils.config import get_config
+
+
+DEFAULT_SOAK_DIR = os.path.join('reports', 'soak')
+
+# Metric -> (config key of the allowed slope per iteration, default limit); 0 disables the check
+SLOPE_LIMITS = {
+    'rss_kb': ('SOAK_MAX_RSS_SLOPE_KB', 512),
+    'tracemalloc_kb': ('SOAK_MAX_TRACEMALLOC_SLOPE_KB', 256),
+    'python_objects': ('SOAK_MAX_OBJECTS_SLOPE', 2000),
+    'log_kb': ('SOAK_MAX_LOG_SLOPE_KB', 0),
+    'duration_ms': ('SOAK_MAX_DURATION_SLOPE_MS', 200),
+    'device_pss_kb': ('SOAK_MAX_DEVICE_PSS_SLOPE_KB', 1024),
+}
+
+_shared_setups: Dict[Optional[str], object] = {}
+_reuse_sessions = False
+
+
+def parse_duration(value: str) -> float:
+    """Parse '90', '30m', '2h' to seconds"""
+    match = re.fullmatch(r'\s*(\d+(?:\.\d+)?)\s*([smh]?)\s*', value or '')
+    if not match:
+        raise ValueError(f"Invalid soak duration: {value}, use e.g. 900, 30m or 2h")
+    return float(match.group(1)) * {'': 1, 's': 1, 'm': 60, 'h': 3600}[match.group(2)]
+
+
+def get_shared_setup(role: str = None):
+    """AppiumSetup whose session is reused by every iteration, None outside soak mode"""
+    return _shared_setups.get(role) if _reuse_sessions else None
+
+
+def share_setup(setup, role: str = None):
+    if _reuse_sessions:
+        _shared_setups[role] = setup
+
+
+def is_shared(setup) -> bool:
+    return any(shared is setup for shared in _shared_setups.values())
+
+
+def close_shared_setups():
+    """Quit the reused sessions at the end of the soak run"""
+    setups = list(_shared_setups.values())
+    _shared_setups.clear()
+    for setup in setups:
+        try:
+            setup.tearDown()
+        except Exception as e:
+            print(f"Unable to close soak session: {str(e)}")
+
+
+def fit_slope(values: List[float]) -> float:
+    """Least squares slope of values over their index (growth per iteration)"""
+    count = len(values)
+    if count < 2:
+        return 0.0
+    mean_x = (count - 1) / 2
+    mean_y = sum(values) / count
+    numerator = sum((x - mean_x) * (y - mean_y) for x, y in enumerate(values))
+    denominator = sum((x - mean_x) ** 2 for x in range(count))
+    return numerator / denominator
+
+
+def _read_rss_kb() -> Optional[float]:
+    try:
+        with open('/proc/self/status', 'r') as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    return float(line.split()[1])
+    except OSError:
+        pass
+    try:
+        import resource
+
+        # Peak RSS only where /proc is missing (macOS reports bytes, Linux kilobytes)
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak / 1024 if sys.platform == 'darwin' else float(peak)
+    except ImportError:
+        return None
+
+
+def _take_snapshot():
+    """Snapshot without the allocations of tracemalloc and linecache themselves"""
+    return tracemalloc.take_snapshot().filter_traces((
+        tracemalloc.Filter(False, tracemalloc.__file__),
+        tracemalloc.Filter(False, linecache.__file__),
+        tracemalloc.Filter(False, '<frozen importlib._bootstrap*>'),
+    ))
+
+
+class SoakMonitor:
+    """Sample harness and device memory after every iteration and check the growth trends"""
+
+    def __init__(self, warmup: int = 2, log_path: str = 'test_execution.log', trace_frames: int = 5):
+        """
+        Args:
+            warmup: Leading iterations excluded from the trend (caches, JIT, first screen loads)
+            log_path: Log file whose growth is tracked
+            trace_frames: Frames stored per tracemalloc allocation, more frames cost more memory
+        """
+        self.warmup = warmup
+        self.log_path = log_path
+        self.trace_frames = trace_frames
+        self.samples: List[dict] = []
+        self._first_snapshot = None
+
+    def start(self):
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(self.trace_frames)
+
+    def sample(self, iteration: int, duration: float):
+        gc.collect()
+        current, _ = tracemalloc.get_traced_memory()
+        sample = {
+            'iteration': iteration,
+            'duration_ms': round(duration * 1000, 1),
+            'rss_kb': _read_rss_kb(),
+            'tracemalloc_kb': round(current / 1024, 1),
+            'python_objects': len(gc.get_objects()),
+            'log_kb': round(os.path.getsize(self.log_path) / 1024, 1) if os.path.exists(self.log_path) else None,
+            'device_pss_kb': self._read_device_pss_kb(),
+        }
+        self.samples.append(sample)
+        if iteration == self.warmup:
+            self._first_snapshot = _take_snapshot()
+        print(f"Soak iteration {iteration}: {sample['duration_ms']:.0f} ms, RSS {sample['rss_kb']} kB, "
+              f"traced {sample['tracemalloc_kb']} kB, device PSS {sample['device_pss_kb']} kB")
+        return sample
+
+    def _read_device_pss_kb(self) -> Optional[float]:
+        from utils.performance_sampler import _parse_table
+
+        for setup in list(_shared_setups.values()):
+            driver = getattr(setup, 'driver', None)
+            if driver is None or getattr(setup, 'platform', None) != 'android':
+                continue
+            try:
+                values = _parse_table(driver.get_performance_data(driver.current_package, 'memoryinfo'))
+                return values.get('totalPss')
+            except Exception as e:
+                print(f"Unable to read device memory: {str(e)}")
+        return None
+
+    def slopes(self) -> Dict[str, float]:
+        measured = self.samples[self.warmup:]
+        slopes = {}
+        for metric in SLOPE_LIMITS:
+            values = [sample[metric] for sample in measured if sample.get(metric) is not None]
+            if len(values) >= 3:
+                slopes[metric] = round(fit_slope(values), 2)
+        return slopes
+
+    def violations(self) -> List[str]:
+        config = get_config()
+        violations = []
+        for metric, slope in self.slopes().items():
+            key, default = SLOPE_LIMITS[metric]
+            limit = float(config.get(key, default))
+            if limit and slope > limit:
+                violations.append(f"{metric} grows {slope} per iteration (limit {limit}, {key})")
+        return violations
+
+    def top_growth(self, limit: int = 10) -> List[str]:
+        """Allocation sites that grew most since the end of warmup"""
+        if self._first_snapshot is None:
+            return []
+        current = _take_snapshot()
+        stats = current.compare_to(self._first_snapshot, 'traceback')
+        return [f"{stat.size_diff / 1024:+.1f} kB ({stat.count_diff:+d} blocks) {stat.traceback.format()[-1].strip()}"
+                for stat in stats[:limit] if stat.size_diff > 0]
+
+    def write_report(self, output_dir: str = None) -> str:
+        output_dir = output_dir or get_config().get('SOAK_OUTPUT_DIR', DEFAULT_SOAK_DIR)
+        os.makedirs(output_dir, exist_ok=True)
+        path = os.path.join(output_dir, f"soak-{time.strftime('%Y%m%d-%H%M%S')}.json")
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump({'samples': self.samples, 'slopes': self.slopes(), 'violations': self.violations(),
+                       'top_growth': self.top_growth()}, f, indent=2)
+        return path
+
+
+class SoakPlugin:
+    """Repeat the collected items until the iteration count or duration is reached"""
+
+    def __init__(self, iterations: Optional[int], duration: Optional[float], warmup: int):
+        self.iterations = iterations
+        self.duration = duration
+        self.monitor = SoakMonitor(warmup=warmup)
+
+    def _should_continue(self, iteration: int, started: float) -> bool:
+        if self.iterations is not None and iteration >= self.iterations:
+            return False
+        if self.duration is not None and time.monotonic() - started >= self.duration:
+            return False
+        return True
+
+    @pytest.hookimpl(tryfirst=True)
+    def pytest_runtestloop(self, session):
+        global _reuse_sessions
+        if session.testsfailed and not session.config.option.continue_on_collection_errors:
+            raise session.Interrupted(f"{session.testsfailed} error(s) during collection")
+        if session.config.option.collectonly or not session.items:
+            return True
+
+        _reuse_sessions = True
+        self.monitor.start()
+        started = time.monotonic()
+        iteration = 0
+        try:
+            final = not self._should_continue(iteration, started)
+            while not final:
+                iteration_started = time.monotonic()
+                for index, item in enumerate(session.items):
+                    if index < len(session.items) - 1:
+                        nextitem = session.items[index + 1]
+                    else:
+                        # Wrapping around to the first item keeps module and session fixtures alive
+                        # between iterations, None after the final iteration tears everything down
+                        final = not self._should_continue(iteration + 1, started)
+                        nextitem = None if final else session.items[0]
+                    # runtestprotocol sets up a fresh request for an item that already ran, as for pytest-rerunfailures
+                    item.ihook.pytest_runtest_protocol(item=item, nextitem=nextitem)
+                    if session.shouldfail or session.shouldstop:
+                        raise session.Failed(session.shouldfail) if session.shouldfail \
+                            else session.Interrupted(session.shouldstop)
+                self.monitor.sample(iteration, time.monotonic() - iteration_started)
+                iteration += 1
+        finally:
+            _reuse_sessions = False
+            close_shared_setups()
+            self._report(session)
+        return True
+
+    def _report(self, session):
+        if not self.monitor.samples:
+            return
+        path = self.monitor.write_report()
+        print(f"\nSoak run: {len(self.monitor.samples)} iterations, report {path}")
+        for metric, slope in self.monitor.slopes().items():
+            print(f"  {metric}: {slope:+} per iteration")
+        for line in self.monitor.top_growth():
+            print(f"  {line}")
+        violations = self.monitor.violations()
+        for violation in violations:
+            print(f"Soak leak detected: {violation}")
+        if violations:
+            session.testsfailed += 1
@@ -0,0 +1,106 @@
+"""
+Import and collection startup benchmark
+
+Every measurement runs in a fresh interpreter, so module caches of a previous
+run do not hide import cost. This is what pytest --collect-only and every
+xdist worker pay before the first test starts.
+
+Usage (from project root):
+    python -m utils.startup_benchmark --repeat 5 --output reports/startup.json
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+from typing import List
+
+DEFAULT_MODULES = ['setup', 'pages.common.common_actions', 'utils.logger', 'tests.conftest']
+
+_IMPORT_SNIPPET = (
+    "import importlib, sys, time\n"
+    "started = time.perf_counter()\n"
+    "importlib.import_module(sys.argv[1])\n"
+    "print((time.perf_counter() - started) * 1000)\n"
+)
+
+
+def measure_import(module: str, repeat: int = 5) -> dict:
+    """
+    Median import time of a module in fresh interpreters
+
+    Returns:
+        dict: median_ms, min_ms, runs, or error if the module cannot be imported
+    """
+    samples = []
+    for _ in range(repeat):
+        result = subprocess.run([sys.executable, '-c', _IMPORT_SNIPPET, module],
+                                capture_output=True, text=True)
+        if result.returncode != 0:
+            error = (result.stderr.strip().splitlines() or ['unknown error'])[-1]
+            return {'error': error}
+        samples.append(float(result.stdout.strip().splitlines()[-1]))
+    return _summarize(samples)
+
+
+def measure_collection(repeat: int = 5, args: List[str] = None) -> dict:
+    """Median wall time of `pytest --collect-only -q` including interpreter startup"""
+    command = [sys.executable, '-m', 'pytest', '--collect-only', '-q', '-p', 'no:cacheprovider'] + (args or [])
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = subprocess.run(command, capture_output=True, text=True)
+        samples.append((time.perf_counter() - started) * 1000)
+        # 5 = no tests collected, still a valid collection run
+        if result.returncode not in (0, 5):
+            error = (result.stdout.strip().splitlines() or ['unknown error'])[-1]
+            return {'error': error}
+    return _summarize(samples)
+
+
+def _summarize(samples: List[float]) -> dict:
+    return {
+        'runs': len(samples),
+        'median_ms': round(statistics.median(samples), 1),
+        'min_ms': round(min(samples), 1),
+    }
+
+
+def main(argv: List[str] = None) -> int:
+    parser = argparse.ArgumentParser(description="Import and collection startup benchmark")
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--modules', nargs='*', default=DEFAULT_MODULES)
+    parser.add_argument('--skip-collect', action='store_true', help='Only measure module imports')
+    parser.add_argument('--output', help='Write results as JSON to this file')
+    args = parser.parse_args(argv)
+
+    results = {'imports': {}, 'collect': None}
+    for module in args.modules:
+        result = measure_import(module, args.repeat)
+        results['imports'][module] = result
+        if 'error' in result:
+            print(f"{module}: import failed, {result['error']}")
+        else:
+            print(f"{module}: median {result['median_ms']} ms, min {result['min_ms']} ms")
+
+    if not args.skip_collect:
+        results['collect'] = measure_collection(args.repeat)
+        if 'error' in results['collect']:
+            print(f"pytest --collect-only: failed, {results['collect']['error']}")
+        else:
+            print(f"pytest --collect-only: median {results['collect']['median_ms']} ms, "
+                  f"min {results['collect']['min_ms']} ms")
+
+    if args.output:
+        directory = os.path.dirname(args.output)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,279 @@
+import json
+import os
+import statistics
+import threading
+import time
+import uuid
+from typing import Dict, List, Optional
+
+from utils.config import get_config
+from utils.driver_hooks import CommandListener, is_background_command
+from utils.session_registry import get_worker_id
+
+
+DEFAULT_STEP_TIMING_DIR = os.path.join('reports', 'step_timing')
+# Outside the ignored reports/ directory, CI restores it from its cache between runs
+DEFAULT_BASELINE_PATH = 'step_timing_baseline.json'
+
+
+class CommandCounter(CommandListener):
+    """
+    Count driver commands and the time any of them was in flight, for all drivers of the process
+
+    Commands of multi-role actors run concurrently on their own threads, so the
+    command time is the union of the in-flight intervals rather than the sum of
+    durations (which can exceed wall time). Background work such as the
+    performance sampler is not counted.
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.busy_time = 0.0
+        self._in_flight = 0
+        self._busy_since = 0.0
+        self._lock = threading.Lock()
+
+    def before_command(self, driver, command, params):
+        if is_background_command():
+            return
+        with self._lock:
+            if self._in_flight == 0:
+                self._busy_since = time.perf_counter()
+            self._in_flight += 1
+
+    def after_command(self, driver, command, params, duration, error=None):
+        if is_background_command():
+            return
+        with self._lock:
+            self.count += 1
+            # Listener registered while the command was running, only its count is known
+            if self._in_flight == 0:
+                return
+            self._in_flight -= 1
+            if self._in_flight == 0:
+                self.busy_time += time.perf_counter() - self._busy_since
+
+    def snapshot(self):
+        """Command count and time with at least one command in flight (seconds)"""
+        with self._lock:
+            busy_time = self.busy_time
+            if self._in_flight:
+                busy_time += time.perf_counter() - self._busy_since
+            return self.count, busy_time
+
+
+command_counter = CommandCounter()
+
+
+def make_step_key(feature_path: str, scenario_name: str, step_index: int, step_type: str,
+                  step_func_name: str) -> str:
+    """
+    Key a step by feature, scenario, position and step function
+    Rendered step names of scenario outlines differ per example, this key does not,
+    so all examples of an outline aggregate into the same step. Scenarios with the
+    same name in different features are kept apart by the feature path.
+    """
+    return f"{feature_path} :: {scenario_name} :: {step_index:02d} {step_type} {step_func_name}"
+
+
+class StepTimingRecorder:
+    """
+    Record wall time, driver command count and wait time of every BDD step
+
+    wait_ms is the part of the wall time without a driver command in flight
+    (sleeps, polling intervals, harness overhead). Each worker appends its
+    records to its own JSONL file, the controller aggregates them.
+    """
+
+    def __init__(self, output_dir: str = None):
+        self.output_dir = output_dir or get_config().get('STEP_TIMING_DIR', DEFAULT_STEP_TIMING_DIR)
+        self.scenario_records: List[dict] = []
+        self._current: Optional[dict] = None
+
+    def start_step(self, key: str, name: str):
+        count, duration = command_counter.snapshot()
+        self._current = {
+            'key': key,
+            'name': name,
+            'started': time.perf_counter(),
+            'commands': count,
+            'command_time': duration,
+        }
+
+    def end_step(self, failed: bool = False) -> Optional[dict]:
+        current, self._current = self._current, None
+        if current is None:
+            return None
+        count, duration = command_counter.snapshot()
+        wall_ms = (time.perf_counter() - current['started']) * 1000
+        command_ms = (duration - current['command_time']) * 1000
+        record = {
+            'key': current['key'],
+            'name': current['name'],
+            'wall_ms': round(wall_ms, 1),
+            'commands': count - current['commands'],
+            'command_ms': round(command_ms, 1),
+            'wait_ms': round(max(wall_ms - command_ms, 0.0), 1),
+            'failed': failed,
+            'worker': get_worker_id(),
+        }
+        self.scenario_records.append(record)
+        self._append(record)
+        return record
+
+    def pop_scenario_records(self) -> List[dict]:
+        records, self.scenario_records = self.scenario_records, []
+        return records
+
+    def _append(self, record: dict):
+        os.makedirs(self.output_dir, exist_ok=True)
+        path = os.path.join(self.output_dir, f"steps-{get_worker_id()}.jsonl")
+        with open(path, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(record, ensure_ascii=False) + '\n')
+
+
+def reset_records(output_dir: str = None):
+    """Remove step records of a previous run, call once from the controller process"""
+    output_dir = output_dir or get_config().get('STEP_TIMING_DIR', DEFAULT_STEP_TIMING_DIR)
+    if not os.path.isdir(output_dir):
+        return
+    for name in os.listdir(output_dir):
+        if name.startswith('steps-') and name.endswith('.jsonl'):
+            os.remove(os.path.join(output_dir, name))
+
+
+def collect_records(output_dir: str = None) -> List[dict]:
+    """Read step records written by all workers"""
+    output_dir = output_dir or get_config().get('STEP_TIMING_DIR', DEFAULT_STEP_TIMING_DIR)
+    if not os.path.isdir(output_dir):
+        return []
+    records = []
+    for name in sorted(os.listdir(output_dir)):
+        if name.startswith('steps-') and name.endswith('.jsonl'):
+            with open(os.path.join(output_dir, name), 'r', encoding='utf-8') as f:
+                records.extend(json.loads(line) for line in f if line.strip())
+    return records
+
+
+def aggregate(records: List[dict]) -> Dict[str, dict]:
+    """Per step key: runs, p50/p90 wall time, average command count, p50 wait time"""
+    import numpy as np
+
+    grouped: Dict[str, List[dict]] = {}
+    for record in records:
+        if not record.get('failed'):
+            grouped.setdefault(record['key'], []).append(record)
+
+    summary = {}
+    for key, step_records in grouped.items():
+        wall = np.array([r['wall_ms'] for r in step_records])
+        summary[key] = {
+            'name': step_records[0]['name'],
+            'runs': len(step_records),
+            'p50_ms': round(float(np.percentile(wall, 50)), 1),
+            'p90_ms': round(float(np.percentile(wall, 90)), 1),
+            'commands_avg': round(sum(r['commands'] for r in step_records) / len(step_records), 1),
+            'wait_p50_ms': round(float(np.percentile([r['wait_ms'] for r in step_records], 50)), 1),
+        }
+    return summary
+
+
+def load_baseline(path: str) -> Dict[str, List[float]]:
+    """Rolling baseline: step key -> p90 of the last runs"""
+    if not os.path.exists(path):
+        return {}
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def find_regressions(summary: Dict[str, dict], baseline: Dict[str, List[float]], threshold: float = 0.25,
+                     min_delta_ms: float = 200) -> List[dict]:
+    """
+    Flag steps whose p90 regressed against the median of their baseline p90 values
+
+    Args:
+        summary: Output of aggregate
+        baseline: Output of load_baseline
+        threshold: Allowed relative increase (0.25 = 25%)
+        min_delta_ms: Ignore increases smaller than this, short steps are noisy
+    """
+    regressions = []
+    for key, step in summary.items():
+        history = baseline.get(key)
+        if not history:
+            continue
+        reference = statistics.median(history)
+        delta = step['p90_ms'] - reference
+        if delta > min_delta_ms and step['p90_ms'] > reference * (1 + threshold):
+            regressions.append({
+                'key': key,
+                'name': step['name'],
+                'baseline_p90_ms': round(reference, 1),
+                'p90_ms': step['p90_ms'],
+                'commands_avg': step['commands_avg'],
+            })
+    return regressions
+
+
+def update_baseline(path: str, baseline: Dict[str, List[float]], summary: Dict[str, dict], window: int = 10,
+                    regressions: List[dict] = None, accept_regressions: bool = False):
+    """
+    Add this run's p90 values, keeping the last `window` runs per step
+    Regressed steps are not rolled in, otherwise a regression becomes the new normal after a few runs.
+    With accept_regressions (an intended slowdown) their history restarts from this run instead.
+    """
+    regressed = {regression['key'] for regression in regressions or []}
+    for key, step in summary.items():
+        if key in regressed:
+            if accept_regressions:
+                baseline[key] = [step['p90_ms']]
+            continue
+        baseline[key] = (baseline.get(key, []) + [step['p90_ms']])[-window:]
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(baseline, f, indent=1, sort_keys=True, ensure_ascii=False)
+
+
+def format_report(summary: Dict[str, dict], regressions: List[dict]) -> str:
+    lines = []
+    if regressions:
+        lines.append("Regressed steps (p90):")
+        for regression in regressions:
+            lines.append(f"  {regression['key']}: {regression['baseline_p90_ms']} -> {regression['p90_ms']} ms")
+        lines.append("")
+    lines.append(f"{'p50 ms':>9} {'p90 ms':>9} {'cmds':>6} {'wait ms':>9} {'runs':>5}  step")
+    for key, step in sorted(summary.items(), key=lambda item: -item[1]['p90_ms']):
+        lines.append(f"{step['p50_ms']:>9} {step['p90_ms']:>9} {step['commands_avg']:>6} "
+                     f"{step['wait_p50_ms']:>9} {step['runs']:>5}  {key}")
+    return '\n'.join(lines)
+
+
+def write_allure_report(alluredir: str, report: str, regressions: List[dict]):
+    """
+    Add the run-level step timing report to the Allure results as its own test result
+    Allure has no run-level attachments, a synthetic result makes the report visible.
+    It always passes, regressions are reported in its name and message, not as a failed test.
+    """
+    os.makedirs(alluredir, exist_ok=True)
+    attachment = f"{uuid.uuid4()}-attachment.txt"
+    with open(os.path.join(alluredir, attachment), 'w', encoding='utf-8') as f:
+        f.write(report)
+
+    now = int(time.time() * 1000)
+    result = {
+        'uuid': str(uuid.uuid4()),
+        'historyId': 'step-timing-report',
+        'name': f"Step timing report ({len(regressions)} regressed)" if regressions else 'Step timing report',
+        'fullName': 'step_timing.report',
+        'status': 'passed',
+        'statusDetails': {'message': f"{len(regressions)} step(s) regressed"} if regressions else {},
+        'stage': 'finished',
+        'start': now,
+        'stop': now,
+        'attachments': [{'name': 'Step timing', 'source': attachment, 'type': 'text/plain'}],
+        'labels': [{'name': 'suite', 'value': 'Performance'}],
+    }
+    with open(os.path.join(alluredir, f"{result['uuid']}-result.json"), 'w', encoding='utf-8') as f:
+        json.dump(result, f)
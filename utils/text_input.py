@@ -0,0 +1,189 @@
+import time
+from typing import Dict, List, Optional, Tuple
+
+from selenium.common.exceptions import StaleElementReferenceException, WebDriverException
+
+
+# Fastest first. Per-key typing is the fallback that works everywhere
+STRATEGIES: Dict[str, List[str]] = {
+    'android': ['replace_value', 'clipboard', 'mobile_type', 'send_keys'],
+    'ios': ['mobile_type', 'send_keys'],
+}
+
+# Android KEYCODE_PASTE
+_KEYCODE_PASTE = 279
+
+
+class TextInputError(Exception):
+    pass
+
+
+class TextInput:
+    """
+    Enter text with the fastest strategy the driver supports
+
+    Strategies:
+        replace_value: mobile: replaceElementValue, sets the whole text in one call (Android)
+        clipboard: set clipboard, focus field and paste with KEYCODE_PASTE (Android)
+        mobile_type: whole string in one command, mobile: type (Android) / mobile: keys (iOS)
+        send_keys: element.send_keys, typed key by key
+
+    The field value is verified after each strategy, a strategy that errors or leaves
+    a different value (e.g. replaceElementValue quietly ignored by a Flutter field)
+    falls through to the next one. Secure fields never expose their value and are not
+    verified; pass verify=False for auto-formatted fields whose value never equals the
+    typed text. Strategies the server does not implement are skipped for the rest of
+    the session, and the strategy that worked for a field is tried first next time.
+
+    Example:
+    text_input = get_text_input(driver, 'android')
+    text_input.enter_text(element, "No. 7, Section 5, Xinyi Road, Taipei", field_key="address")
+    print(text_input.report())
+    """
+
+    def __init__(self, driver, platform: str, strategies: List[str] = None, verify: bool = True):
+        """
+        Args:
+            driver: WebDriver instance
+            platform: android or ios
+            strategies: Strategies to try in order, fastest first for the platform if not specified
+            verify: Whether to check the field value after entering text, default of enter_text
+        """
+        self.driver = driver
+        self.platform = platform
+        self.strategies = strategies or STRATEGIES.get(platform, ['send_keys'])
+        self.verify = verify
+        self.unsupported = set()
+        self.preferred: Dict[str, str] = {}
+        self.stats: Dict[str, dict] = {name: {'attempts': 0, 'successes': 0, 'total_ms': 0.0}
+                                       for name in self.strategies}
+
+    def enter_text(self, element, text: str, field_key: str = None, hide_keyboard: bool = False,
+                   verify: bool = None) -> str:
+        """
+        Replace the text of a field
+
+        Args:
+            element: Text field element
+            text: Text to enter
+            field_key: Key the working strategy is remembered under (e.g. the locator)
+            hide_keyboard: Hide the soft keyboard afterwards so it does not cover following elements
+            verify: Check the field value after each strategy, the instance default if not specified
+
+        Returns:
+            str: Strategy that entered the text
+
+        Raises:
+            TextInputError: No strategy produced the expected value
+        """
+        verify = self.verify if verify is None else verify
+        errors = []
+        for strategy in self._ordered_strategies(field_key):
+            succeeded, error = self._attempt(strategy, element, text, verify)
+            if succeeded:
+                if field_key:
+                    self.preferred[field_key] = strategy
+                if hide_keyboard:
+                    self.hide_keyboard()
+                return strategy
+            errors.append(f"{strategy}: {error}")
+        if hide_keyboard:
+            self.hide_keyboard()
+        raise TextInputError(f"Unable to enter text, {'; '.join(errors)}")
+
+    def hide_keyboard(self):
+        """Hide the soft keyboard if shown, a missing keyboard is not an error"""
+        try:
+            if self.driver.is_keyboard_shown():
+                self.driver.hide_keyboard()
+        except WebDriverException as e:
+            print(f"Unable to hide keyboard: {str(e)}")
+
+    def report(self) -> str:
+        """Attempts, successes and average time per strategy"""
+        lines = []
+        for name, stat in self.stats.items():
+            average = stat['total_ms'] / stat['attempts'] if stat['attempts'] else 0.0
+            state = ' (unsupported)' if name in self.unsupported else ''
+            lines.append(f"{name}: {stat['successes']}/{stat['attempts']} ok, avg {average:.0f} ms{state}")
+        return '\n'.join(lines)
+
+    def _ordered_strategies(self, field_key: Optional[str]) -> List[str]:
+        strategies = [name for name in self.strategies if name not in self.unsupported]
+        preferred = self.preferred.get(field_key) if field_key else None
+        if preferred in strategies:
+            strategies.remove(preferred)
+            strategies.insert(0, preferred)
+        return strategies
+
+    def _attempt(self, strategy: str, element, text: str, verify: bool) -> Tuple[bool, Optional[str]]:
+        stat = self.stats.setdefault(strategy, {'attempts': 0, 'successes': 0, 'total_ms': 0.0})
+        stat['attempts'] += 1
+        started = time.perf_counter()
+        try:
+            getattr(self, f"_{strategy}")(element, text)
+            succeeded = not verify or self._has_value(element, text)
+            error = None if succeeded else 'field value differs'
+        except StaleElementReferenceException:
+            raise
+        except WebDriverException as e:
+            if _is_unsupported(e):
+                self.unsupported.add(strategy)
+            succeeded, error = False, str(e).splitlines()[0] if str(e) else type(e).__name__
+        finally:
+            stat['total_ms'] += (time.perf_counter() - started) * 1000
+        if succeeded:
+            stat['successes'] += 1
+        return succeeded, error
+
+    def _replace_value(self, element, text: str):
+        self.driver.execute_script('mobile: replaceElementValue', {'elementId': element.id, 'text': text})
+
+    def _clipboard(self, element, text: str):
+        self.driver.set_clipboard_text(text)
+        element.click()
+        element.clear()
+        self.driver.press_keycode(_KEYCODE_PASTE)
+
+    def _mobile_type(self, element, text: str):
+        element.click()
+        element.clear()
+        if self.platform == 'ios':
+            self.driver.execute_script('mobile: keys', {'elementId': element.id, 'keys': [text]})
+        else:
+            self.driver.execute_script('mobile: type', {'text': text})
+
+    def _send_keys(self, element, text: str):
+        element.clear()
+        element.send_keys(text)
+
+    def _has_value(self, element, text: str) -> bool:
+        # Secure fields never expose their value
+        if self._is_secure(element):
+            return True
+        value = element.get_attribute('value') if self.platform == 'ios' else element.text
+        return (value or '') == text
+
+    def _is_secure(self, element) -> bool:
+        try:
+            if self.platform == 'ios':
+                return element.get_attribute('type') == 'XCUIElementTypeSecureTextField'
+            return element.get_attribute('password') == 'true'
+        except WebDriverException:
+            return False
+
+
+def _is_unsupported(error: WebDriverException) -> bool:
+    message = str(error).lower()
+    return any(marker in message for marker in (
+        'unknown command', 'unknown method', 'not implemented', 'unsupported', 'is not supported',
+        'unknown mobile command', 'relaxed-security', 'insecure feature'))
+
+
+def get_text_input(driver, platform: str) -> TextInput:
+    """Get the text input of a driver, learned strategies are shared by all CommonActions of the driver"""
+    text_input = getattr(driver, '_text_input', None)
+    if text_input is None:
+        text_input = TextInput(driver, platform)
+        driver._text_input = text_input
+    return text_input
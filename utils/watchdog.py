@@ -0,0 +1,267 @@
+import json
+import os
+import re
+import sys
+import threading
+import time
+import traceback
+import urllib.request
+from typing import Dict, List, NamedTuple, Optional
+
+from utils.config import get_bool, get_config
+from utils.driver_hooks import CommandListener
+from utils.session_registry import get_worker_id
+
+
+DEFAULT_HANG_DIR = os.path.join('reports', 'hangs')
+
+
+class InFlightCommand(NamedTuple):
+    driver: object
+    command: str
+    started: float
+    thread_id: int
+
+
+class HangWatchdog(CommandListener):
+    """
+    Per-worker watchdog for stuck driver commands and tests over their wall-clock limit
+
+    A command running longer than command_timeout, or a test past its deadline, gets
+    the stacks of all threads and the last page source (fetched on a separate
+    connection) dumped. The watchdog never interrupts the test thread: the hung
+    command is cut off by the HTTP read timeout set with limit_socket_timeout
+    (command_timeout + grace), which raises in the blocked call itself. A test past
+    its deadline gets the pooled connections of its drivers closed and their sessions
+    deleted over a separate connection, so its next command fails fast and the worker
+    moves on; the report hook fails it through end_test.
+
+    Example:
+    watchdog = HangWatchdog(command_timeout=120, test_timeout=600)
+    add_command_listener(watchdog)
+    watchdog.limit_socket_timeout(driver)
+    watchdog.start()
+    watchdog.start_test("tests/steps/test_x.py::test_y")
+    ...
+    overrun = watchdog.end_test()
+    """
+
+    def __init__(self, command_timeout: float = 180, test_timeout: float = 0, grace: float = 30,
+                 output_dir: str = None, interval: float = 1.0):
+        """
+        Args:
+            command_timeout: Duration of one driver command after which it is dumped (seconds), 0 disables the check
+            test_timeout: Wall-clock limit per test (seconds), 0 disables the check
+            grace: Time a dumped command gets before the socket read timeout cuts it off (seconds)
+            output_dir: Directory hang dumps are written to
+            interval: Check interval (seconds)
+        """
+        self.command_timeout = command_timeout
+        self.test_timeout = test_timeout
+        self.grace = grace
+        self.output_dir = output_dir or get_config().get('HANG_DUMP_DIR', DEFAULT_HANG_DIR)
+        self.interval = interval
+        self.hangs: Dict[str, List[str]] = {}
+
+        self._in_flight: Dict[int, InFlightCommand] = {}
+        # Drivers that sent commands during the current test, id -> driver
+        self._drivers: Dict[int, object] = {}
+        self._dumped: Dict[int, float] = {}
+        self._nodeid: Optional[str] = None
+        self._deadline: Optional[float] = None
+        self._test_limit = test_timeout
+        self._overrun: Optional[str] = None
+        self._lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name='hang-watchdog', daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop_event.set()
+        if self._thread:
+            self._thread.join(timeout=self.interval + 1)
+            self._thread = None
+
+    def start_test(self, nodeid: str, timeout: float = None):
+        """Start the wall-clock limit of a test, timeout overrides test_timeout (e.g. from a marker)"""
+        timeout = self.test_timeout if timeout is None else timeout
+        with self._lock:
+            self._nodeid = nodeid
+            self._deadline = time.monotonic() + timeout if timeout else None
+            self._test_limit = timeout
+            self._overrun = None
+            self._drivers = {}
+
+    def end_test(self) -> Optional[str]:
+        """
+        Stop the wall-clock limit of the current test
+
+        Returns:
+            Optional[str]: Reason if the test ran past its deadline, None otherwise
+        """
+        with self._lock:
+            overrun = self._overrun
+            if overrun is None and self._deadline is not None and time.monotonic() > self._deadline:
+                overrun = f"test exceeded {self._test_limit:.0f} s wall-clock limit"
+            self._nodeid = None
+            self._deadline = None
+            self._overrun = None
+            self._drivers = {}
+        return overrun
+
+    def before_command(self, driver, command, params):
+        thread_id = threading.get_ident()
+        with self._lock:
+            self._in_flight[thread_id] = InFlightCommand(driver, command, time.monotonic(), thread_id)
+            self._drivers[id(driver)] = driver
+
+    def after_command(self, driver, command, params, duration, error=None):
+        thread_id = threading.get_ident()
+        with self._lock:
+            self._in_flight.pop(thread_id, None)
+            self._dumped.pop(thread_id, None)
+
+    def limit_socket_timeout(self, driver):
+        """Cap the HTTP read timeout of the driver, a command hanging past it fails in its own thread"""
+        if not self.command_timeout:
+            return
+        client_config = getattr(driver.command_executor, '_client_config', None)
+        if client_config is not None:
+            client_config.timeout = self.command_timeout + self.grace
+
+    def _run(self):
+        while not self._stop_event.wait(self.interval):
+            try:
+                self.check()
+            except Exception as e:
+                print(f"Hang watchdog error: {str(e)}")
+
+    def check(self):
+        now = time.monotonic()
+        with self._lock:
+            in_flight = [command for command in self._in_flight.values() if command.thread_id not in self._dumped]
+            deadline, test_limit = self._deadline, self._test_limit
+
+        stuck = [command for command in in_flight
+                 if self.command_timeout and now - command.started > self.command_timeout]
+        if stuck:
+            self._dump(stuck, f"driver command exceeded {self.command_timeout:.0f} s")
+            return
+
+        if deadline is not None and now > deadline:
+            reason = f"test exceeded {test_limit:.0f} s wall-clock limit"
+            with self._lock:
+                self._deadline = None
+                self._overrun = reason
+                drivers = list(self._drivers.values())
+            self._dump(in_flight, reason)
+            for driver in drivers:
+                _abort_session(driver)
+
+    def _dump(self, commands: List[InFlightCommand], reason: str):
+        with self._lock:
+            for command in commands:
+                self._dumped[command.thread_id] = time.monotonic()
+        self._write_dump(reason, commands)
+
+    def _write_dump(self, reason: str, commands: List[InFlightCommand]) -> str:
+        nodeid = self._nodeid or 'unknown'
+        now = time.monotonic()
+        lines = [f"Hang in {nodeid} on worker {get_worker_id()}: {reason}", ""]
+        for command in commands:
+            lines.append(f"In-flight command {command.command} for {now - command.started:.1f} s "
+                         f"(session {getattr(command.driver, 'session_id', None)})")
+        lines.extend(['', _format_stacks()])
+        for command in commands:
+            page_source = _fetch_page_source(command.driver)
+            if page_source:
+                lines.extend(['', f"Last page source (session {command.driver.session_id}):", page_source])
+                break
+
+        os.makedirs(self.output_dir, exist_ok=True)
+        name = re.sub(r'[^A-Za-z0-9_.-]+', '_', nodeid)[:120]
+        path = os.path.join(self.output_dir, f"{name}-{int(time.time() * 1000)}.txt")
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write('\n'.join(lines))
+        self.hangs.setdefault(nodeid, []).append(path)
+        print(f"Hang watchdog: {reason} in {nodeid}, dump written to {path}")
+        return path
+
+    def pop_hangs(self, nodeid: str) -> List[str]:
+        """Dump files written for a test"""
+        return self.hangs.pop(nodeid, [])
+
+
+def _format_stacks() -> str:
+    names = {thread.ident: thread.name for thread in threading.enumerate()}
+    parts = []
+    for thread_id, frame in sys._current_frames().items():
+        parts.append(f"Thread {names.get(thread_id, thread_id)}:\n{''.join(traceback.format_stack(frame))}")
+    return '\n'.join(parts)
+
+
+def _session_url(driver) -> Optional[str]:
+    executor = getattr(driver, 'command_executor', None)
+    client_config = getattr(executor, '_client_config', None)
+    if client_config is None or not getattr(driver, 'session_id', None):
+        return None
+    return f"{client_config.remote_server_addr.rstrip('/')}/session/{driver.session_id}"
+
+
+def _request(driver, method: str, path: str = '', timeout: float = 10) -> Optional[bytes]:
+    """Send a request on a new connection, the driver's own connection is blocked"""
+    url = _session_url(driver)
+    if url is None:
+        return None
+    request = urllib.request.Request(url + path, method=method)
+    client_config = driver.command_executor._client_config
+    for name, value in (client_config.get_auth_header() or {}).items():
+        request.add_header(name, value)
+    with urllib.request.urlopen(request, timeout=timeout) as response:
+        return response.read()
+
+
+def _fetch_page_source(driver) -> Optional[str]:
+    try:
+        return json.loads(_request(driver, 'GET', '/source')).get('value')
+    except Exception as e:
+        print(f"Unable to fetch page source of hung session: {str(e)}")
+        return None
+
+
+def _abort_session(driver):
+    """Close pooled connections and delete the session, the test's next command fails fast"""
+    connection_pool = getattr(getattr(driver, 'command_executor', None), '_conn', None)
+    if connection_pool is not None:
+        try:
+            connection_pool.clear()
+        except Exception as e:
+            print(f"Unable to close driver connections: {str(e)}")
+    try:
+        if _request(driver, 'DELETE') is not None:
+            print(f"Hang watchdog deleted session {driver.session_id}")
+    except Exception as e:
+        print(f"Unable to delete session {getattr(driver, 'session_id', None)}: {str(e)}")
+
+
+_watchdog: Optional[HangWatchdog] = None
+
+
+def get_watchdog() -> Optional[HangWatchdog]:
+    """Get the worker's watchdog, None when HANG_WATCHDOG is disabled"""
+    global _watchdog
+    if _watchdog is None:
+        if not get_bool('HANG_WATCHDOG', 'false'):
+            return None
+        config = get_config()
+        _watchdog = HangWatchdog(
+            command_timeout=float(config.get('HANG_COMMAND_TIMEOUT', '180')),
+            test_timeout=float(config.get('TEST_TIMEOUT', '0')),
+            grace=float(config.get('HANG_GRACE_SECONDS', '30')),
+        )
+        _watchdog.start()
+    return _watchdog